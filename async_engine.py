@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+asyncio 传输引擎（可选，需要安装 aiohttp）
+每个文件的下载与分片上传都是事件循环中的协程，网络请求通过 aiohttp 并发进行，不为每个传输占用线程；
+写盘、读取分片和计算哈希交给一个小的磁盘线程池，
+元数据接口（查询/创建文件夹、获取下载链接、创建文件等）仍调用原有客户端，在独立的线程池中执行
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import functools
+import threading
+import concurrent.futures
+from typing import Dict, Optional, Set
+
+from pipeline import StagedFile
+from rate_limiter import MAX_THROTTLE_RETRIES, parse_retry_after
+from segmented_download import DownloadJob
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+logger = logging.getLogger(__name__)
+
+# 下载时每次从响应中读取并写盘的字节数
+CHUNK_SIZE = 1024 * 1024
+
+
+def _write_chunk(f, sha1, chunk: bytes):
+    f.write(chunk)
+    sha1.update(chunk)
+
+
+def _hash_file(path: str, sha1, chunk_size: int = 1024 * 1024):
+    """把已有文件的内容喂给 sha1（续传时补上已下载部分的哈希）"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            sha1.update(chunk)
+
+
+class AsyncTransferEngine:
+    """asyncio 传输引擎：接口与线程池类似，submit 返回 concurrent.futures.Future"""
+    
+    def __init__(self, syncer, meta_concurrency: int = 8, download_concurrency: int = 32,
+                 upload_concurrency: int = 16, fallback_workers: int = 3, disk_workers: int = 4):
+        """
+        :param syncer: BaiduToAliyunSync 实例（复用其客户端、进度记录与临时目录）
+        :param meta_concurrency: 元数据线程池大小（查询/创建文件夹、获取下载链接、创建与提交文件等）
+        :param download_concurrency: 同时下载的文件数（协程）
+        :param upload_concurrency: 同时上传的分片数（协程）
+        :param fallback_workers: 仍走线程实现的文件（管道模式、分段下载的大文件、baidupcs-py 客户端）的并发数
+        :param disk_workers: 写盘、读取分片与计算哈希的线程数
+        """
+        if not HAS_AIOHTTP:
+            raise RuntimeError("asyncio 引擎需要安装 aiohttp: pip install aiohttp")
+        
+        self.syncer = syncer
+        self.baidu_client = syncer.baidu_client
+        self.aliyun_client = syncer.aliyun_client
+        self.download_concurrency = max(1, download_concurrency)
+        self.upload_concurrency = max(1, upload_concurrency)
+        self.fallback_workers = max(1, fallback_workers)
+        
+        # 管道模式与 baidupcs-py 客户端下所有文件都走线程实现，同时在途的文件数以线程数为准
+        self.threaded = syncer.pipe_mode or not hasattr(self.baidu_client, "dlinks")
+        if self.threaded:
+            self.capacity = self.fallback_workers
+        else:
+            self.capacity = self.download_concurrency + self.upload_concurrency
+        
+        self._meta_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, meta_concurrency), thread_name_prefix="async-meta")
+        self._disk_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, disk_workers), thread_name_prefix="async-disk")
+        self._fallback_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.fallback_workers, thread_name_prefix="async-fallback")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session = None
+        self._futures: Set[concurrent.futures.Future] = set()
+        self._futures_lock = threading.Lock()
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def start(self):
+        """在后台线程中启动事件循环"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-engine", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+    
+    async def _open(self):
+        # 信号量与会话必须在事件循环内创建
+        self._download_sem = asyncio.Semaphore(self.download_concurrency)
+        self._upload_sem = asyncio.Semaphore(self.upload_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.download_concurrency + self.upload_concurrency)
+        timeout = aiohttp.ClientTimeout(total=None, connect=30, sock_read=300)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    
+    def close(self):
+        """等待已提交的文件全部完成后关闭事件循环"""
+        with self._futures_lock:
+            pending = list(self._futures)
+        concurrent.futures.wait(pending)
+        
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+        self._meta_executor.shutdown(wait=True)
+        self._disk_executor.shutdown(wait=True)
+        self._fallback_executor.shutdown(wait=True)
+    
+    def submit(self, file_info: Dict, baidu_base: str, aliyun_base: str,
+               overwrite: bool = False) -> concurrent.futures.Future:
+        """提交一个文件的同步任务（线程安全）"""
+        future = asyncio.run_coroutine_threadsafe(
+            self.sync_file(file_info, baidu_base, aliyun_base, overwrite), self._loop)
+        with self._futures_lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard_future)
+        return future
+    
+    def queue_depths(self) -> Dict[str, int]:
+        """事件循环中进行中的文件数"""
+        with self._futures_lock:
+            return {"async_tasks": len(self._futures)}
+    
+    def _discard_future(self, future: concurrent.futures.Future):
+        with self._futures_lock:
+            self._futures.discard(future)
+    
+    async def _meta(self, func, *args):
+        """在元数据线程池中调用同步接口"""
+        return await self._loop.run_in_executor(self._meta_executor, functools.partial(func, *args))
+    
+    async def _disk(self, func, *args):
+        """在磁盘线程池中执行写盘、读取或哈希"""
+        return await self._loop.run_in_executor(self._disk_executor, functools.partial(func, *args))
+    
+    async def _request(self, category: str, method: str, url: str, **kwargs):
+        """按类别限速发送请求，被限流（429）时降速并重试；调用方负责 release 响应；每次发送都计入统计"""
+        limiter = self.syncer.rate_limiters.get(category)
+        stats = self.syncer.stats
+        data = kwargs.get("data")
+        nbytes = len(data) if isinstance(data, (bytes, bytearray)) else 0
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            wait = limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            start = time.monotonic()
+            try:
+                response = await self._session.request(method, url, **kwargs)
+            except Exception:
+                stats.api(category, time.monotonic() - start)
+                raise
+            stats.api(category, time.monotonic() - start, response.status, nbytes)
+            if response.status != 429:
+                limiter.on_success()
+                return response
+            
+            limiter.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+            if attempt < MAX_THROTTLE_RETRIES:
+                response.release()
+        return response
+    
+    async def sync_file(self, file_info: Dict, baidu_base: str, aliyun_base: str, overwrite: bool = False) -> bool:
+        """同步单个文件：下载到临时文件（可续传，边下载边计算 SHA1）后分片上传（可续传）"""
+        syncer = self.syncer
+        file_size = file_info.get("size", 0)
+        
+        # 管道模式、baidupcs-py 客户端以及需要分段下载的大文件仍使用线程实现
+        if self.threaded or self.baidu_client.downloader.should_segment(file_size):
+            return await self._loop.run_in_executor(
+                self._fallback_executor,
+                functools.partial(syncer._sync_single_file, file_info, baidu_base, aliyun_base, overwrite))
+        
+        file_path = file_info.get("path")
+        file_name = file_info.get("server_filename")
+        aliyun_dir = syncer._aliyun_dir_for(file_path, baidu_base, aliyun_base)
+        size_mb = file_size / (1024 * 1024)
+        size_str = f"{size_mb:.2f}MB" if size_mb >= 1 else f"{file_size / 1024:.2f}KB"
+        logger.info(f"🔄 同步: {file_name} ({size_str})")
+        
+        check_name_mode = await self._meta(syncer._check_remote, file_info, aliyun_dir, overwrite)
+        if check_name_mode is None:
+            return True
+        
+        temp_file = os.path.join(syncer.temp_dir, f"{file_info.get('fs_id')}_{file_name}")
+        async with self._download_sem:
+            with syncer.stats.timer("download") as timer:
+                content_hash = await self._download(file_info, temp_file)
+                timer.ok = content_hash is not None
+                timer.bytes = file_size if timer.ok else 0
+        if content_hash is None:
+            return False
+        
+        staged = StagedFile(file_info, aliyun_dir, temp_file, content_hash, check_name_mode)
+        with syncer.stats.timer("upload") as timer:
+            try:
+                success = await self._upload(staged)
+            except Exception as e:
+                logger.error(f"文件上传失败 {file_name}: {str(e)}")
+                success = False
+            timer.ok = success
+            timer.bytes = file_size if success else 0
+        return await self._disk(syncer._finish_staged, staged, success)
+    
+    async def _download(self, file_info: Dict, temp_file: str) -> Optional[str]:
+        """
+        下载到临时文件并计算 SHA1（与线程下载共用 .downloading/.meta 续传记录和校验）
+        :return: 大写的 SHA1；失败返回 None（.downloading 文件保留，下次可以续传）
+        """
+        file_size = file_info.get("size", 0)
+        job = DownloadJob(temp_file, file_size, file_info.get("md5"))
+        for resume in (True, False):
+            sha1 = hashlib.sha1()
+            try:
+                if not await self._disk(job.begin, resume):
+                    # 上次已下载完成但未上传
+                    await self._disk(_hash_file, temp_file, sha1)
+                    return sha1.hexdigest().upper()
+                
+                total_size = job.resume_size
+                if total_size:
+                    await self._disk(_hash_file, job.temp_path, sha1)
+                if total_size < file_size:
+                    total_size = await self._download_to(file_info.get("fs_id"), job.temp_path, total_size, sha1)
+                finished = await self._disk(job.finish, total_size)
+            except Exception as e:
+                logger.error(f"文件下载失败 {temp_file}: {str(e)}")
+                return None
+            
+            # None：续传的文件 md5 校验失败，已丢弃，从头重新下载
+            if finished is not None:
+                return sha1.hexdigest().upper() if finished else None
+        return None
+    
+    async def _download_to(self, fs_id: int, path: str, offset: int, sha1) -> int:
+        """从 offset 处下载到文件末尾，追加写入 path，返回文件总字节数"""
+        response = await self._open_range(fs_id, offset)
+        total_size = offset
+        try:
+            f = await self._disk(open, path, 'ab' if offset else 'wb')
+            try:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    await self._disk(_write_chunk, f, sha1, chunk)
+                    total_size += len(chunk)
+            finally:
+                await self._disk(f.close)
+        finally:
+            response.release()
+        return total_size
+    
+    async def _open_range(self, fs_id: int, start: int):
+        """请求从 start 到文件末尾的数据，下载链接过期（403）时刷新后重试一次；调用方负责 release 响应"""
+        headers = self.baidu_client._get_download_headers()
+        if start:
+            headers["Range"] = f"bytes={start}-"
+        
+        for attempt in range(2):
+            dlink = await self._meta(self.baidu_client.dlinks.get, fs_id)
+            if not dlink:
+                raise IOError(f"无法获取下载链接: fs_id={fs_id}")
+            
+            response = await self._request("baidu_download", "GET", dlink, headers=headers)
+            if response.status == 403 and not attempt:
+                logger.info(f"  下载链接已过期，重新获取: fs_id={fs_id}")
+                response.release()
+                self.baidu_client.dlinks.invalidate(fs_id, dlink)
+                continue
+            try:
+                response.raise_for_status()
+                if start and response.status != 206:
+                    raise IOError(f"下载链接不支持 Range 请求，状态码: {response.status}")
+            except Exception:
+                response.release()
+                raise
+            return response
+    
+    async def _upload(self, staged: StagedFile) -> bool:
+        """创建文件（尝试秒传）或恢复上次的上传会话，并发上传待传分片后提交"""
+        session = await self._meta(self.syncer._begin_upload, staged)
+        if isinstance(session, bool):
+            return session
+        
+        await asyncio.gather(*[self._upload_part(session, n) for n in session.pending])
+        await self._meta(self.aliyun_client.finish_upload, session)
+        return True
+    
+    async def _upload_part(self, session, part_number: int):
+        # 每个分片单独读取，内存占用不超过 part_size × upload_concurrency
+        async with self._upload_sem:
+            part_data = await self._disk(session.read_part, part_number)
+            await self._put_part(session.file_id, session.upload_id, part_number, part_data,
+                                 session.upload_urls.get(part_number))
+    
+    async def _put_part(self, file_id: str, upload_id: str, part_number: int, part_data: bytes,
+                        upload_url: Optional[str], max_retries: int = 3):
+        """上传单个分片，上传URL过期时自动刷新"""
+        for attempt in range(max_retries + 1):
+            try:
+                if not upload_url:
+                    upload_urls = await self._meta(self.aliyun_client.get_upload_url, file_id, upload_id,
+                                                   [part_number])
+                    upload_url = upload_urls.get(part_number)
+                
+                response = await self._request("aliyun_upload", "PUT", upload_url, data=part_data,
+                                               headers={"Content-Type": ""})
+                try:
+                    # 403 通常是上传URL已过期，刷新后重传
+                    if response.status == 403:
+                        logger.debug(f"分片上传URL已过期，刷新: #{part_number}")
+                        upload_url = None
+                        continue
+                    # 409 表示该分片已存在
+                    if response.status == 409:
+                        return
+                    response.raise_for_status()
+                    return
+                finally:
+                    response.release()
+            except Exception as e:
+                if attempt >= max_retries:
+                    raise
+                logger.warning(f"分片 #{part_number} 上传失败，重试 ({attempt + 1}/{max_retries}): {str(e)}")
+                upload_url = None
+                await asyncio.sleep(attempt + 1)
+        
+        raise IOError(f"分片 #{part_number} 上传失败: 上传URL多次过期")
@@ -4,9 +4,16 @@
 使用 baidupcs-py 的百度网盘客户端
 """
 
+import time
 import logging
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional
+import requests
 from baidupcs_py.baidupcs import BaiduPCS
+from baidupcs_py.baidupcs.pcs import PcsNode
+
+from rate_limiter import MAX_THROTTLE_RETRIES, RateLimiterRegistry, call_with_limiter
+from segmented_download import SegmentedDownloader
+from sync_stats import SyncStats
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +21,19 @@ logger = logging.getLogger(__name__)
 class BaiduPanClientPCS:
     """使用 baidupcs-py 的百度网盘客户端"""
     
-    def __init__(self, cookie: str):
+    def __init__(self, cookie: str, downloader: SegmentedDownloader = None,
+                 rate_limiters: Optional[RateLimiterRegistry] = None, stats: Optional[SyncStats] = None):
         """
         初始化百度网盘客户端
         :param cookie: 百度网盘 Cookie
+        :param downloader: 大文件分段下载器（默认不分段）
+        :param rate_limiters: 按接口类别的自适应限速器（与原始客户端共用同一套类别）
+        :param stats: 耗时与状态码统计
         """
         self.cookie = cookie
+        self.downloader = downloader or SegmentedDownloader(segment_count=1)
+        self.rate_limiters = rate_limiters or RateLimiterRegistry()
+        self.stats = stats or SyncStats()
         
         # 提取 BDUSS 和转换 Cookie 为字典
         self.bduss = None
@@ -41,107 +55,140 @@ class BaiduPanClientPCS:
         # 创建 BaiduPCS 实例
         self.api = BaiduPCS(bduss=self.bduss, cookies=self.cookies_dict)
     
-    def list_files(self, dir_path: str = "/", recursion: int = 0) -> List[Dict]:
-        """列出目录下的文件"""
-        try:
-            result = self.api.list(dir_path)
-            
-            if isinstance(result, dict) and 'list' in result:
-                file_list = result['list']
-                
-                # 如果需要递归
-                if recursion:
-                    all_files = file_list.copy()
-                    folders = [f for f in file_list if f.get('isdir') == 1]
-                    
-                    for folder in folders:
-                        sub_files = self.list_files(folder.get('path'), recursion)
-                        all_files.extend(sub_files)
-                    
-                    return all_files
-                
-                return file_list
-            else:
-                logger.error(f"列表获取失败: {result}")
-                return []
-        except Exception as e:
-            logger.error(f"列表获取异常: {str(e)}")
-            return []
-    
-    def download_file(self, remote_path: str, save_path: str) -> bool:
-        """下载文件到本地"""
-        temp_path = f"{save_path}.downloading"  # 下载中的临时文件
-        
-        try:
-            import os
-            
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            
-            # 检查是否已经下载完成
-            if os.path.exists(save_path):
-                logger.info(f"文件已存在，跳过下载: {save_path}")
+    def _request_get(self, url: str, params: Dict, category: str = "baidu_list") -> requests.Response:
+        """
+        经 baidupcs-py 的会话发送 GET 请求
+        按类别限速；被限流（HTTP 429 或 errno 31034）时降低该类接口的速率并重试；每次发送都计入统计
+        """
+        def is_throttled(response: requests.Response) -> bool:
+            if response.status_code == 429:
                 return True
+            if b"31034" in response.content[:200]:
+                try:
+                    return response.json().get("errno") == 31034
+                except ValueError:
+                    return False
+            return False
+        
+        send = lambda: self.stats.call(category, lambda: self.api._request_get(url, params=params))
+        return call_with_limiter(self.rate_limiters.get(category), send, is_throttled)
+    
+    def _file_stream(self, remote_path: str):
+        """
+        获取文件流（baidupcs-py 在此解析下载链接），按 baidu_meta 限速并计入统计
+        被限流（错误码 31034）时降低速率并重试；之后的 Range 读取由 baidupcs-py 自行发送，不经过限速器
+        """
+        limiter = self.rate_limiters.get("baidu_meta")
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            limiter.acquire()
+            start = time.monotonic()
+            try:
+                stream = self.api.file_stream(remote_path)
+            except Exception as e:
+                self.stats.api("baidu_meta", time.monotonic() - start)
+                if getattr(e, "error_code", None) != 31034 or attempt == MAX_THROTTLE_RETRIES:
+                    raise
+                limiter.on_throttle()
+                logger.debug(f"baidu_meta 请求被限流，重试 ({attempt + 1}/{MAX_THROTTLE_RETRIES})")
+                continue
+            self.stats.api("baidu_meta", time.monotonic() - start, 200 if stream else None)
+            limiter.on_success()
+            return stream
+    
+    def iter_files(self, dir_path: str = "/", page_size: int = 1000, strict: bool = False) -> Iterator[Dict]:
+        """
+        分页列出目录下的文件（不递归），逐页产出，内存只占一页
+        :param page_size: 每页条数
+        :param strict: 获取失败时抛出异常（默认只记录日志并结束）
+        """
+        # BaiduPCS.list 固定请求 limit=0-2147483647 一次取全，这里按页请求同一接口
+        start = 0
+        while True:
+            params = {
+                "method": "list",
+                "by": "name",
+                "order": "asc",
+                "limit": f"{start}-{start + page_size}",
+                "path": dir_path
+            }
+            try:
+                result = self._request_get(PcsNode.File.url(), params).json()
+            except Exception as e:
+                logger.error(f"列表获取异常: {str(e)}")
+                if strict:
+                    raise
+                return
             
-            # 检查是否有未完成的下载
-            resume_size = 0
-            if os.path.exists(temp_path):
-                resume_size = os.path.getsize(temp_path)
-                logger.info(f"发现未完成的下载，已下载: {resume_size / 1024 / 1024:.2f}MB")
-                # TODO: 实现断点续传（baidupcs-py 的 file_stream 不支持 range）
-                # 暂时删除重新下载
-                os.remove(temp_path)
-                resume_size = 0
-            
-            # 使用 baidupcs-py 的 file_stream 方法
-            logger.debug(f"开始下载: {remote_path}")
-            stream = self.api.file_stream(remote_path)
+            if result.get("error_code") or result.get("errno") or 'list' not in result:
+                logger.error(f"列表获取失败: {result}")
+                if strict:
+                    raise IOError(f"列表获取失败: {dir_path}")
+                return
             
-            if not stream:
-                logger.error(f"无法获取文件流: {remote_path}")
-                return False
+            file_list = result['list']
+            for item in file_list:
+                yield item
             
-            # 分块读取并写入临时文件
-            total_size = 0
-            chunk_size = 256 * 1024  # 256KB 每块
-            last_log_size = 0
+            # 不满一页说明已经是最后一页
+            if len(file_list) < page_size:
+                return
+            start += page_size
+    
+    def list_files(self, dir_path: str = "/", recursion: int = 0) -> List[Dict]:
+        """列出目录下的文件"""
+        file_list = list(self.iter_files(dir_path))
+        
+        # 如果需要递归
+        if recursion:
+            all_files = file_list.copy()
+            folders = [f for f in file_list if f.get('isdir') == 1]
             
-            with open(temp_path, 'wb') as f:
-                while True:
-                    try:
-                        chunk = stream.read(chunk_size)
-                        if not chunk:
-                            break
-                        f.write(chunk)
-                        total_size += len(chunk)
-                        
-                        # 每 10MB 打印一次进度
-                        if total_size - last_log_size >= 10 * 1024 * 1024:
-                            logger.info(f"  📥 下载进度: {total_size / 1024 / 1024:.2f}MB")
-                            last_log_size = total_size
-                    except Exception as e:
-                        logger.error(f"读取数据块失败: {str(e)}")
-                        break
+            for folder in folders:
+                sub_files = self.list_files(folder.get('path'), recursion)
+                all_files.extend(sub_files)
             
-            # 检查下载的文件
-            if os.path.exists(temp_path):
-                file_size = os.path.getsize(temp_path)
-                
-                # 如果文件大小为 0，认为下载失败
-                if file_size == 0:
-                    logger.error(f"下载的文件大小为 0")
-                    os.remove(temp_path)
-                    return False
-                
-                # 下载完成，重命名为正式文件
-                os.rename(temp_path, save_path)
-                logger.info(f"文件下载完成: {save_path} ({file_size / 1024 / 1024:.2f}MB)")
-                return True
-            else:
-                logger.error(f"下载的文件不存在: {temp_path}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"文件下载失败 {save_path}: {str(e)}")
-            # 保留 .downloading 文件，下次可以尝试续传
-            # 如果确定失败，可以手动删除
-            return False
+            return all_files
+        
+        return file_list
+    
+    def iter_file_content(self, remote_path: str, chunk_size: int = 256 * 1024,
+                          start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """
+        以数据块形式流式读取文件内容（不落盘）
+        :param start: 起始字节偏移
+        :param end: 结束字节偏移（含），None 表示读到文件末尾
+        """
+        stream = self._file_stream(remote_path)
+        if not stream:
+            raise IOError(f"无法获取文件流: {remote_path}")
+        
+        try:
+            # file_stream 返回的 RangeRequestIO 按 Range 请求读取，seek 不会下载跳过的数据
+            if start:
+                stream.seek(start)
+            remaining = None if end is None else end + 1 - start
+            while remaining is None or remaining > 0:
+                size = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = stream.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            stream.close()
+    
+    def download_file(self, remote_path: str, save_path: str,
+                      on_chunk: Optional[Callable[[bytes], None]] = None, file_size: Optional[int] = None,
+                      file_md5: Optional[str] = None) -> bool:
+        """
+        下载文件到本地（支持断点续传）
+        :param on_chunk: 每写入一个数据块后的回调（如边下载边计算哈希，分段下载时不调用）
+        :param file_size: 文件大小，用于分段下载和校验
+        :param file_md5: 百度网盘返回的 md5，用于校验续传的文件
+        """
+        # file_stream 返回的 RangeRequestIO 支持 seek，续传和分段下载都通过 Range 请求实现
+        logger.debug(f"开始下载: {remote_path}")
+        return self.downloader.download_file(
+            lambda start, end: self.iter_file_content(remote_path, start=start, end=end),
+            save_path, file_size=file_size, file_md5=file_md5, on_chunk=on_chunk)
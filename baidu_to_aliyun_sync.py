@@ -9,52 +9,124 @@ import os
 import sys
 import json
 import time
+import base64
+import random
+import signal
 import hashlib
 import logging
+import itertools
+import functools
+import threading
+import contextlib
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Optional, Set
+from typing import Callable, Dict, Iterator, List, Optional, Set
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import pickle
 
-# 导入新的百度网盘客户端
+from sync_progress import ProgressJournal
+from stream_pipe import RingBuffer, start_producer
+from segmented_download import SegmentedDownloader
+from crawler import DirectoryCrawler
+from sync_manifest import SyncManifest
+from dlink_resolver import DlinkResolver, DLINK_BATCH_SIZE
+from rate_limiter import RateLimiterRegistry, call_with_limiter
+from async_engine import AsyncTransferEngine, HAS_AIOHTTP
+from sync_stats import SyncStats
+from metrics_server import MetricsServer
+from pipeline import StagedFile, TransferPipeline
+from work_scheduler import TempSpaceBudget, WorkScheduler, SCHEDULE_POLICIES
+
+logger = logging.getLogger(__name__)
+
+# 如果需要调试，可以设置为 DEBUG
+# logger.setLevel(logging.DEBUG)
+
+# 导入新的百度网盘客户端（未安装时在创建百度客户端时输出警告）
 try:
     from baidu_client_pcs import BaiduPanClientPCS
     USE_BAIDUPCS = True
 except ImportError:
     USE_BAIDUPCS = False
-    logger.warning("baidupcs-py 未安装，将使用原始方法（可能会遇到下载限制）")
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,  # INFO 级别，简洁清晰
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('sync.log', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-logger = logging.getLogger(__name__)
 
-# 如果需要调试，可以设置为 DEBUG
-# logger.setLevel(logging.DEBUG)
+def setup_logging(log_file: str = "sync.log"):
+    """
+    配置日志输出到控制台和日志文件
+    
+    只在命令行入口调用，作为模块导入（测试、bench）时不会在当前目录生成日志文件
+    
+    :param log_file: 日志文件路径，为空时只输出到控制台
+    """
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file, encoding='utf-8'))
+    logging.basicConfig(
+        level=logging.INFO,  # INFO 级别，简洁清晰
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+# 默认接口地址（可在配置中改为本地模拟服务，见 bench/）
+BAIDU_API_URL = "https://pan.baidu.com/rest/2.0/xpan"
+BAIDU_WEB_URL = "https://pan.baidu.com"
+ALIYUN_API_URL = "https://api.aliyundrive.com"
+
+
+def create_retry_session(pool_size: int = 10, retries: int = 5, backoff_factor: float = 0.5) -> requests.Session:
+    """
+    创建带重试机制和连接池的 requests session（线程安全，各线程共享以复用 keep-alive 连接）
+    :param pool_size: 每个主机保持的连接数，应不小于同时访问该主机的线程数
+    """
+    session = requests.Session()
+    
+    # 配置重试策略
+    retry_strategy = Retry(
+        total=retries,  # 总重试次数
+        backoff_factor=backoff_factor,  # 重试间隔指数退避因子
+        status_forcelist=[500, 502, 503, 504],  # 需要重试的 HTTP 状态码（429 限流由限速器处理）
+        allowed_methods=["HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE", "POST"]  # 允许重试的方法
+    )
+    
+    adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    
+    return session
 
 
 class BaiduPanClient:
     """百度网盘客户端"""
     
-    def __init__(self, cookie: str = None, access_token: str = None):
+    def __init__(self, cookie: str = None, access_token: str = None, downloader: SegmentedDownloader = None,
+                 pool_size: int = 10, rate_limiters: Optional[RateLimiterRegistry] = None,
+                 stats: Optional[SyncStats] = None, base_url: str = BAIDU_API_URL, web_url: str = BAIDU_WEB_URL):
         """
         初始化百度网盘客户端
         :param cookie: 百度网盘 Cookie（推荐）
         :param access_token: 百度网盘 Access Token（备用）
+        :param downloader: 大文件分段下载器（默认不分段）
+        :param pool_size: HTTP 连接池大小
+        :param rate_limiters: 按接口类别的自适应限速器
+        :param stats: 接口调用统计
+        :param base_url: 开放平台接口地址（access_token 方式）
+        :param web_url: 网页版接口地址（Cookie 方式）
         """
         self.cookie = cookie
         self.access_token = access_token
-        self.base_url = "https://pan.baidu.com/rest/2.0/xpan"
-        self.web_url = "https://pan.baidu.com"
+        self.base_url = base_url.rstrip("/")
+        self.web_url = web_url.rstrip("/")
+        self.downloader = downloader or SegmentedDownloader(segment_count=1)
+        
+        # 所有请求共用一个带重试的连接池，避免每次请求重新握手
+        self.session = create_retry_session(pool_size)
+        self.rate_limiters = rate_limiters or RateLimiterRegistry()
+        self.stats = stats or SyncStats()
+        
+        # 下载链接批量解析并缓存（一次 filemetas 请求最多解析 100 个文件）
+        self.dlinks = DlinkResolver(self.get_download_links)
         
         # 如果使用 Cookie，需要提取 BDUSS
         if cookie and not access_token:
@@ -73,6 +145,28 @@ class BaiduPanClient:
         except Exception as e:
             logger.error(f"提取 BDUSS 失败: {str(e)}")
     
+    def _request(self, category: str, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        发送请求（所有接口调用都经过这里，共用连接池）
+        :param category: 接口类别（baidu_list 列目录 / baidu_meta 获取下载链接 / baidu_download 下载）
+        按类别限速；被限流（HTTP 429 或 errno 31034）时降低该类接口的速率并重试；每次发送都计入统计
+        """
+        check_errno = not kwargs.get("stream")
+        
+        def is_throttled(response: requests.Response) -> bool:
+            if response.status_code == 429:
+                return True
+            # 百度限流时多数接口仍返回 200，错误码在 JSON 中
+            if check_errno and b"31034" in response.content[:200]:
+                try:
+                    return response.json().get("errno") == 31034
+                except ValueError:
+                    return False
+            return False
+        
+        send = lambda: self.stats.call(category, lambda: self.session.request(method, url, **kwargs))
+        return call_with_limiter(self.rate_limiters.get(category), send, is_throttled)
+    
     def _get_headers(self) -> Dict:
         """获取请求头"""
         headers = {
@@ -83,51 +177,45 @@ class BaiduPanClient:
             headers["Cookie"] = self.cookie
         return headers
         
-    def list_files(self, dir_path: str = "/", recursion: int = 0) -> List[Dict]:
-        """列出目录下的文件"""
-        logger.debug(f"列出文件: {dir_path}, 递归: {recursion}")
+    def iter_files(self, dir_path: str = "/", page_size: int = 1000, strict: bool = False) -> Iterator[Dict]:
+        """
+        分页列出目录下的文件（不递归），逐页产出，内存只占一页
+        :param page_size: 每页条数（接口上限 1000）
+        :param strict: 获取失败时抛出异常（默认只记录日志并结束）
+        """
+        page = 1
+        while True:
+            file_list = self._list_page(dir_path, page, page_size)
+            if file_list is None:
+                if strict:
+                    raise IOError(f"列表获取失败: {dir_path}")
+                return
+            
+            for item in file_list:
+                yield item
+            
+            # 不满一页说明已经是最后一页
+            if len(file_list) < page_size:
+                return
+            page += 1
+    
+    def _list_page(self, dir_path: str, page: int, page_size: int) -> Optional[List[Dict]]:
+        """获取目录列表的一页（page 从 1 开始），失败返回 None"""
+        logger.debug(f"列出文件: {dir_path}, 第 {page} 页")
         
         # 使用 Cookie 方式
         if self.cookie:
             url = f"{self.web_url}/api/list"
             params = {
                 "dir": dir_path,
-                "num": 1000,
+                "page": page,
+                "num": page_size,
                 "order": "name",
                 "desc": 0,
                 "web": 1
                 # 不设置 folder 参数,获取所有文件和文件夹
             }
-            
-            try:
-                logger.debug(f"请求百度云盘 API: {url}")
-                response = requests.get(url, params=params, headers=self._get_headers(), timeout=30)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("errno") == 0:
-                    file_list = data.get("list", [])
-                    logger.debug(f"获取到 {len(file_list)} 个项目")
-                    
-                    # 如果需要递归，获取子文件夹内容
-                    if recursion:
-                        all_files = file_list.copy()
-                        folders = [f for f in file_list if f.get("isdir") == 1]
-                        logger.debug(f"需要递归 {len(folders)} 个子文件夹")
-                        for folder in folders:
-                            logger.debug(f"递归获取: {folder.get('path')}")
-                            sub_files = self.list_files(folder.get("path"), recursion)
-                            all_files.extend(sub_files)
-                        logger.debug(f"递归完成，总共 {len(all_files)} 个项目")
-                        return all_files
-                    
-                    return file_list
-                else:
-                    logger.error(f"百度云盘列表获取失败: {data.get('errmsg', '未知错误')}")
-                    return []
-            except Exception as e:
-                logger.error(f"百度云盘API调用失败: {str(e)}")
-                return []
+            headers = self._get_headers()
         
         # 使用 Access Token 方式（备用）
         else:
@@ -136,133 +224,322 @@ class BaiduPanClient:
                 "method": "list",
                 "access_token": self.access_token,
                 "dir": dir_path,
-                "recursion": recursion,
+                "start": (page - 1) * page_size,
+                "limit": page_size,
                 "web": 1
             }
+            headers = None
+        
+        try:
+            logger.debug(f"请求百度云盘 API: {url}")
+            response = self._request("baidu_list", "GET", url, params=params, headers=headers, timeout=30)
+            response.raise_for_status()
+            data = response.json()
             
-            try:
-                response = requests.get(url, params=params, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("errno") == 0:
-                    return data.get("list", [])
-                else:
-                    logger.error(f"百度云盘列表获取失败: {data.get('errmsg', '未知错误')}")
-                    return []
-            except Exception as e:
-                logger.error(f"百度云盘API调用失败: {str(e)}")
-                return []
+            if data.get("errno") == 0:
+                file_list = data.get("list", [])
+                logger.debug(f"获取到 {len(file_list)} 个项目")
+                return file_list
+            else:
+                logger.error(f"百度云盘列表获取失败: {data.get('errmsg', '未知错误')}")
+                return None
+        except Exception as e:
+            logger.error(f"百度云盘API调用失败: {str(e)}")
+            return None
+    
+    def list_files(self, dir_path: str = "/", recursion: int = 0) -> List[Dict]:
+        """列出目录下的文件"""
+        logger.debug(f"列出文件: {dir_path}, 递归: {recursion}")
+        
+        file_list = list(self.iter_files(dir_path))
+        
+        # 如果需要递归，获取子文件夹内容
+        if recursion:
+            all_files = file_list.copy()
+            folders = [f for f in file_list if f.get("isdir") == 1]
+            logger.debug(f"需要递归 {len(folders)} 个子文件夹")
+            for folder in folders:
+                logger.debug(f"递归获取: {folder.get('path')}")
+                sub_files = self.list_files(folder.get("path"), recursion)
+                all_files.extend(sub_files)
+            logger.debug(f"递归完成，总共 {len(all_files)} 个项目")
+            return all_files
+        
+        return file_list
     
     def get_download_link(self, fs_id: int) -> Optional[str]:
-        """获取文件下载链接"""
-        # 使用 Cookie 方式
-        if self.cookie:
-            # 使用 /api/filemetas 接口获取下载链接
-            url = f"{self.web_url}/api/filemetas"
-            params = {
-                "fsids": json.dumps([fs_id]),
-                "dlink": 1,
-                "web": 1
-            }
+        """获取文件下载链接（优先使用缓存，未命中时与其他待下载文件一起批量获取）"""
+        return self.dlinks.get(fs_id)
+    
+    def get_download_links(self, fs_ids: List[int]) -> Dict[int, str]:
+        """批量获取下载链接（每次最多 100 个），返回 {fs_id: dlink}"""
+        links: Dict[int, str] = {}
+        for i in range(0, len(fs_ids), DLINK_BATCH_SIZE):
+            batch = fs_ids[i:i + DLINK_BATCH_SIZE]
+            
+            # 使用 Cookie 方式：/api/filemetas 接口
+            if self.cookie:
+                url = f"{self.web_url}/api/filemetas"
+                params = {
+                    "fsids": json.dumps(batch),
+                    "dlink": 1,
+                    "web": 1
+                }
+                headers = self._get_headers()
+                list_key = "info"
+            
+            # 使用 Access Token 方式（备用）
+            else:
+                url = f"{self.base_url}/file"
+                params = {
+                    "method": "filemetas",
+                    "access_token": self.access_token,
+                    "fsids": json.dumps(batch),
+                    "dlink": 1
+                }
+                headers = None
+                list_key = "list"
             
             try:
-                logger.debug(f"请求下载链接: fs_id={fs_id}")
-                response = requests.get(url, params=params, headers=self._get_headers(), timeout=30)
+                logger.debug(f"请求下载链接: {len(batch)} 个文件")
+                response = self._request("baidu_meta", "GET", url, params=params, headers=headers, timeout=30)
                 logger.debug(f"响应状态码: {response.status_code}")
-                
+                response.raise_for_status()
                 data = response.json()
                 
-                if data.get("errno") == 0:
-                    info_list = data.get("info", [])
-                    if info_list and len(info_list) > 0:
-                        dlink = info_list[0].get("dlink")
-                        if dlink:
-                            logger.debug(f"成功获取下载链接: {dlink[:100]}...")
-                            return dlink
-                        else:
-                            logger.error(f"响应中没有 dlink 字段")
-                    else:
-                        logger.error(f"响应中没有 info 列表")
-                else:
+                if data.get("errno") != 0:
                     logger.error(f"获取下载链接失败: errno={data.get('errno')}, errmsg={data.get('errmsg', '未知错误')}")
-                return None
+                    continue
+                
+                for info in data.get(list_key) or []:
+                    if info.get("dlink"):
+                        links[info.get("fs_id")] = info["dlink"]
+                missing = len(batch) - sum(1 for fs_id in batch if fs_id in links)
+                if missing:
+                    logger.error(f"{missing} 个文件的响应中没有 dlink 字段")
             except Exception as e:
                 logger.error(f"获取下载链接异常: {str(e)}")
-                return None
         
-        # 使用 Access Token 方式（备用）
-        else:
-            url = f"{self.base_url}/file"
-            params = {
-                "method": "filemetas",
-                "access_token": self.access_token,
-                "fsids": json.dumps([fs_id]),
-                "dlink": 1
-            }
-            
-            try:
-                response = requests.get(url, params=params, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("errno") == 0 and data.get("list"):
-                    return data["list"][0].get("dlink")
-                return None
-            except Exception as e:
-                logger.error(f"获取下载链接失败: {str(e)}")
-                return None
+        return links
     
-    def download_file(self, download_url: str, save_path: str) -> bool:
-        """下载文件到本地"""
+    def _get_download_headers(self) -> Dict:
+        """获取下载请求头"""
         # 百度网盘下载需要特定的请求头
-        headers = {
+        return {
             "User-Agent": "pan.baidu.com",  # 关键：使用百度网盘的 User-Agent
             "Referer": "https://pan.baidu.com/",
             "Cookie": self.cookie if self.cookie else ""
         }
+    
+    def iter_file_content(self, download_url: str, chunk_size: int = 256 * 1024,
+                          start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """
+        以数据块形式流式读取文件内容（不落盘）
+        :param start: 起始字节偏移
+        :param end: 结束字节偏移（含），None 表示读到文件末尾
+        """
+        headers = self._get_download_headers()
+        ranged = start > 0 or end is not None
+        if ranged:
+            headers["Range"] = f"bytes={start}-{'' if end is None else end}"
         
+        response = self._request("baidu_download", "GET", download_url, headers=headers, stream=True, timeout=60)
         try:
-            response = requests.get(download_url, headers=headers, stream=True, timeout=60)
             response.raise_for_status()
-            
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            
-            logger.info(f"文件下载成功: {save_path}")
-            return True
-        except Exception as e:
-            logger.error(f"文件下载失败 {save_path}: {str(e)}")
-            return False
+            if ranged and response.status_code != 206:
+                raise IOError(f"下载链接不支持 Range 请求，状态码: {response.status_code}")
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    yield chunk
+        finally:
+            response.close()
+    
+    def iter_dlink_content(self, fs_id: int, chunk_size: int = 256 * 1024,
+                           start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """按 fs_id 流式读取文件内容，下载链接过期（403）时刷新链接后重试一次"""
+        for attempt in range(2):
+            download_url = self.dlinks.get(fs_id)
+            if not download_url:
+                raise IOError(f"无法获取下载链接: fs_id={fs_id}")
+            try:
+                # 403 在返回第一个数据块之前抛出，重试不会产生重复数据
+                yield from self.iter_file_content(download_url, chunk_size, start, end)
+                return
+            except requests.HTTPError as e:
+                if attempt or e.response is None or e.response.status_code != 403:
+                    raise
+                logger.info(f"  下载链接已过期，重新获取: fs_id={fs_id}")
+                self.dlinks.invalidate(fs_id, download_url)
+    
+    def download_file(self, download_url: str, save_path: str,
+                      on_chunk: Optional[Callable[[bytes], None]] = None, file_size: Optional[int] = None,
+                      file_md5: Optional[str] = None, fs_id: Optional[int] = None) -> bool:
+        """
+        下载文件到本地（支持断点续传）
+        :param on_chunk: 每写入一个数据块后的回调（如边下载边计算哈希，分段下载时不调用）
+        :param file_size: 文件大小，用于分段下载和校验
+        :param file_md5: 百度网盘返回的 md5，用于校验续传的文件
+        :param fs_id: 提供时按 fs_id 取缓存的下载链接，链接过期会自动刷新
+        """
+        if fs_id is not None:
+            open_range = lambda start, end: self.iter_dlink_content(fs_id, start=start, end=end)
+        else:
+            open_range = lambda start, end: self.iter_file_content(download_url, start=start, end=end)
+        return self.downloader.download_file(open_range, save_path, file_size=file_size, file_md5=file_md5,
+                                             on_chunk=on_chunk)
+
+
+# 阿里云盘预哈希只取文件前 1KB
+PRE_HASH_SIZE = 1024
+# 阿里云盘 access_token 的默认有效期（秒），以及提前刷新的时间
+ALIYUN_TOKEN_TTL = 7200
+TOKEN_REFRESH_MARGIN = 300
+# 续传时一次 get_upload_url 请求获取的分片上传URL数
+UPLOAD_URL_BATCH = 100
+
+
+class PreHashMatched(Exception):
+    """预哈希命中，需要完整文件哈希才能秒传"""
+
+
+class FolderNotFound(Exception):
+    """父文件夹不存在（通常是缓存的文件夹ID已失效）"""
+
+
+class UploadSession:
+    """进行中的分片上传（AliyunPanClient.begin_upload 创建，finish_upload 提交）"""
+    
+    def __init__(self, local_path: str, file_name: str, file_id: str, upload_id: str, part_size: int,
+                 part_count: int, pending: List[int], upload_urls: Dict[int, str]):
+        """
+        :param pending: 还需要上传的分片序号（续传时已上传的分片不在其中）
+        :param upload_urls: 已知的分片上传URL，缺少或过期时按需重新获取
+        """
+        self.local_path = local_path
+        self.file_name = file_name
+        self.file_id = file_id
+        self.upload_id = upload_id
+        self.part_size = part_size
+        self.part_count = part_count
+        self.pending = pending
+        self.upload_urls = upload_urls
+    
+    def read_part(self, part_number: int) -> bytes:
+        with open(self.local_path, 'rb') as f:
+            f.seek((part_number - 1) * self.part_size)
+            return f.read(self.part_size)
+
+
+def calc_pre_hash(local_path: str) -> str:
+    """计算文件前 1KB 的 SHA1"""
+    with open(local_path, 'rb') as f:
+        return hashlib.sha1(f.read(PRE_HASH_SIZE)).hexdigest()
+
+
+def calc_content_hash(local_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """流式计算完整文件的 SHA1（大写，阿里云盘 content_hash 格式）"""
+    sha1 = hashlib.sha1()
+    with open(local_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            sha1.update(chunk)
+    return sha1.hexdigest().upper()
+
+
+class ContentHasher:
+    """边下载边计算 SHA1，下载完成后即可直接尝试秒传"""
+    
+    def __init__(self):
+        self._sha1 = hashlib.sha1()
+        self.size = 0
+        self.seconds = 0.0  # 计算哈希累计耗时
+    
+    def update(self, chunk: bytes):
+        start = time.perf_counter()
+        self._sha1.update(chunk)
+        self.seconds += time.perf_counter() - start
+        self.size += len(chunk)
+    
+    def content_hash(self, expected_size: int) -> Optional[str]:
+        """数据完整时返回 content_hash，否则返回 None"""
+        if self.size != expected_size:
+            return None
+        return self._sha1.hexdigest().upper()
+
+
+class _FolderCall:
+    """一次进行中的文件夹查询/创建，等待者共享其结果"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
 
 
 class AliyunPanClient:
     """阿里云盘客户端"""
     
-    def __init__(self, cookie: str = None, refresh_token: str = None, access_token: str = None, drive_id: str = None):
+    # 默认分片大小，以及单个文件允许的最大分片数
+    DEFAULT_PART_SIZE = 10 * 1024 * 1024
+    MAX_PART_COUNT = 10000
+    
+    def __init__(self, cookie: str = None, refresh_token: str = None, access_token: str = None, drive_id: str = None,
+                 part_size: int = DEFAULT_PART_SIZE, upload_concurrency: int = 3, rapid_upload: bool = True,
+                 cache_dir: Optional[str] = None, dir_index_size: int = 256, pool_size: int = 10,
+                 rate_limiters: Optional[RateLimiterRegistry] = None, stats: Optional[SyncStats] = None,
+                 base_url: str = ALIYUN_API_URL):
         """
         初始化阿里云盘客户端
         :param cookie: 阿里云盘 Cookie（可选）
         :param refresh_token: 阿里云盘 Refresh Token（推荐）
         :param access_token: 阿里云盘 Access Token（可选，配合 drive_id 使用）
         :param drive_id: 阿里云盘 Drive ID（使用 access_token 时必需）
+        :param part_size: 分片上传的分片大小（字节）
+        :param upload_concurrency: 单个文件的分片并发上传数
+        :param rapid_upload: 是否尝试秒传（需要 access_token）
+        :param cache_dir: 文件夹ID缓存的持久化目录（None 表示只缓存在内存中）
+        :param dir_index_size: 内存中最多保留多少个目录的文件列表索引（LRU）
+        :param pool_size: HTTP 连接池大小（接口调用与分片上传共用）
+        :param rate_limiters: 按接口类别的自适应限速器
+        :param stats: 接口调用统计
+        :param base_url: 接口地址
         """
         self.cookie = cookie
         self.refresh_token = refresh_token
         self.access_token = access_token
         self.drive_id = drive_id
-        self.base_url = "https://api.aliyundrive.com"
+        self.base_url = base_url.rstrip("/")
         self.web_url = "https://www.aliyundrive.com"
         
+        # access_token 过期时间；刷新时只由一个线程执行，其余线程等待（按代数判断是否已被其他线程刷新）
+        # 令牌与代数只在持有 _token_lock 时成对读写（可重入：刷新时在锁内更新令牌）
+        self.token_expires_at: Optional[float] = None
+        self._token_lock = threading.RLock()
+        self._token_generation = 0
+        self._token_retry_at = 0.0  # 提前刷新失败后，暂缓到此时间再试
+        
         # 创建带重试机制的 session
-        self.session = self._create_retry_session()
+        self.session = create_retry_session(pool_size)
+        self.rate_limiters = rate_limiters or RateLimiterRegistry()
+        self.stats = stats or SyncStats()
         
-        # 文件夹路径缓存，避免重复查询/创建
+        self.part_size = part_size
+        self.upload_concurrency = max(1, upload_concurrency)
+        self.rapid_upload = rapid_upload
+        
+        # 文件夹路径缓存，避免重复查询/创建（按 drive_id 持久化到 cache_dir）
         self.folder_cache: Dict[str, str] = {"root": "root", "/": "root"}
+        self.cache_dir = cache_dir
+        self._folder_cache_lock = threading.Lock()
+        self._folder_cache_save_lock = threading.Lock()
+        self._folder_cache_dirty = 0
+        # 正在进行的文件夹查询/创建：同一路径只由一个线程执行，其余线程等待其结果
+        self._folder_calls: Dict[tuple, "_FolderCall"] = {}
+        # 目录文件索引：目录路径 -> {文件名: {file_id, size, content_hash}}，用于批量判断文件是否已存在
+        self._dir_index: "OrderedDict[str, Dict[str, Dict]]" = OrderedDict()
+        self.dir_index_size = max(1, dir_index_size)
         
         # 优先级：access_token > refresh_token > cookie
         if access_token and drive_id:
@@ -281,24 +558,140 @@ class AliyunPanClient:
                 raise ValueError("Cookie 认证失败，建议使用 refresh_token 或 access_token")
         else:
             raise ValueError("必须提供 access_token+drive_id、refresh_token 或 cookie 之一")
+        
+        # 认证完成后才知道 drive_id，再加载对应的文件夹缓存
+        self._load_folder_cache()
+    
+    def _folder_cache_file(self) -> Optional[str]:
+        """文件夹缓存文件路径（按 drive_id 区分）"""
+        if not self.cache_dir or not self.drive_id:
+            return None
+        return os.path.join(self.cache_dir, f".aliyun_folder_cache_{self.drive_id}.json")
     
-    def _create_retry_session(self, retries=5, backoff_factor=0.5):
-        """创建带重试机制的 requests session"""
-        session = requests.Session()
+    def _load_folder_cache(self):
+        """加载持久化的文件夹ID缓存"""
+        cache_file = self._folder_cache_file()
+        if not cache_file or not os.path.exists(cache_file):
+            return
         
-        # 配置重试策略
-        retry_strategy = Retry(
-            total=retries,  # 总重试次数
-            backoff_factor=backoff_factor,  # 重试间隔指数退避因子
-            status_forcelist=[429, 500, 502, 503, 504],  # 需要重试的 HTTP 状态码
-            allowed_methods=["HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE", "POST"]  # 允许重试的方法
-        )
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            with self._folder_cache_lock:
+                self.folder_cache.update(cached)
+            logger.info(f"加载文件夹缓存: {len(cached)} 个文件夹")
+        except Exception as e:
+            logger.warning(f"加载文件夹缓存失败: {str(e)}")
+    
+    def save_folder_cache(self):
+        """保存文件夹ID缓存（写临时文件后原子替换）"""
+        cache_file = self._folder_cache_file()
+        if not cache_file:
+            return
+        
+        # 写文件也要串行：工作线程的自动保存与各任务结束时的保存可能同时进行，
+        # 在写锁内取快照，保证最后落盘的是最新的快照
+        with self._folder_cache_save_lock:
+            with self._folder_cache_lock:
+                if not self._folder_cache_dirty:
+                    return
+                snapshot = dict(self.folder_cache)
+                self._folder_cache_dirty = 0
+            
+            try:
+                tmp_file = f"{cache_file}.tmp"
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, ensure_ascii=False)
+                os.replace(tmp_file, cache_file)
+            except Exception as e:
+                logger.warning(f"保存文件夹缓存失败: {str(e)}")
+    
+    def _cache_folder(self, folder_path: str, file_id: str):
+        """加入文件夹缓存，每新增一批保存一次"""
+        with self._folder_cache_lock:
+            self.folder_cache[folder_path] = file_id
+            self._folder_cache_dirty += 1
+            should_save = self._folder_cache_dirty >= 100
+        if should_save:
+            self.save_folder_cache()
+    
+    def invalidate_folder(self, folder_path: str):
+        """缓存的文件夹ID失效（如文件夹在网页端被删除），移除该路径及其子路径"""
+        folder_path = "/" + folder_path.strip().strip("/")
+        with self._folder_cache_lock:
+            stale = [key for key in self.folder_cache
+                     if key not in ("root", "/") and (key == folder_path or key.startswith(folder_path + "/"))]
+            for key in stale:
+                del self.folder_cache[key]
+            if stale:
+                self._folder_cache_dirty += 1
+            for key in [key for key in self._dir_index
+                        if key == folder_path or key.startswith(folder_path + "/")]:
+                del self._dir_index[key]
+        if stale:
+            logger.info(f"文件夹缓存已失效，移除 {len(stale)} 条: {folder_path}")
+    
+    def clear_dir_index(self):
+        """清空目录文件索引（守护模式每轮重新扫描前调用，文件夹ID缓存保留）"""
+        with self._folder_cache_lock:
+            self._dir_index.clear()
+    
+    def _request(self, category: str, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        发送请求（所有接口调用都经过这里，共用连接池）
+        :param category: 接口类别（aliyun_meta 元数据接口 / aliyun_upload 分片上传）
+        按类别限速；被限流（HTTP 429）时降低该类接口的速率并重试
+        带 Bearer 令牌的请求：令牌即将过期时先刷新；返回 401 时刷新令牌后重发一次
+        每次发送都计入统计（分片上传同时记录上传的字节数）
+        """
+        headers = kwargs.get("headers") or {}
+        authorized = self.refresh_token and headers.get("Authorization", "").startswith("Bearer ")
+        generation = None
+        if authorized:
+            self._ensure_token_fresh()
+            # 令牌和代数一起读取，401 时才能判断令牌是否已被其他线程刷新过
+            with self._token_lock:
+                generation, access_token = self._token_generation, self.access_token
+            kwargs["headers"] = dict(headers, Authorization=f"Bearer {access_token}")
         
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        session.mount("https://", adapter)
-        session.mount("http://", adapter)
+        limiter = self.rate_limiters.get(category)
+        is_throttled = lambda response: response.status_code == 429
+        data = kwargs.get("data")
+        nbytes = len(data) if isinstance(data, (bytes, bytearray, memoryview)) else 0
+        send = lambda: self.stats.call(category, lambda: self.session.request(method, url, **kwargs), nbytes)
+        response = call_with_limiter(limiter, send, is_throttled)
         
-        return session
+        if response.status_code == 401 and authorized:
+            logger.debug("阿里云盘令牌已失效，刷新后重试请求")
+            if self._refresh_token_once(generation):
+                response.close()
+                kwargs["headers"] = dict(kwargs["headers"], Authorization=f"Bearer {self.access_token}")
+                response = call_with_limiter(limiter, send, is_throttled)
+        return response
+    
+    def _ensure_token_fresh(self):
+        """令牌即将过期时提前刷新"""
+        with self._token_lock:
+            generation, expires_at = self._token_generation, self.token_expires_at
+        now = time.time()
+        if expires_at is not None and now >= expires_at - TOKEN_REFRESH_MARGIN and now >= self._token_retry_at:
+            if not self._refresh_token_once(generation):
+                self._token_retry_at = now + 30
+    
+    def _refresh_token_once(self, generation: int) -> bool:
+        """
+        刷新令牌（多个线程同时发现令牌失效时只刷新一次）
+        :param generation: 调用方发出请求时的令牌代数；已被其他线程刷新过则直接返回
+        :return: 当前令牌是否比该代数新
+        """
+        with self._token_lock:
+            if self._token_generation != generation:
+                return True
+            try:
+                self._refresh_access_token()
+            except Exception:
+                return False
+            return True
     
     def _verify_access_token(self):
         """验证 Access Token 是否有效"""
@@ -309,7 +702,7 @@ class AliyunPanClient:
                 "Content-Type": "application/json"
             }
             
-            response = self.session.post(url, headers=headers, json={}, timeout=30)
+            response = self._request("aliyun_meta", "POST", url, headers=headers, json={}, timeout=30)
             
             if response.status_code == 200:
                 result = response.json()
@@ -350,7 +743,7 @@ class AliyunPanClient:
                 "Content-Type": "application/json"
             }
             
-            response = self.session.post(url, headers=headers, json={}, timeout=30)
+            response = self._request("aliyun_meta", "POST", url, headers=headers, json={}, timeout=30)
             
             if response.status_code == 200:
                 result = response.json()
@@ -382,15 +775,19 @@ class AliyunPanClient:
         }
         
         try:
-            response = self.session.post(url, json=data, timeout=30)
+            response = self._request("aliyun_meta", "POST", url, json=data, timeout=30)
             response.raise_for_status()
             result = response.json()
             
-            self.access_token = result.get("access_token")
-            self.refresh_token = result.get("refresh_token")
-            self.drive_id = result.get("default_drive_id")
+            # 新令牌与代数在同一临界区内更新，其他线程不会读到新令牌配旧代数
+            with self._token_lock:
+                self.access_token = result.get("access_token")
+                self.refresh_token = result.get("refresh_token") or self.refresh_token
+                self.drive_id = result.get("default_drive_id") or self.drive_id
+                self.token_expires_at = time.time() + (result.get("expires_in") or ALIYUN_TOKEN_TTL)
+                self._token_generation += 1
             
-            logger.info("阿里云盘令牌刷新成功")
+            logger.info(f"阿里云盘令牌刷新成功，有效期 {result.get('expires_in') or ALIYUN_TOKEN_TTL} 秒")
         except Exception as e:
             logger.error(f"阿里云盘令牌刷新失败: {str(e)}")
             raise
@@ -419,7 +816,7 @@ class AliyunPanClient:
         }
         
         try:
-            response = self.session.post(url, json=data, headers=self._get_headers(), timeout=30)
+            response = self._request("aliyun_meta", "POST", url, json=data, headers=self._get_headers(), timeout=30)
             if response.status_code == 200:
                 return response.json()
             elif response.status_code == 404:
@@ -439,18 +836,16 @@ class AliyunPanClient:
             "drive_id": self.drive_id,
             "parent_file_id": parent_file_id,
             "name": folder_name,
-            "check_name_mode": "auto_rename",  # 改为自动重命名，避免冲突
+            "check_name_mode": "refuse",  # 同名文件夹已存在时返回已有文件夹，避免产生 "foo(1)"
             "type": "folder"
         }
         
         try:
-            # 添加延迟，避免请求过快
-            if retry_count > 0:
-                delay = retry_count * 1.0  # 递增延迟
-                logger.info(f"  等待 {delay}s 后重试...")
-                time.sleep(delay)
+            response = self._request("aliyun_meta", "POST", url, json=data, headers=self._get_headers(), timeout=30)
             
-            response = self.session.post(url, json=data, headers=self._get_headers(), timeout=30)
+            # 父文件夹不存在：缓存的ID已失效，交给调用方处理
+            if response.status_code == 404:
+                raise FolderNotFound(parent_file_id)
             
             # 详细的错误信息
             # 201 Created 也是成功状态
@@ -480,10 +875,14 @@ class AliyunPanClient:
             if retry_count < max_retries:
                 logger.warning(f"文件夹创建遇到网络错误 '{folder_name}': {str(e)}")
                 logger.info(f"正在重试 ({retry_count + 1}/{max_retries})...")
+                # 网络错误通常出现在请求过密时，降低元数据接口的速率后再试
+                self.rate_limiters.get("aliyun_meta").on_throttle()
                 return self.create_folder(parent_file_id, folder_name, retry_count + 1, max_retries)
             else:
                 logger.error(f"文件夹创建失败 '{folder_name}' (已达最大重试次数): {str(e)}")
                 return None
+        except FolderNotFound:
+            raise
         except Exception as e:
             logger.error(f"文件夹创建异常 '{folder_name}': {str(e)}")
             return None
@@ -499,7 +898,7 @@ class AliyunPanClient:
                 "type": "folder"
             }
             
-            response = self.session.post(url, json=data, headers=self._get_headers(), timeout=30)
+            response = self._request("aliyun_meta", "POST", url, json=data, headers=self._get_headers(), timeout=30)
             if response.status_code == 200:
                 result = response.json()
                 items = result.get("items", [])
@@ -511,81 +910,456 @@ class AliyunPanClient:
             logger.error(f"获取文件夹ID失败: {str(e)}")
             return None
     
-    def create_file(self, parent_file_id: str, file_name: str, file_size: int) -> Optional[Dict]:
-        """创建文件（获取上传URL）"""
+    def iter_folder(self, parent_file_id: str, limit: int = 100) -> Iterator[Dict]:
+        """分页列出文件夹下的全部条目（按 next_marker 翻页），请求失败时抛出异常"""
+        url = f"{self.base_url}/adrive/v3/file/list"
+        marker = ""
+        while True:
+            data = {
+                "drive_id": self.drive_id,
+                "parent_file_id": parent_file_id,
+                "limit": limit,
+                "marker": marker,
+                "fields": "*"
+            }
+            response = self._request("aliyun_meta", "POST", url, json=data, headers=self._get_headers(), timeout=30)
+            if response.status_code == 404:
+                raise FolderNotFound(parent_file_id)
+            if response.status_code != 200:
+                raise IOError(f"列出文件夹失败: {response.status_code} - {response.text[:200]}")
+            
+            result = response.json()
+            for item in result.get("items", []):
+                yield item
+            marker = result.get("next_marker") or ""
+            if not marker:
+                return
+    
+    def _build_dir_index(self, dir_path: str) -> Optional[Dict[str, Dict]]:
+        """列出目录并建立文件名索引；目录不存在时返回空索引，列出失败返回 None"""
+        with self._folder_cache_lock:
+            folder_id = self.folder_cache.get(dir_path)
+        if not folder_id:
+            folder_id = self._single_flight(("lookup", dir_path), lambda: self._lookup_folder(dir_path))
+        
+        index: Dict[str, Dict] = {}
+        if folder_id:
+            try:
+                for item in self.iter_folder(folder_id):
+                    if item.get("type") == "file":
+                        index[item.get("name")] = {
+                            "file_id": item.get("file_id"),
+                            "size": item.get("size"),
+                            "content_hash": item.get("content_hash")
+                        }
+            except FolderNotFound:
+                # 缓存的文件夹ID已失效，当作目录不存在
+                self.invalidate_folder(dir_path)
+                index = {}
+            except Exception as e:
+                logger.warning(f"建立目录索引失败 {dir_path}: {str(e)}")
+                return None
+            logger.debug(f"目录索引: {dir_path}, {len(index)} 个文件")
+        
+        with self._folder_cache_lock:
+            self._dir_index[dir_path] = index
+            self._dir_index.move_to_end(dir_path)
+            while len(self._dir_index) > self.dir_index_size:
+                self._dir_index.popitem(last=False)
+        return index
+    
+    def find_file(self, dir_path: str, file_name: str) -> Optional[Dict]:
+        """
+        查询目录下的同名文件（同一目录只列出一次，之后查内存索引）
+        :return: {file_id, size, content_hash}，不存在时返回 None
+        """
+        dir_path = "/" + dir_path.strip().strip("/")
+        with self._folder_cache_lock:
+            index = self._dir_index.get(dir_path)
+            if index is not None:
+                self._dir_index.move_to_end(dir_path)
+        if index is None:
+            index = self._single_flight(("index", dir_path), lambda: self._build_dir_index(dir_path))
+        
+        if index is None:
+            # 索引不可用，退回单文件查询
+            existing = self.get_file_by_path(f"{dir_path.rstrip('/')}/{file_name}")
+            if existing and existing.get("type", "file") == "file":
+                return existing
+            return None
+        
+        with self._folder_cache_lock:
+            return index.get(file_name)
+    
+    def record_file(self, dir_path: str, file_name: str, file_size: int, content_hash: Optional[str] = None):
+        """上传成功后把文件加入目录索引（目录未建索引时忽略）"""
+        dir_path = "/" + dir_path.strip().strip("/")
+        with self._folder_cache_lock:
+            index = self._dir_index.get(dir_path)
+            if index is not None:
+                index[file_name] = {"file_id": None, "size": file_size, "content_hash": content_hash}
+    
+    def _calc_part_size(self, file_size: int) -> int:
+        """计算分片大小（分片数不超过上限）"""
+        part_size = self.part_size
+        if file_size > part_size * self.MAX_PART_COUNT:
+            part_size = -(-file_size // self.MAX_PART_COUNT)
+        return part_size
+    
+    def create_file(self, parent_file_id: str, file_name: str, file_size: int, part_count: int = 1,
+                    pre_hash: Optional[str] = None, content_hash: Optional[str] = None,
+                    proof_code: Optional[str] = None, check_name_mode: str = "auto_rename") -> Optional[Dict]:
+        """
+        创建文件（获取上传URL）
+        :param pre_hash: 文件前 1KB 的 SHA1，服务端命中时返回 code=PreHashMatched
+        :param content_hash: 完整文件 SHA1（大写），配合 proof_code 尝试秒传
+        :param check_name_mode: 同名文件处理方式（auto_rename 自动重命名，overwrite 覆盖）
+        """
         url = f"{self.base_url}/adrive/v2/file/createWithFolders"
         
-        # 计算文件的预创建hash（这里简化处理）
         data = {
             "drive_id": self.drive_id,
             "parent_file_id": parent_file_id,
             "name": file_name,
             "type": "file",
-            "check_name_mode": "auto_rename",
+            "check_name_mode": check_name_mode,
             "size": file_size,
-            "part_info_list": [{"part_number": 1}]
+            "part_info_list": [{"part_number": i} for i in range(1, part_count + 1)]
         }
+        if content_hash:
+            data.update({
+                "content_hash_name": "sha1",
+                "content_hash": content_hash,
+                "proof_code": proof_code,
+                "proof_version": "v1"
+            })
+        elif pre_hash:
+            data["pre_hash"] = pre_hash
         
         try:
-            response = requests.post(url, json=data, headers=self._get_headers(), timeout=30)
+            response = self._request("aliyun_meta", "POST", url, json=data, headers=self._get_headers(), timeout=30)
+            
+            # 预哈希命中：服务端可能已有该文件，需要完整哈希才能秒传
+            if response.status_code == 409 and pre_hash and not content_hash:
+                result = response.json()
+                if result.get("code") == "PreHashMatched":
+                    return result
+            
+            # 父文件夹不存在：缓存的ID已失效，交给调用方处理
+            if response.status_code == 404:
+                raise FolderNotFound(parent_file_id)
+            
             response.raise_for_status()
             result = response.json()
             
             return result
+        except FolderNotFound:
+            raise
         except Exception as e:
             logger.error(f"文件创建失败 {file_name}: {str(e)}")
             return None
     
-    def upload_file(self, local_path: str, parent_file_id: str, file_name: str) -> bool:
-        """上传文件"""
+    def _calc_proof_code(self, local_path: str, file_size: int) -> str:
+        """计算秒传校验码：按 access_token 决定的偏移读取 8 字节"""
+        if file_size == 0:
+            return ""
+        offset = int(hashlib.md5(self.access_token.encode()).hexdigest()[:16], 16) % file_size
+        with open(local_path, 'rb') as f:
+            f.seek(offset)
+            return base64.b64encode(f.read(8)).decode()
+    
+    def _create_file_rapid(self, local_path: str, parent_file_id: str, file_name: str, file_size: int,
+                           part_count: int, content_hash: Optional[str] = None,
+                           check_name_mode: str = "auto_rename") -> Optional[Dict]:
+        """创建文件并尝试秒传；未命中时返回普通的上传会话"""
+        if not self.rapid_upload or not self.access_token:
+            return self.create_file(parent_file_id, file_name, file_size, part_count,
+                                    check_name_mode=check_name_mode)
+        
+        # 下载时已算好完整哈希，直接一次请求尝试秒传
+        if not content_hash:
+            create_result = self.create_file(parent_file_id, file_name, file_size, part_count,
+                                             pre_hash=calc_pre_hash(local_path), check_name_mode=check_name_mode)
+            if not create_result or create_result.get("code") != "PreHashMatched":
+                return create_result
+            
+            logger.debug(f"预哈希命中，计算完整哈希: {file_name}")
+            content_hash = calc_content_hash(local_path)
+        
+        return self.create_file(parent_file_id, file_name, file_size, part_count,
+                                content_hash=content_hash,
+                                proof_code=self._calc_proof_code(local_path, file_size),
+                                check_name_mode=check_name_mode)
+    
+    def get_upload_url(self, file_id: str, upload_id: str, part_numbers: List[int]) -> Dict[int, str]:
+        """重新获取分片上传URL（上传URL有效期较短）"""
+        url = f"{self.base_url}/v2/file/get_upload_url"
+        data = {
+            "drive_id": self.drive_id,
+            "file_id": file_id,
+            "upload_id": upload_id,
+            "part_info_list": [{"part_number": n} for n in part_numbers]
+        }
+        
+        response = self._request("aliyun_meta", "POST", url, json=data, headers=self._get_headers(), timeout=30)
+        response.raise_for_status()
+        result = response.json()
+        return {part["part_number"]: part.get("upload_url") for part in result.get("part_info_list", [])}
+    
+    def list_uploaded_parts(self, file_id: str, upload_id: str) -> List[Dict]:
+        """列出已上传的分片（用于断点续传）"""
+        url = f"{self.base_url}/v2/file/list_uploaded_parts"
+        parts = []
+        marker = None
+        
+        while True:
+            data = {
+                "drive_id": self.drive_id,
+                "file_id": file_id,
+                "upload_id": upload_id
+            }
+            if marker:
+                data["part_number_marker"] = marker
+            
+            response = self._request("aliyun_meta", "POST", url, json=data, headers=self._get_headers(), timeout=30)
+            response.raise_for_status()
+            result = response.json()
+            parts.extend(result.get("uploaded_parts") or [])
+            
+            marker = result.get("next_part_number_marker")
+            if not marker:
+                return parts
+    
+    def _put_part(self, file_id: str, upload_id: str, part_number: int, part_data: bytes,
+                  upload_url: Optional[str], max_retries: int = 3):
+        """上传单个分片，上传URL过期时自动刷新"""
+        for attempt in range(max_retries + 1):
+            try:
+                if not upload_url:
+                    upload_url = self.get_upload_url(file_id, upload_id, [part_number]).get(part_number)
+                
+                response = self._request("aliyun_upload", "PUT", upload_url, data=part_data,
+                                         headers={"Content-Type": ""}, timeout=300)
+                
+                # 403 通常是上传URL已过期，刷新后重传
+                if response.status_code == 403:
+                    logger.debug(f"分片上传URL已过期，刷新: #{part_number}")
+                    upload_url = None
+                    continue
+                # 409 表示该分片已存在（续传时可能出现）
+                if response.status_code == 409:
+                    return
+                response.raise_for_status()
+                return
+            except Exception as e:
+                if attempt >= max_retries:
+                    raise
+                logger.warning(f"分片 #{part_number} 上传失败，重试 ({attempt + 1}/{max_retries}): {str(e)}")
+                upload_url = None
+                time.sleep(attempt + 1)
+        
+        raise IOError(f"分片 #{part_number} 上传失败: 上传URL多次过期")
+    
+    def _load_upload_state(self, state_file: str, parent_file_id: str, file_name: str,
+                           file_size: int, part_size: int) -> Optional[Dict]:
+        """读取上次未完成的上传会话"""
+        if not os.path.exists(state_file):
+            return None
+        
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception as e:
+            logger.debug(f"读取上传会话失败: {str(e)}")
+            return None
+        
+        if (state.get("parent_file_id") != parent_file_id or state.get("file_name") != file_name
+                or state.get("size") != file_size or state.get("part_size") != part_size):
+            return None
+        return state
+    
+    def discard_upload_state(self, local_path: str):
+        """删除本地文件对应的上传会话记录"""
+        try:
+            os.remove(f"{local_path}.upload")
+        except OSError:
+            pass
+    
+    def upload_file(self, local_path: str, parent_file_id: str, file_name: str,
+                    content_hash: Optional[str] = None, check_name_mode: str = "auto_rename") -> bool:
+        """
+        分片上传文件（优先秒传，并发上传分片，支持断点续传）
+        :param content_hash: 已知的完整文件 SHA1（如下载时顺带计算），可省去一次读盘
+        :param check_name_mode: 同名文件处理方式（overwrite 用于覆盖已修改的文件）
+        """
+        session = self.begin_upload(local_path, parent_file_id, file_name, content_hash, check_name_mode)
+        if isinstance(session, bool):
+            return session
+        return self.upload_parts(session)
+    
+    def upload_parts(self, session: "UploadSession") -> bool:
+        """在线程池中并发上传会话中待传的分片，全部完成后提交文件"""
+        file_name = session.file_name
+        
+        def upload_part(part_number: int):
+            # 每个分片单独读取，内存占用不超过 part_size × 并发数
+            self._put_part(session.file_id, session.upload_id, part_number, session.read_part(part_number),
+                           session.upload_urls.get(part_number))
+            logger.debug(f"分片上传完成: {file_name} #{part_number}/{session.part_count}")
+        
+        # 上传文件内容
+        try:
+            pending = session.pending
+            if len(pending) == 1:
+                upload_part(pending[0])
+            elif pending:
+                with ThreadPoolExecutor(max_workers=min(self.upload_concurrency, len(pending))) as executor:
+                    for future in as_completed([executor.submit(upload_part, n) for n in pending]):
+                        future.result()
+            
+            self.finish_upload(session)
+            return True
+        except Exception as e:
+            logger.error(f"文件上传失败 {file_name}: {str(e)}")
+            return False
+    
+    def begin_upload(self, local_path: str, parent_file_id: str, file_name: str,
+                     content_hash: Optional[str] = None, check_name_mode: str = "auto_rename"):
+        """
+        开始分片上传：恢复上次未完成的上传会话，或创建文件（优先秒传）并记录会话
+        分片由调用方上传（线程池或 asyncio 引擎），全部完成后调用 finish_upload
+        :return: 已有结论时返回 bool（秒传成功、创建失败），否则返回 UploadSession
+        """
         file_size = os.path.getsize(local_path)
+        part_size = self._calc_part_size(file_size)
+        part_count = max(1, -(-file_size // part_size))
+        state_file = f"{local_path}.upload"
+        
+        # 尝试恢复上次未完成的上传
+        uploaded_parts = set()
+        upload_urls: Dict[int, str] = {}
+        state = self._load_upload_state(state_file, parent_file_id, file_name, file_size, part_size)
+        if state:
+            try:
+                for part in self.list_uploaded_parts(state["file_id"], state["upload_id"]):
+                    # 只信任大小完整的分片
+                    expected = min(part_size, file_size - (part["part_number"] - 1) * part_size)
+                    if part.get("part_size") == expected:
+                        uploaded_parts.add(part["part_number"])
+                file_id, upload_id = state["file_id"], state["upload_id"]
+                logger.info(f"续传上次的上传: {file_name}，已上传 {len(uploaded_parts)}/{part_count} 个分片")
+            except Exception as e:
+                logger.info(f"上次的上传会话已失效，重新上传: {file_name} ({str(e)})")
+                state = None
+        
+        pending = [n for n in range(1, part_count + 1) if n not in uploaded_parts]
+        if state:
+            # 上次的上传URL已过期，批量获取待传分片的URL，避免每个分片单独请求一次
+            try:
+                for i in range(0, len(pending), UPLOAD_URL_BATCH):
+                    upload_urls.update(self.get_upload_url(file_id, upload_id, pending[i:i + UPLOAD_URL_BATCH]))
+            except Exception as e:
+                logger.debug(f"批量获取分片上传URL失败，上传时逐个获取: {str(e)}")
+        else:
+            # 创建文件
+            create_result = self._create_file_rapid(local_path, parent_file_id, file_name, file_size,
+                                                    part_count, content_hash, check_name_mode)
+            if not create_result:
+                return False
+            
+            # 如果文件已存在（秒传）
+            if create_result.get("rapid_upload"):
+                logger.info(f"文件秒传成功: {file_name}")
+                return True
+            
+            file_id = create_result.get("file_id")
+            upload_id = create_result.get("upload_id")
+            upload_urls = {part["part_number"]: part.get("upload_url")
+                           for part in create_result.get("part_info_list", [])}
+            
+            try:
+                with open(state_file, 'w', encoding='utf-8') as f:
+                    json.dump({
+                        "file_id": file_id,
+                        "upload_id": upload_id,
+                        "parent_file_id": parent_file_id,
+                        "file_name": file_name,
+                        "size": file_size,
+                        "part_size": part_size
+                    }, f)
+            except Exception as e:
+                logger.debug(f"保存上传会话失败: {str(e)}")
+        
+        return UploadSession(local_path, file_name, file_id, upload_id, part_size, part_count, pending, upload_urls)
+    
+    def finish_upload(self, session: "UploadSession"):
+        """所有分片上传完成后提交文件，并删除本地的上传会话记录"""
+        self._complete_upload(session.file_id, session.upload_id)
+        self.discard_upload_state(session.local_path)
+        logger.info(f"文件上传成功: {session.file_name}")
+    
+    def _complete_upload(self, file_id: str, upload_id: str):
+        """完成上传"""
+        complete_url = f"{self.base_url}/v2/file/complete"
+        complete_data = {
+            "drive_id": self.drive_id,
+            "file_id": file_id,
+            "upload_id": upload_id
+        }
+        
+        response = self._request("aliyun_meta", "POST", complete_url, json=complete_data,
+                                 headers=self._get_headers(), timeout=30)
+        response.raise_for_status()
+    
+    def upload_stream(self, reader: RingBuffer, parent_file_id: str, file_name: str, file_size: int,
+                      pre_hash: Optional[str] = None, check_name_mode: str = "auto_rename") -> bool:
+        """
+        从数据流上传文件（边下载边上传，不落盘）
+        :param pre_hash: 文件前 1KB 的 SHA1；命中时抛出 PreHashMatched，由调用方改用临时文件计算完整哈希
+        :param check_name_mode: 同名文件处理方式（overwrite 用于覆盖已修改的文件）
+        """
+        part_size = self._calc_part_size(file_size)
+        part_count = max(1, -(-file_size // part_size))
         
-        # 创建文件
-        create_result = self.create_file(parent_file_id, file_name, file_size)
+        if not (self.rapid_upload and self.access_token):
+            pre_hash = None
+        create_result = self.create_file(parent_file_id, file_name, file_size, part_count, pre_hash=pre_hash,
+                                         check_name_mode=check_name_mode)
         if not create_result:
             return False
+        if create_result.get("code") == "PreHashMatched":
+            raise PreHashMatched(file_name)
         
-        # 如果文件已存在（秒传）
         if create_result.get("rapid_upload"):
             logger.info(f"文件秒传成功: {file_name}")
             return True
         
-        # 获取上传URL
-        upload_url = create_result.get("part_info_list", [{}])[0].get("upload_url")
-        if not upload_url:
-            logger.error(f"未获取到上传URL: {file_name}")
-            return False
-        
         file_id = create_result.get("file_id")
         upload_id = create_result.get("upload_id")
+        part_info_list = create_result.get("part_info_list", [])
+        if len(part_info_list) != part_count:
+            logger.error(f"上传分片信息不完整: {file_name}")
+            return False
         
-        # 上传文件内容
         try:
-            with open(local_path, 'rb') as f:
-                file_data = f.read()
-            
-            headers = {
-                "Content-Type": ""
-            }
-            response = requests.put(upload_url, data=file_data, headers=headers, timeout=300)
-            response.raise_for_status()
-            
-            # 完成上传
-            complete_url = f"{self.base_url}/v2/file/complete"
-            complete_data = {
-                "drive_id": self.drive_id,
-                "file_id": file_id,
-                "upload_id": upload_id
-            }
+            uploaded = 0
+            for part in part_info_list:
+                expected = min(part_size, file_size - uploaded)
+                # 每次只读一个分片到内存，失败时可以整片重传
+                part_data = reader.read(expected)
+                if len(part_data) != expected:
+                    raise IOError(f"数据流提前结束: 期望 {expected} 字节，实际 {len(part_data)} 字节")
+                
+                self._put_part(file_id, upload_id, part.get("part_number"), part_data, part.get("upload_url"))
+                uploaded += expected
+                logger.debug(f"分片上传完成: {file_name} #{part.get('part_number')}")
             
-            response = self.session.post(complete_url, json=complete_data, 
-                                    headers=self._get_headers(), timeout=30)
-            response.raise_for_status()
+            self._complete_upload(file_id, upload_id)
             
-            logger.info(f"文件上传成功: {file_name}")
+            logger.info(f"文件流式上传成功: {file_name}")
             return True
         except Exception as e:
-            logger.error(f"文件上传失败 {file_name}: {str(e)}")
+            logger.error(f"文件流式上传失败 {file_name}: {str(e)}")
             return False
     
     def get_or_create_folder_by_path(self, folder_path: str) -> Optional[str]:
@@ -601,20 +1375,94 @@ class AliyunPanClient:
         # 移除开头的斜杠
         folder_path = folder_path.lstrip("/")
         
+        # 缓存的上层文件夹ID可能已失效，失效时移除缓存后重新逐层解析
+        for _ in range(folder_path.count("/") + 2):
+            try:
+                return self._resolve_folder_path(folder_path)
+            except FolderNotFound as e:
+                with self._folder_cache_lock:
+                    stale_path = next((path for path, file_id in self.folder_cache.items()
+                                       if file_id == str(e)), None)
+                if not stale_path:
+                    logger.error(f"父文件夹不存在: {folder_path}")
+                    return None
+                self.invalidate_folder(stale_path)
+        return None
+    
+    def _single_flight(self, key: tuple, func: Callable[[], Optional[str]]) -> Optional[str]:
+        """同一 key 同时只执行一次 func，并发调用者等待并共享结果"""
+        with self._folder_cache_lock:
+            call = self._folder_calls.get(key)
+            leader = call is None
+            if leader:
+                call = _FolderCall()
+                self._folder_calls[key] = call
+        
+        if not leader:
+            call.event.wait()
+            if call.error:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._folder_cache_lock:
+                del self._folder_calls[key]
+            call.event.set()
+    
+    def _lookup_folder(self, full_path: str) -> Optional[str]:
+        """查询已存在的文件夹（不创建），找到时加入缓存"""
+        existing = self.get_file_by_path(full_path)
+        if not existing:
+            return None
+        file_id = existing.get("file_id")
+        logger.debug(f"文件夹已存在: {full_path}, ID: {file_id}")
+        self._cache_folder(full_path, file_id)
+        return file_id
+    
+    def _get_or_create_level(self, full_path: str, parent_id: str, name: str) -> Optional[str]:
+        """查找或创建一层文件夹（由 _single_flight 保证同一路径只有一个线程执行）"""
+        # 等待期间其他线程可能已经写入缓存
+        with self._folder_cache_lock:
+            if full_path in self.folder_cache:
+                return self.folder_cache[full_path]
+        
+        logger.debug(f"处理路径: {full_path}")
+        
+        # 检查当前层是否存在
+        folder_id = self._lookup_folder(full_path)
+        if folder_id:
+            return folder_id
+        
+        # 创建当前层
+        logger.info(f"  📁 创建文件夹: {name}")
+        folder_id = self.create_folder(parent_id, name)
+        if not folder_id:
+            logger.error(f"创建文件夹失败: {name}")
+            return None
+        # 加入缓存
+        self._cache_folder(full_path, folder_id)
+        return folder_id
+    
+    def _resolve_folder_path(self, folder_path: str) -> Optional[str]:
+        """逐层查找或创建文件夹（folder_path 不带开头斜杠）"""
         # 检查缓存
         cache_key = f"/{folder_path}"
-        if cache_key in self.folder_cache:
-            logger.debug(f"从缓存获取文件夹 ID: {self.folder_cache[cache_key]}")
-            return self.folder_cache[cache_key]
+        with self._folder_cache_lock:
+            cached = self.folder_cache.get(cache_key)
+        if cached:
+            logger.debug(f"从缓存获取文件夹 ID: {cached}")
+            return cached
         
-        # 检查文件夹是否存在
+        # 检查文件夹是否存在（一次请求即可命中已有的深层目录）
         logger.debug(f"检查文件夹是否存在: {cache_key}")
-        existing = self.get_file_by_path(cache_key)
-        if existing:
-            file_id = existing.get("file_id")
-            logger.debug(f"文件夹已存在，ID: {file_id}")
-            # 加入缓存
-            self.folder_cache[cache_key] = file_id
+        file_id = self._single_flight(("lookup", cache_key), lambda: self._lookup_folder(cache_key))
+        if file_id:
             return file_id
         
         # 分割路径，逐层创建
@@ -630,40 +1478,51 @@ class AliyunPanClient:
             full_path = f"/{current_path}"
             
             # 检查缓存
-            if full_path in self.folder_cache:
-                current_parent_id = self.folder_cache[full_path]
+            with self._folder_cache_lock:
+                cached = self.folder_cache.get(full_path)
+            if cached:
+                current_parent_id = cached
                 logger.debug(f"从缓存获取: {part}, ID: {current_parent_id}")
                 continue
             
-            logger.debug(f"处理路径: {full_path}")
-            
-            # 检查当前层是否存在
-            existing = self.get_file_by_path(full_path)
-            if existing:
-                current_parent_id = existing.get("file_id")
-                logger.debug(f"文件夹已存在: {part}, ID: {current_parent_id}")
-                # 加入缓存
-                self.folder_cache[full_path] = current_parent_id
-            else:
-                # 创建当前层
-                logger.info(f"  📁 创建文件夹: {part}")
-                folder_id = self.create_folder(current_parent_id, part)
-                if not folder_id:
-                    logger.error(f"创建文件夹失败: {part}")
-                    return None
-                current_parent_id = folder_id
-                # 加入缓存
-                self.folder_cache[full_path] = folder_id
-                # 添加延迟，避免请求过快
-                time.sleep(0.3)
+            parent_id = current_parent_id
+            current_parent_id = self._single_flight(
+                ("level", full_path),
+                lambda: self._get_or_create_level(full_path, parent_id, part))
+            if not current_parent_id:
+                return None
         
         return current_parent_id
 
 
+class _Transfer:
+    """传输引擎 + 调度器 + 临时空间预算，单个同步任务独占，并行执行多个任务时共用"""
+    
+    def __init__(self, engine, scheduler: WorkScheduler, budget: TempSpaceBudget):
+        self.engine = engine
+        self.scheduler = scheduler
+        self.budget = budget
+    
+    def __enter__(self):
+        self.engine.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.engine.__exit__(exc_type, exc, tb)
+    
+    def gauges(self) -> Dict:
+        values = dict(self.scheduler.queue_depths())
+        values.update(self.engine.queue_depths())
+        values.update({"temp_reserved_bytes": self.budget.reserved, "temp_budget_bytes": self.budget.limit,
+                       "temp_free_bytes": self.budget.free_bytes()})
+        return values
+
+
 class BaiduToAliyunSync:
     """百度云盘到阿里云盘同步器"""
     
-    def __init__(self, baidu_config: Dict, aliyun_config: Dict, temp_dir: str = "/tmp/pan_sync"):
+    def __init__(self, baidu_config: Dict, aliyun_config: Dict, temp_dir: str = "/tmp/pan_sync",
+                 options: Optional[Dict] = None):
         """
         初始化同步器
         :param baidu_config: 百度网盘配置 {"cookie": "..."} 或 {"access_token": "..."}
@@ -671,76 +1530,224 @@ class BaiduToAliyunSync:
             - {"access_token": "...", "drive_id": "..."}  # 推荐：直接使用 Bearer Token
             - {"refresh_token": "..."}  # 推荐：使用 Refresh Token
             - {"cookie": "..."}  # 备用：使用 Cookie
+        :param options: 其他同步选项（config.json 顶层配置项）
         """
+        options = options or {}
+        
+        # 大文件分段下载（多连接）
+        downloader = SegmentedDownloader(
+            segment_count=options.get("download_segments", 4),
+            segment_size=int(options.get("download_segment_size_mb", 32) * 1024 * 1024)
+        )
+        
         # 初始化百度网盘客户端
+        # 连接池大小跟随并发数：每个下载/上传线程最多同时占用 分段数/分片并发数 个连接
+        max_workers = options.get("max_workers", 3)
+        download_workers = options.get("download_workers") or max_workers
+        upload_workers = options.get("upload_workers") or max_workers
+        # 并行执行多个同步任务时各任务有自己的扫描线程，传输线程则由所有任务共用
+        self.parallel_tasks = max(1, options.get("parallel_tasks", 1))
+        baidu_pool_size = (download_workers * downloader.segment_count
+                           + options.get("scan_workers", 4) * self.parallel_tasks)
+        aliyun_pool_size = upload_workers * (options.get("upload_concurrency", 3) + 1)
+        
+        # 各类接口的自适应限速，百度与阿里云客户端共用
+        self.rate_limiters = RateLimiterRegistry(options.get("rate_limits"))
+        
+        # 各阶段与各类接口的耗时、流量统计，同步结束时写出 JSON 报告
+        self.stats = SyncStats()
+        self.stats_report = options.get("stats_report", "sync_stats.json")
+        self.stats_live_file = options.get("stats_live_file")
+        self.stats_live_interval = options.get("stats_live_interval", 10)
+        
+        # 可选的 Prometheus 指标接口：{"enabled": true, "host": "127.0.0.1", "port": 9108}
+        self.metrics_server: Optional[MetricsServer] = None
+        metrics_options = options.get("metrics") or {}
+        if metrics_options.get("enabled"):
+            try:
+                self.metrics_server = MetricsServer(self.stats, self.rate_limiters,
+                                                    host=metrics_options.get("host", "127.0.0.1"),
+                                                    port=metrics_options.get("port", 9108)).start()
+            except OSError as e:
+                logger.error(f"指标接口启动失败: {str(e)}")
+        
+        baidu_options = {
+            "pool_size": baidu_pool_size,
+            "rate_limiters": self.rate_limiters,
+            "stats": self.stats,
+            "base_url": options.get("baidu_api_url", BAIDU_API_URL),
+            "web_url": options.get("baidu_web_url", BAIDU_WEB_URL)
+        }
         if "cookie" in baidu_config and USE_BAIDUPCS:
             # 优先使用 baidupcs-py（可以绕过下载限制）
             logger.info("使用 baidupcs-py 客户端")
-            self.baidu_client = BaiduPanClientPCS(cookie=baidu_config["cookie"])
+            self.baidu_client = BaiduPanClientPCS(cookie=baidu_config["cookie"], downloader=downloader,
+                                                  rate_limiters=self.rate_limiters, stats=self.stats)
         elif "cookie" in baidu_config:
-            self.baidu_client = BaiduPanClient(cookie=baidu_config["cookie"])
+            logger.warning("baidupcs-py 未安装，将使用原始方法（可能会遇到下载限制）")
+            self.baidu_client = BaiduPanClient(cookie=baidu_config["cookie"], downloader=downloader,
+                                               **baidu_options)
         else:
-            self.baidu_client = BaiduPanClient(access_token=baidu_config.get("access_token"))
+            self.baidu_client = BaiduPanClient(access_token=baidu_config.get("access_token"), downloader=downloader,
+                                               **baidu_options)
         
         # 初始化阿里云盘客户端
+        upload_options = {
+            "part_size": int(options.get("upload_part_size_mb", 10) * 1024 * 1024),
+            "upload_concurrency": options.get("upload_concurrency", 3),
+            "rapid_upload": bool(options.get("rapid_upload", True)),
+            "cache_dir": temp_dir,
+            "dir_index_size": options.get("remote_index_dirs", 256),
+            "pool_size": aliyun_pool_size,
+            "rate_limiters": self.rate_limiters,
+            "stats": self.stats,
+            "base_url": options.get("aliyun_api_url", ALIYUN_API_URL)
+        }
         if "access_token" in aliyun_config:
             # 使用 Access Token + Drive ID 方式
             self.aliyun_client = AliyunPanClient(
                 access_token=aliyun_config["access_token"],
-                drive_id=aliyun_config.get("drive_id")
+                drive_id=aliyun_config.get("drive_id"),
+                **upload_options
             )
         elif "refresh_token" in aliyun_config:
             # 使用 Refresh Token 方式
-            self.aliyun_client = AliyunPanClient(refresh_token=aliyun_config["refresh_token"])
+            self.aliyun_client = AliyunPanClient(refresh_token=aliyun_config["refresh_token"], **upload_options)
         elif "cookie" in aliyun_config:
             # 使用 Cookie 方式
-            self.aliyun_client = AliyunPanClient(cookie=aliyun_config["cookie"])
+            self.aliyun_client = AliyunPanClient(cookie=aliyun_config["cookie"], **upload_options)
         else:
             raise ValueError("阿里云盘配置必须包含 access_token、refresh_token 或 cookie")
         
         self.temp_dir = temp_dir
         os.makedirs(temp_dir, exist_ok=True)
         
-        # 断点续传：记录已完成的文件
-        self.progress_file = os.path.join(temp_dir, ".sync_progress.pkl")
+        # 目录扫描并发数与扫描结果队列长度
+        self.scan_workers = options.get("scan_workers", 4)
+        self.scan_queue_size = options.get("scan_queue_size", 1000)
+        
+        # 管道模式：下载流经内存环形缓冲区直接上传，不写临时文件
+        self.pipe_mode = bool(options.get("pipe_mode", False))
+        self.pipe_buffer_size = int(options.get("pipe_buffer_size_mb", 32) * 1024 * 1024)
+        
+        # 增量模式：按上次的同步清单跳过未变化的目录，只同步新增或修改过的文件
+        self.incremental = bool(options.get("incremental", False))
+        
+        # 守护模式：进程常驻，每隔 watch_interval 秒（加减 watch_jitter 比例的随机抖动）重新扫描一轮
+        # 客户端、连接池与文件夹缓存在各轮之间保留；每轮按增量模式扫描，
+        # 每 watch_full_scan_every 轮不跳过未变化的目录、完整列出一次（0 表示从不），防止目录修改时间漏报变化
+        self.watch_interval = options.get("watch_interval", 0)
+        self.watch_jitter = options.get("watch_jitter", 0.1)
+        self.watch_full_scan_every = int(options.get("watch_full_scan_every", 24))
+        self._full_scan = False
+        if self.watch_interval and not self.incremental:
+            logger.info("守护模式自动开启增量同步")
+            self.incremental = True
+        
+        # 停止信号：不再提交新文件，等待进行中的文件完成后退出
+        self._stop = threading.Event()
+        
+        # 临时目录空间预算：下载前按文件大小预留空间，放不下的文件排队等待
+        self.temp_budget = int(options.get("temp_budget_gb", 0) * 1024 * 1024 * 1024)
+        self.temp_min_free = int(options.get("temp_min_free_mb", 1024) * 1024 * 1024)
+        
+        # 按文件大小调度：大文件限定名额，其余名额小文件优先；schedule_window 为调度器可以预读的等待文件数
+        self.schedule_options = {
+            "policy": options.get("schedule_policy", "lanes"),
+            "large_threshold": int(options.get("large_file_threshold_mb", 512) * 1024 * 1024),
+            "large_slots": options.get("large_file_slots", 1),
+            "small_threshold": int(options.get("small_file_threshold_mb", 4) * 1024 * 1024),
+        }
+        if self.schedule_options["policy"] not in SCHEDULE_POLICIES:
+            logger.warning(f"未知的调度策略 {self.schedule_options['policy']}，改用 lanes")
+            self.schedule_options["policy"] = "lanes"
+        self.schedule_window = options.get("schedule_window", 256)
+        
+        # 线程引擎的流水线宽度：下载与上传各自的线程数（未配置时与 max_workers 相同）、交接队列长度
+        self.download_workers = options.get("download_workers")
+        self.upload_workers = options.get("upload_workers")
+        self.handoff_queue_size = options.get("handoff_queue_size")
+        
+        # 传输引擎：thread（线程池，默认）或 asyncio（需要 aiohttp，适合大量小文件）
+        self.engine = options.get("engine", "thread")
+        if self.engine == "asyncio" and not HAS_AIOHTTP:
+            logger.warning("aiohttp 未安装，asyncio 引擎不可用，改用线程池")
+            self.engine = "thread"
+        self.async_options = {
+            # async_list_concurrency 为旧名称
+            "meta_concurrency": options.get("async_meta_concurrency", options.get("async_list_concurrency", 8)),
+            "download_concurrency": options.get("async_download_concurrency", 32),
+            "upload_concurrency": options.get("async_upload_concurrency", 16),
+        }
+        
+        # 断点续传：记录已完成的文件（快照 + 追加日志）
+        self.progress = ProgressJournal(temp_dir)
         self.completed_files: Set[str] = self._load_progress()
     
+    @property
+    def stopping(self) -> bool:
+        return self._stop.is_set()
+    
+    def request_stop(self):
+        """请求停止（可在信号处理函数中调用）：当前任务不再提交新文件，已提交的文件完成后返回"""
+        self._stop.set()
+    
     def _load_progress(self) -> Set[str]:
         """加载同步进度"""
-        if os.path.exists(self.progress_file):
-            try:
-                with open(self.progress_file, 'rb') as f:
-                    progress = pickle.load(f)
-                logger.info(f"加载断点续传记录: {len(progress)} 个已完成文件")
-                return progress
-            except Exception as e:
-                logger.warning(f"加载进度文件失败: {str(e)}")
-        return set()
+        completed = self.progress.load()
+        if completed:
+            logger.info(f"加载断点续传记录: {len(completed)} 个已完成文件")
+        return completed
     
     def _save_progress(self):
-        """保存同步进度"""
-        try:
-            with open(self.progress_file, 'wb') as f:
-                pickle.dump(self.completed_files, f)
-        except Exception as e:
-            logger.error(f"保存进度文件失败: {str(e)}")
+        """保存同步进度（压缩追加日志为快照）"""
+        self.progress.compact()
     
     def _mark_completed(self, file_path: str):
         """标记文件为已完成"""
-        self.completed_files.add(file_path)
-        self._save_progress()
+        self.progress.add(file_path)
     
     def _is_completed(self, file_path: str) -> bool:
         """检查文件是否已完成"""
-        return file_path in self.completed_files
+        return file_path in self.progress
+        
+    def _create_transfer(self, max_workers: int) -> _Transfer:
+        """创建传输引擎、临时空间预算与调度器"""
+        # asyncio 引擎：下载/上传在事件循环中进行，大文件等仍按 max_workers 走线程
+        # 线程引擎：下载与上传是两个独立线程池组成的流水线，中间经有界队列交接
+        if self.engine == "asyncio":
+            logger.info(f"传输引擎: asyncio (下载 {self.async_options['download_concurrency']}, "
+                        f"上传 {self.async_options['upload_concurrency']}, "
+                        f"元数据 {self.async_options['meta_concurrency']})")
+            engine = AsyncTransferEngine(self, fallback_workers=max_workers, **self.async_options)
+        else:
+            download_workers = self.download_workers or max_workers
+            upload_workers = self.upload_workers or max_workers
+            handoff_size = self.handoff_queue_size or upload_workers * 2
+            logger.info(f"并发数: 下载 {download_workers}, 上传 {upload_workers}, 交接队列 {handoff_size}")
+            engine = TransferPipeline(self._download_stage, self._upload_stage, download_workers,
+                                      upload_workers, handoff_size)
         
-    def sync_folder(self, baidu_folder: str, aliyun_folder: str, max_workers: int = 3):
+        # 下载前按文件大小预留临时空间，放不下的文件在调度器中排队，较小的文件先行
+        budget = TempSpaceBudget(self.temp_dir, self.temp_budget, self.temp_min_free)
+        if budget.limit is not None:
+            logger.info(f"临时空间预算: {budget.limit / (1024 * 1024 * 1024):.2f}GB")
+        # 同时在途（调度器中等待 + 传输中）的文件数上限，并行执行的任务共用，按各任务的优先级与权重发放
+        window = engine.capacity + max(self.schedule_window, engine.capacity)
+        scheduler = WorkScheduler(engine.submit, budget, cost=self._temp_space_needed,
+                                  max_running=engine.capacity, window=window, **self.schedule_options)
+        return _Transfer(engine, scheduler, budget)
+    
+    def sync_folder(self, baidu_folder: str, aliyun_folder: str, max_workers: int = 3,
+                    transfer: Optional[_Transfer] = None, priority: int = 0, weight: float = 1.0):
         """
         流式同步文件夹（不预先统计，边扫描边同步）
         支持断点续传
+        :param transfer: 与其他同步任务共用的传输引擎与调度器（已启动），None 表示本任务单独创建
+        :param priority: 共用调度器时本任务的优先级
+        :param weight: 共用调度器时本任务的权重
         """
         logger.info(f"开始同步: {baidu_folder} -> {aliyun_folder}")
-        logger.info(f"并发数: {max_workers}")
         
         # 确保阿里云盘目标文件夹存在
         logger.info(f"检查目标文件夹: {aliyun_folder}")
@@ -753,180 +1760,521 @@ class BaiduToAliyunSync:
         success_count = 0
         fail_count = 0
         skip_count = 0
+        skip_dir_count = 0
+        counter_lock = threading.Lock()
         
-        # 流式处理：边扫描边同步
-        logger.info("开始流式扫描和同步...")
+        # 同步清单：记录本次的百度网盘元数据，增量模式下与上次比较
+        # 清单在内存中保存每个文件的元数据，只在增量模式下建立
+        manifest = SyncManifest(self.temp_dir, f"{baidu_folder}->{aliyun_folder}") if self.incremental else None
+        has_manifest = manifest is not None and manifest.load()
+        incremental = self.incremental and has_manifest
+        if self.incremental and not has_manifest:
+            logger.info("没有上次的同步清单，本次执行完整同步")
+        elif incremental and self._full_scan:
+            logger.info("本轮完整列出所有目录（文件仍按清单比较，只同步新增或修改过的文件）")
+        
+        def dir_filter(dir_info: Dict) -> List[str]:
+            """
+            修改时间未变化的目录不再列出：直接子文件沿用上次清单中的记录，
+            已知的子目录仍逐个扫描（目录的修改时间不反映更深层的变化）
+            """
+            nonlocal skip_count, skip_dir_count
+            if incremental and not self._full_scan and manifest.dir_unchanged(dir_info):
+                carried, children = manifest.carry_dir(dir_info.get("path"))
+                with counter_lock:
+                    skip_dir_count += 1
+                    skip_count += carried
+                self.stats.file_done("skipped", count=carried)
+                logger.info(f"⏭️  目录未变化，跳过: {dir_info.get('path')} ({carried} 个文件, "
+                            f"继续检查 {len(children)} 个子目录)")
+                return children
+            manifest.record_dir(dir_info)
+            return [dir_info.get("path")]
+        
+        def should_skip(file_info: Dict) -> bool:
+            """已完成的文件跳过；增量模式下未变化的文件同样跳过"""
+            changed = manifest.file_changed(file_info) if incremental else None
+            return changed is False or (changed is None and self._is_completed(file_info.get("path")))
+        
+        # 扫描到需要同步的文件时先登记 fs_id，获取下载链接时一次请求批量解析
+        dlinks: Optional[DlinkResolver] = getattr(self.baidu_client, "dlinks", None)
+        
+        def list_dir(dir_path: str) -> Iterator[Dict]:
+            for item in self.baidu_client.iter_files(dir_path, strict=True):
+                if dlinks and item.get("isdir") != 1 and not should_skip(item):
+                    dlinks.prefetch(item.get("fs_id"))
+                yield item
+        
+        # 共用调度器时本任务的文件单独成组，按优先级与权重和其他任务分配传输名额
+        task_key = f"{baidu_folder}->{aliyun_folder}"
+        own_transfer = transfer is None
+        if own_transfer:
+            transfer = self._create_transfer(max_workers)
+        scheduler = transfer.scheduler
+        scheduler.add_group(task_key, priority, weight)
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {}
+        # 同时在途的文件数上限由所有任务共用（scheduler.acquire_slot），并行任务再多，等待与传输中的文件总数也不会增加
+        
+        def on_done(future, file_info: Dict):
+            """任务完成回调：即时统计结果并释放在途名额"""
+            nonlocal success_count, fail_count
+            file_name = file_info.get("server_filename")
+            if dlinks:
+                dlinks.discard(file_info.get("fs_id"))
             
-            # 递归处理目录
-            def process_directory(dir_path: str, target_base: str):
-                nonlocal success_count, fail_count, skip_count
-                
-                logger.info(f"📁 扫描目录: {dir_path}")
-                
-                # 获取当前目录的文件列表（不递归）
-                items = self.baidu_client.list_files(dir_path, recursion=0)
-                
-                if not items:
-                    logger.debug(f"目录为空: {dir_path}")
-                    return
-                
-                # 分类文件和文件夹
-                folders = [f for f in items if f.get("isdir") == 1]
-                files = [f for f in items if f.get("isdir") == 0]
-                
-                logger.info(f"  发现: {len(files)} 个文件, {len(folders)} 个子文件夹")
-                
-                # 处理文件：直接提交任务，不预先创建文件夹
-                for file_info in files:
-                    file_path = file_info.get("path")
+            try:
+                ok = future.result()
+                error = None
+            except Exception as e:
+                ok = False
+                error = e
+            
+            if manifest is not None:
+                if ok:
+                    manifest.record_file(file_info)
+                else:
+                    # 下次增量同步需要重新扫描该文件所在的目录
+                    manifest.record_failure(file_info, baidu_folder)
+            
+            self.stats.file_done("success" if ok else "failed", file_info.get("size", 0))
+            with counter_lock:
+                if ok:
+                    success_count += 1
+                    logger.info(f"✅ 完成: {file_name} (成功: {success_count}, 失败: {fail_count}, 跳过: {skip_count})")
+                elif error is None:
+                    fail_count += 1
+                    logger.warning(f"❌ 失败: {file_name} (成功: {success_count}, 失败: {fail_count}, 跳过: {skip_count})")
+                else:
+                    fail_count += 1
+                    logger.error(f"❌ 异常: {file_name} - {str(error)}")
+            scheduler.release_slot(task_key)
+        
+        # 流式处理：多线程并发扫描目录，扫描到的文件经有界队列提交到同步线程池
+        logger.info("开始流式扫描和同步...")
+        crawler = DirectoryCrawler(list_dir, workers=self.scan_workers, queue_size=self.scan_queue_size,
+                                   dir_filter=dir_filter if manifest is not None else None)
+        
+        # 登记本任务的实时指标（指标接口与实时快照读取）；共用的引擎与调度器由 run_tasks 单独登记
+        def collect_gauges() -> Dict:
+            with counter_lock:
+                values = {"task_files_success": success_count, "task_files_failed": fail_count,
+                          "task_files_skipped": skip_count}
+            values.update(crawler.queue_depths())
+            values.update(scheduler.group_depths(task_key))
+            if own_transfer:
+                values.update(transfer.gauges())
+            return values
+        
+        self.stats.set_gauges(task_key, collect_gauges)
+        if self.stats_live_file:
+            self.stats.start_live(self.stats_live_file, self.stats_live_interval)
+        interrupted = False
+        try:
+            with transfer if own_transfer else contextlib.nullcontext():
+                for file_info in crawler.crawl(baidu_folder):
+                    if self._stop.is_set():
+                        interrupted = True
+                        logger.warning("收到停止请求，不再提交新文件，等待进行中的文件完成...")
+                        break
                     file_name = file_info.get("server_filename")
                     
-                    # 检查是否已完成（断点续传）
-                    if self._is_completed(file_path):
-                        skip_count += 1
+                    # 检查是否已完成（断点续传）；增量模式下未变化的文件同样跳过
+                    if should_skip(file_info):
+                        if manifest is not None:
+                            manifest.record_file(file_info)
+                        with counter_lock:
+                            skip_count += 1
+                        self.stats.file_done("skipped")
                         logger.info(f"⏭️  跳过已完成: {file_name} (总计跳过: {skip_count})")
                         continue
                     
                     # 提交同步任务（文件夹会在同步时按需创建）
+                    scheduler.acquire_slot(task_key)
                     logger.info(f"📤 提交任务: {file_name}")
-                    future = executor.submit(
-                        self._sync_single_file, 
+                    future = scheduler.submit(
                         file_info, 
                         baidu_folder, 
-                        aliyun_folder
+                        aliyun_folder,
+                        overwrite=incremental and bool(manifest.file_changed(file_info)),
+                        group=task_key
                     )
-                    futures[future] = file_info
-                
-                # 递归处理子文件夹（不预先创建）
-                for folder in folders:
-                    folder_path = folder.get("path")
-                    folder_name = folder.get("server_filename")
-                    
-                    logger.debug(f"📂 进入子文件夹: {folder_name}")
-                    
-                    # 递归处理子目录
-                    process_directory(folder_path, aliyun_folder)
-            
-            # 开始处理根目录
-            process_directory(baidu_folder, aliyun_folder)
-            
-            # 等待所有任务完成
-            if futures:
-                logger.info(f"等待 {len(futures)} 个文件同步任务完成...")
+                    future.add_done_callback(functools.partial(on_done, file_info=file_info))
                 
-                for future in as_completed(futures):
-                    file_info = futures[future]
-                    file_name = file_info.get("server_filename")
-                    
-                    try:
-                        if future.result():
-                            success_count += 1
-                            logger.info(f"✅ 完成: {file_name} (成功: {success_count}, 失败: {fail_count}, 跳过: {skip_count})")
-                        else:
-                            fail_count += 1
-                            logger.warning(f"❌ 失败: {file_name} (成功: {success_count}, 失败: {fail_count}, 跳过: {skip_count})")
-                    except Exception as e:
-                        fail_count += 1
-                        logger.error(f"❌ 异常: {file_name} - {str(e)}")
+                logger.info("目录扫描完成，等待剩余同步任务完成...")
+                scheduler.join_group(task_key)
+        finally:
+            if self.stats_live_file:
+                self.stats.stop_live()
+            self.stats.remove_gauges(task_key)
+            scheduler.remove_group(task_key)
+        
+        # 扫描失败的目录沿用上次的记录，下次重新扫描；其余目录中消失的文件即为已删除
+        # 中途停止时本次清单不完整（已记录的目录中可能还有未提交的文件），保留上次的清单
+        deleted = []
+        if manifest is not None and interrupted:
+            logger.warning("同步被中断，保留上次的同步清单，已完成的文件记录在断点续传进度中")
+        elif manifest is not None:
+            if crawler.failed_dirs:
+                logger.warning(f"有 {len(crawler.failed_dirs)} 个目录扫描失败，下次同步将重新扫描")
+                manifest.keep_incomplete(crawler.failed_dirs, baidu_folder)
+            deleted = manifest.deleted_files(baidu_folder, crawler.failed_dirs) if has_manifest else []
+            if deleted:
+                logger.warning(f"百度网盘上已删除 {len(deleted)} 个文件（阿里云盘上的副本未删除）:")
+                for path in deleted[:20]:
+                    logger.warning(f"  🗑️  {path}")
+                if len(deleted) > 20:
+                    logger.warning(f"  ... 等 {len(deleted)} 个")
+            manifest.save()
+        
+        # 把本次追加的进度记录合并到快照，并保存文件夹ID缓存
+        self._save_progress()
+        self.aliyun_client.save_folder_cache()
+        
+        # 写出耗时与流量统计报告（整个运行期间累计）
+        if self.stats_report:
+            self.stats.write(self.stats_report, extra={
+                "last_task": f"{baidu_folder}->{aliyun_folder}",
+                "rate_limits": self.rate_limiters.snapshot(),
+            })
+            logger.info(f"统计报告已写入: {self.stats_report}")
         
         # 最终统计
         logger.info("=" * 60)
-        logger.info(f"同步完成！")
+        logger.info("同步已中断" if interrupted else "同步完成！")
         logger.info(f"  ✅ 成功: {success_count}")
         logger.info(f"  ❌ 失败: {fail_count}")
         logger.info(f"  ⏭️  跳过: {skip_count}")
+        if incremental:
+            logger.info(f"  📂 未变化的目录: {skip_dir_count}")
+        if has_manifest:
+            logger.info(f"  🗑️  已删除: {len(deleted)}")
         logger.info(f"  📊 总计: {success_count + fail_count + skip_count}")
         logger.info("=" * 60)
     
-    def _sync_single_file(self, file_info: Dict, baidu_base: str, aliyun_base: str) -> bool:
-        """同步单个文件（支持断点续传）"""
-        file_path = file_info.get("path")
-        file_name = file_info.get("server_filename")
-        fs_id = file_info.get("fs_id")
-        file_size = file_info.get("size", 0)
+    def run_tasks(self, sync_tasks: List[Dict], max_workers: int = 3):
+        """
+        执行同步任务（收到停止请求后不再开始新任务）
+        任务按 priority 从高到低开始；parallel_tasks > 1 时多个任务同时进行，
+        共用同一个传输引擎、调度器与临时空间预算，传输名额按各任务的 priority / weight 分配
+        """
+        tasks = []
+        for task in sync_tasks:
+            if not task.get("baidu_folder") or not task.get("aliyun_folder"):
+                logger.warning(f"跳过无效任务: {task}")
+                continue
+            tasks.append(task)
+        tasks.sort(key=lambda task: -task.get("priority", 0))
         
-        # 格式化文件大小
-        size_mb = file_size / (1024 * 1024)
-        size_str = f"{size_mb:.2f}MB" if size_mb >= 1 else f"{file_size / 1024:.2f}KB"
+        if self.parallel_tasks <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                self._run_task(task, max_workers)
+            return
         
+        logger.info(f"并行执行同步任务: 最多同时 {self.parallel_tasks} 个，共 {len(tasks)} 个")
+        transfer = self._create_transfer(max_workers)
+        self.stats.set_gauges("shared", transfer.gauges)
+        try:
+            with transfer, ThreadPoolExecutor(max_workers=self.parallel_tasks, thread_name_prefix="task") as pool:
+                for task in tasks:
+                    pool.submit(self._run_task, task, max_workers, transfer)
+        finally:
+            self.stats.remove_gauges("shared")
+    
+    def _run_task(self, task: Dict, max_workers: int, transfer: Optional[_Transfer] = None):
+        if self._stop.is_set():
+            return
+        try:
+            self.sync_folder(task["baidu_folder"], task["aliyun_folder"], max_workers, transfer=transfer,
+                             priority=task.get("priority", 0), weight=task.get("weight", 1))
+        except Exception as e:
+            logger.error(f"同步任务失败: {task['baidu_folder']} -> {task['aliyun_folder']}: {str(e)}")
+    
+    def watch(self, sync_tasks: List[Dict], max_workers: int = 3):
+        """守护模式：循环执行同步任务，每轮之间等待 watch_interval 秒（带随机抖动），直到收到停止请求"""
+        cycle = 0
+        while not self._stop.is_set():
+            cycle += 1
+            self._full_scan = bool(self.watch_full_scan_every) and cycle % self.watch_full_scan_every == 0
+            logger.info(f"🔁 第 {cycle} 轮同步开始")
+            started = time.monotonic()
+            self.run_tasks(sync_tasks, max_workers)
+            logger.info(f"🔁 第 {cycle} 轮同步结束，耗时 {time.monotonic() - started:.1f} 秒")
+            
+            # 多个实例或多个账号同时运行时，抖动可以避免总在同一时刻请求接口
+            jitter = max(0.0, min(self.watch_jitter, 1.0))
+            delay = self.watch_interval * (1 + random.uniform(-jitter, jitter))
+            logger.info(f"下一轮同步将在 {delay:.0f} 秒后开始")
+            if self._stop.wait(delay):
+                break
+            
+            # 阿里云盘上的文件可能在两轮之间被修改，重新建立目录文件索引
+            self.aliyun_client.clear_dir_index()
+        logger.info("守护模式已停止")
+    
+    def _temp_space_needed(self, file_info: Dict) -> int:
+        """同步该文件需要的临时空间（管道模式不落盘，只有秒传预哈希命中时才会回退到临时文件）"""
+        if self.pipe_mode and not self.aliyun_client.rapid_upload:
+            return 0
+        return file_info.get("size", 0)
+    
+    @staticmethod
+    def _aliyun_dir_for(file_path: str, baidu_base: str, aliyun_base: str) -> str:
+        """百度网盘文件对应的阿里云盘目录"""
         # 计算相对路径
         relative_path = file_path.replace(baidu_base, "").lstrip("/")
         relative_dir = os.path.dirname(relative_path)
         
         # 计算阿里云盘路径
         if relative_dir:
-            aliyun_dir = os.path.join(aliyun_base, relative_dir).replace("\\", "/")
-        else:
-            aliyun_dir = aliyun_base
+            return os.path.join(aliyun_base, relative_dir).replace("\\", "/")
+        return aliyun_base
+    
+    def _sync_single_file(self, file_info: Dict, baidu_base: str, aliyun_base: str, overwrite: bool = False) -> bool:
+        """
+        同步单个文件（支持断点续传）：在同一线程内依次执行下载阶段与上传阶段
+        :param overwrite: 文件在百度网盘已修改，覆盖阿里云盘上的旧版本
+        """
+        staged = self._download_stage(file_info, baidu_base, aliyun_base, overwrite)
+        if isinstance(staged, bool):
+            return staged
+        return self._upload_stage(staged)
+    
+    def _download_stage(self, file_info: Dict, baidu_base: str, aliyun_base: str, overwrite: bool = False):
+        """
+        下载阶段：检查阿里云盘是否已有该文件，然后下载到临时目录
+        :param overwrite: 文件在百度网盘已修改，覆盖阿里云盘上的旧版本
+        :return: 已有结论时返回 bool（已存在、管道模式已完成、下载失败），否则返回待上传的 StagedFile
+        """
+        file_path = file_info.get("path")
+        file_name = file_info.get("server_filename")
+        fs_id = file_info.get("fs_id")
+        file_size = file_info.get("size", 0)
         
-        aliyun_file_path = os.path.join(aliyun_dir, file_name).replace("\\", "/")
+        # 格式化文件大小
+        size_mb = file_size / (1024 * 1024)
+        size_str = f"{size_mb:.2f}MB" if size_mb >= 1 else f"{file_size / 1024:.2f}KB"
+        
+        aliyun_dir = self._aliyun_dir_for(file_path, baidu_base, aliyun_base)
         
         logger.info(f"🔄 同步: {file_name} ({size_str})")
         
-        # 检查文件是否已存在
-        existing_file = self.aliyun_client.get_file_by_path(aliyun_file_path)
-        if existing_file:
-            logger.info(f"  文件已存在于阿里云盘，标记为完成")
-            self._mark_completed(file_path)
+        check_name_mode = self._check_remote(file_info, aliyun_dir, overwrite)
+        if check_name_mode is None:
             return True
         
-        # 下载到临时目录
+        # 管道模式：边下载边上传（预哈希命中时回退到临时文件，以便计算完整哈希秒传）
+        if self.pipe_mode:
+            try:
+                with self.stats.timer("pipe") as timer:
+                    success = self._pipe_single_file(file_info, aliyun_dir, check_name_mode)
+                    timer.ok = success
+                    timer.bytes = file_size if success else 0
+            except PreHashMatched:
+                logger.info(f"  预哈希命中，改为下载到临时文件后尝试秒传")
+                success = None
+            if success is not None:
+                if success:
+                    self._mark_completed(file_path)
+                    self.aliyun_client.record_file(aliyun_dir, file_name, file_size)
+                    logger.info(f"  ✅ 同步成功")
+                else:
+                    logger.error(f"  ❌ 同步失败")
+                return success
+        
+        # 下载到临时目录（顺带计算 SHA1，供秒传使用）
         temp_file = os.path.join(self.temp_dir, f"{fs_id}_{file_name}")
+        hasher = ContentHasher()
         logger.info(f"  ⬇️  下载中...")
         
         # 根据客户端类型选择下载方式
         if USE_BAIDUPCS and isinstance(self.baidu_client, BaiduPanClientPCS):
             # 使用 baidupcs-py 直接下载
-            if not self.baidu_client.download_file(file_path, temp_file):
+            with self.stats.timer("download") as timer:
+                timer.ok = self.baidu_client.download_file(file_path, temp_file, on_chunk=hasher.update,
+                                                           file_size=file_size, file_md5=file_info.get("md5"))
+                timer.bytes = hasher.size
+            if not timer.ok:
                 return False
         else:
             # 使用原始方法：先获取下载链接，再下载
             logger.debug(f"  获取下载链接...")
-            download_url = self.baidu_client.get_download_link(fs_id)
+            with self.stats.timer("dlink") as timer:
+                download_url = self.baidu_client.get_download_link(fs_id)
+                timer.ok = bool(download_url)
             if not download_url:
                 logger.error(f"  ❌ 无法获取下载链接")
                 return False
             
-            if not self.baidu_client.download_file(download_url, temp_file):
+            with self.stats.timer("download") as timer:
+                timer.ok = self.baidu_client.download_file(download_url, temp_file, on_chunk=hasher.update,
+                                                           file_size=file_size, file_md5=file_info.get("md5"),
+                                                           fs_id=fs_id)
+                timer.bytes = hasher.size
+            if not timer.ok:
                 return False
         
+        content_hash = hasher.content_hash(os.path.getsize(temp_file))
+        self.stats.stage("hash", hasher.seconds, hasher.size)
+        return StagedFile(file_info, aliyun_dir, temp_file, content_hash, check_name_mode)
+    
+    def _check_remote(self, file_info: Dict, aliyun_dir: str, overwrite: bool = False) -> Optional[str]:
+        """
+        检查阿里云盘上是否已有该文件（按目录批量列出后查索引，并比较大小）
+        :return: 已存在（已标记为完成）时返回 None，否则返回上传时的同名文件处理方式
+        """
+        file_name = file_info.get("server_filename")
+        file_size = file_info.get("size", 0)
+        if overwrite:
+            logger.info(f"  文件已修改，覆盖上传")
+            return "overwrite"
+        
+        with self.stats.timer("check"):
+            existing_file = self.aliyun_client.find_file(aliyun_dir, file_name)
+        if not existing_file:
+            return "auto_rename"
+        if existing_file.get("size") in (None, file_size):
+            logger.info(f"  文件已存在于阿里云盘，标记为完成")
+            self._mark_completed(file_info.get("path"))
+            return None
+        # 覆盖旧文件；按默认的 auto_rename 上传会在旧文件旁边多出一个 "name(1).ext"
+        logger.warning(f"  阿里云盘已有同名文件但大小不同 ({existing_file.get('size')} != {file_size})，覆盖上传")
+        return "overwrite"
+    
+    def _upload_stage(self, staged: StagedFile) -> bool:
+        """上传阶段：把下载阶段得到的临时文件上传到阿里云盘，完成后删除临时文件"""
+        file_size = staged.file_info.get("size", 0)
+        with self.stats.timer("upload") as timer:
+            session = self._begin_upload(staged)
+            success = session if isinstance(session, bool) else self.aliyun_client.upload_parts(session)
+            timer.ok = success
+            timer.bytes = file_size if success else 0
+        
+        return self._finish_staged(staged, success)
+    
+    def _begin_upload(self, staged: StagedFile):
+        """
+        获取阿里云盘父文件夹并开始分片上传（线程引擎与 asyncio 引擎共用）
+        :return: 已有结论时返回 bool（秒传成功、无法创建父文件夹等），否则返回待上传分片的 UploadSession
+        """
+        file_name = staged.file_info.get("server_filename")
+        aliyun_dir = staged.aliyun_dir
+        
         # 获取阿里云盘父文件夹ID
         logger.debug(f"  获取/创建父文件夹: {aliyun_dir}")
-        parent_folder_id = self.aliyun_client.get_or_create_folder_by_path(aliyun_dir)
+        with self.stats.timer("folder") as timer:
+            parent_folder_id = self.aliyun_client.get_or_create_folder_by_path(aliyun_dir)
+            timer.ok = bool(parent_folder_id)
         if not parent_folder_id:
             logger.error(f"  ❌ 无法创建父文件夹: {aliyun_dir}")
-            try:
-                os.remove(temp_file)
-            except:
-                pass
             return False
         
-        # 添加小延迟，避免文件夹创建后立即上传导致问题
-        time.sleep(0.2)
-        
-        # 上传到阿里云盘
-        logger.info(f"  ⬆️  上传中...")
-        success = self.aliyun_client.upload_file(temp_file, parent_folder_id, file_name)
+        logger.info(f"  ⬆️  上传中: {file_name}")
+        begin = lambda folder_id: self.aliyun_client.begin_upload(
+            staged.temp_file, folder_id, file_name, content_hash=staged.content_hash,
+            check_name_mode=staged.check_name_mode)
+        try:
+            return begin(parent_folder_id)
+        except FolderNotFound:
+            # 缓存的文件夹ID已失效，重新获取后再试一次
+            self.aliyun_client.invalidate_folder(aliyun_dir)
+            parent_folder_id = self.aliyun_client.get_or_create_folder_by_path(aliyun_dir)
+            try:
+                return bool(parent_folder_id) and begin(parent_folder_id)
+            except FolderNotFound:
+                logger.error(f"  ❌ 父文件夹不存在: {aliyun_dir}")
+                return False
+    
+    def _finish_staged(self, staged: StagedFile, success: bool) -> bool:
+        """上传结束：删除临时文件与上传会话记录，成功时标记为已完成"""
+        file_path = staged.file_info.get("path")
+        file_name = staged.file_info.get("server_filename")
+        file_size = staged.file_info.get("size", 0)
+        aliyun_dir = staged.aliyun_dir
+        temp_file = staged.temp_file
         
-        # 清理临时文件
+        # 清理临时文件（进程崩溃时会保留，下次运行可续传）
         try:
             os.remove(temp_file)
         except:
             pass
+        self.aliyun_client.discard_upload_state(temp_file)
         
         # 标记为已完成（断点续传）
         if success:
             self._mark_completed(file_path)
-            logger.info(f"  ✅ 同步成功")
+            self.aliyun_client.record_file(aliyun_dir, file_name, file_size, staged.content_hash)
+            logger.info(f"  ✅ 同步成功: {file_name}")
         else:
-            logger.error(f"  ❌ 同步失败")
+            logger.error(f"  ❌ 同步失败: {file_name}")
         
         return success
 
 
+    def _open_baidu_stream(self, file_info: Dict) -> Optional[Iterator[bytes]]:
+        """打开百度网盘文件的下载流"""
+        if USE_BAIDUPCS and isinstance(self.baidu_client, BaiduPanClientPCS):
+            return self.baidu_client.iter_file_content(file_info.get("path"))
+        
+        if not self.baidu_client.get_download_link(file_info.get("fs_id")):
+            logger.error(f"  ❌ 无法获取下载链接")
+            return None
+        return self.baidu_client.iter_dlink_content(file_info.get("fs_id"))
+    
+    def _pipe_single_file(self, file_info: Dict, aliyun_dir: str, check_name_mode: str = "auto_rename") -> bool:
+        """
+        管道模式同步单个文件：百度下载流 -> 环形缓冲区 -> 阿里云分片上传
+        预哈希命中时抛出 PreHashMatched
+        """
+        file_name = file_info.get("server_filename")
+        file_size = file_info.get("size", 0)
+        
+        parent_folder_id = self.aliyun_client.get_or_create_folder_by_path(aliyun_dir)
+        if not parent_folder_id:
+            logger.error(f"  ❌ 无法创建父文件夹: {aliyun_dir}")
+            return False
+        
+        chunks = self._open_baidu_stream(file_info)
+        if chunks is None:
+            return False
+        
+        # 先读出前 1KB 计算预哈希，再把这部分数据放回流的开头
+        head = b""
+        try:
+            while len(head) < PRE_HASH_SIZE:
+                chunk = next(chunks, b"")
+                if not chunk:
+                    break
+                head += chunk
+        except Exception as e:
+            logger.error(f"  ❌ 读取下载流失败: {str(e)}")
+            return False
+        pre_hash = hashlib.sha1(head[:PRE_HASH_SIZE]).hexdigest()
+        
+        logger.info(f"  🔀 管道传输中...")
+        ring = RingBuffer(min(self.pipe_buffer_size, max(file_size, 1)))
+        producer = start_producer(itertools.chain([head], chunks), ring, name=f"pipe-{file_info.get('fs_id')}")
+        
+        try:
+            try:
+                return self.aliyun_client.upload_stream(ring, parent_folder_id, file_name, file_size,
+                                                        pre_hash=pre_hash, check_name_mode=check_name_mode)
+            except FolderNotFound:
+                # 缓存的文件夹ID已失效（创建文件时失败，数据流尚未读取），重新获取后再试一次
+                self.aliyun_client.invalidate_folder(aliyun_dir)
+                parent_folder_id = self.aliyun_client.get_or_create_folder_by_path(aliyun_dir)
+                if not parent_folder_id:
+                    return False
+                return self.aliyun_client.upload_stream(ring, parent_folder_id, file_name, file_size,
+                                                        pre_hash=pre_hash, check_name_mode=check_name_mode)
+        except FolderNotFound:
+            logger.error(f"  ❌ 父文件夹不存在: {aliyun_dir}")
+            return False
+        finally:
+            # 上传结束（成功、失败或预哈希命中）后中止下载线程，避免其阻塞在写缓冲区
+            ring.abort(IOError("上传已结束"))
+            producer.join()
+
+
 def load_config(config_file: str = "config.json") -> Dict:
     """加载配置文件"""
     if not os.path.exists(config_file):
@@ -943,6 +2291,8 @@ def load_config(config_file: str = "config.json") -> Dict:
 
 def main():
     """主函数"""
+    setup_logging()
+    
     # 加载配置
     config = load_config()
     
@@ -1017,26 +2367,33 @@ def main():
     
     # 创建同步器
     try:
-        syncer = BaiduToAliyunSync(baidu_config, aliyun_config, temp_dir)
+        syncer = BaiduToAliyunSync(baidu_config, aliyun_config, temp_dir, options=config)
     except Exception as e:
         logger.error(f"初始化同步器失败: {str(e)}")
         return
     
+    # Ctrl+C / SIGTERM：第一次等待进行中的文件完成后退出，第二次立即退出（已完成的文件已记录在进度中）
+    def handle_signal(signum, frame):
+        if syncer.stopping:
+            logger.warning("再次收到停止信号，立即退出")
+            os._exit(128 + signum)
+        logger.warning(f"收到停止信号 ({signal.Signals(signum).name})，等待进行中的文件完成后退出，再按一次 Ctrl+C 立即退出")
+        syncer.request_stop()
+    
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    
     # 执行同步任务
-    for task in sync_tasks:
-        baidu_folder = task.get("baidu_folder")
-        aliyun_folder = task.get("aliyun_folder")
-        
-        if not baidu_folder or not aliyun_folder:
-            logger.warning(f"跳过无效任务: {task}")
-            continue
-        
-        try:
-            syncer.sync_folder(baidu_folder, aliyun_folder, max_workers)
-        except Exception as e:
-            logger.error(f"同步任务失败: {str(e)}")
+    if syncer.watch_interval:
+        logger.info(f"守护模式: 每 {syncer.watch_interval} 秒同步一轮")
+        syncer.watch(sync_tasks, max_workers)
+    else:
+        syncer.run_tasks(sync_tasks, max_workers)
     
-    logger.info("所有同步任务完成")
+    if syncer.stopping:
+        logger.info("同步已停止")
+    else:
+        logger.info("所有同步任务完成")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟的百度网盘与阿里云盘接口（用于离线基准测试）
+百度：/api/list、/api/filemetas（及 /rest/2.0/xpan/file 的 list、filemetas）、支持 Range 的 dlink 下载
+阿里云：token/refresh、user/get、get_by_path、file/list、createWithFolders、get_upload_url、
+list_uploaded_parts、complete 以及分片 PUT
+两者都可以注入固定延迟、限制带宽、按比例返回 429
+"""
+
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# 每次写出/读入的数据块大小
+CHUNK_SIZE = 64 * 1024
+
+
+class FaultOptions:
+    """注入的延迟、带宽限制与限流"""
+    
+    def __init__(self, latency_ms: float = 0, bandwidth_mbps: float = 0, total_bandwidth_mbps: float = 0,
+                 rate_429: float = 0, retry_after: Optional[float] = None, seed: Optional[int] = None):
+        """
+        :param latency_ms: 每个请求在响应前等待的毫秒数
+        :param bandwidth_mbps: 单个连接的带宽上限（MB/s，0 表示不限）
+        :param total_bandwidth_mbps: 整个服务的带宽上限（MB/s，0 表示不限）
+        :param rate_429: 返回 429 的请求比例（0~1）
+        :param retry_after: 429 响应的 Retry-After 秒数（None 表示不带）
+        :param seed: 随机数种子（让 429 注入可复现）
+        """
+        self.latency = latency_ms / 1000.0
+        self.bandwidth = bandwidth_mbps * 1024 * 1024
+        self.total = _Throttle(total_bandwidth_mbps * 1024 * 1024)
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def should_throttle(self) -> bool:
+        if not self.rate_429:
+            return False
+        with self._lock:
+            return self._random.random() < self.rate_429
+
+
+class _Throttle:
+    """按字节数限速（令牌桶，线程安全）"""
+    
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def consume(self, nbytes: int):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(self._next, now) + nbytes / self.rate
+            wait = self._next - now - nbytes / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+def synthetic_chunk(fs_id: int, start: int, length: int) -> bytes:
+    """合成文件内容：按 fs_id 生成 32 字节的重复图样，任意偏移都可以直接计算"""
+    pattern = hashlib.sha256(str(fs_id).encode()).digest()
+    offset = start % len(pattern)
+    repeat = (offset + length) // len(pattern) + 1
+    return (pattern * repeat)[offset:offset + length]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """公共部分：延迟、429 注入、JSON 响应、限速写出"""
+    
+    protocol_version = "HTTP/1.1"
+    # 响应头与响应体分两次写出，不关闭 Nagle 时每个请求会多等一次延迟确认（约 40ms）
+    disable_nagle_algorithm = True
+    faults: FaultOptions = FaultOptions()
+    
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+    
+    def _inject(self) -> bool:
+        """注入延迟与 429，返回 True 表示已经响应了 429"""
+        if self.faults.latency:
+            time.sleep(self.faults.latency)
+        if self.faults.should_throttle():
+            headers = {"Retry-After": str(self.faults.retry_after)} if self.faults.retry_after is not None else {}
+            self._json(429, {"code": "TooManyRequests", "message": "injected"}, headers)
+            return True
+        return False
+    
+    def _json(self, status: int, body: Dict, headers: Optional[Dict] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def _read_body(self) -> bytes:
+        """读取请求体（按带宽限制读取）"""
+        remaining = int(self.headers.get("Content-Length") or 0)
+        connection = _Throttle(self.faults.bandwidth)
+        chunks = []
+        while remaining > 0:
+            chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            connection.consume(len(chunk))
+            self.faults.total.consume(len(chunk))
+            chunks.append(chunk)
+        return b"".join(chunks)
+    
+    def _stream(self, chunks: Iterator[bytes]):
+        connection = _Throttle(self.faults.bandwidth)
+        for chunk in chunks:
+            connection.consume(len(chunk))
+            self.faults.total.consume(len(chunk))
+            self.wfile.write(chunk)
+
+
+class MockBaiduServer:
+    """模拟百度网盘：目录树来自 files（路径 -> 大小），文件内容按 fs_id 合成"""
+    
+    def __init__(self, files: Dict[str, int], faults: Optional[FaultOptions] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        """
+        :param files: 文件路径（以 / 开头） -> 文件大小
+        """
+        self.faults = faults or FaultOptions()
+        self.entries: Dict[str, List[Dict]] = {}  # 目录 -> 子项
+        self.by_fs_id: Dict[int, Dict] = {}
+        self._build(files)
+        self.requests = 0
+        self.downloaded_bytes = 0
+        self._lock = threading.Lock()
+        
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+    
+    def _build(self, files: Dict[str, int]):
+        dirs = set()
+        fs_id = 1000
+        for path, size in sorted(files.items()):
+            fs_id += 1
+            parent, name = path.rsplit("/", 1)
+            parent = parent or "/"
+            info = {"path": path, "server_filename": name, "isdir": 0, "fs_id": fs_id, "size": size,
+                    "md5": hashlib.md5(str(fs_id).encode()).hexdigest(), "server_mtime": 1700000000}
+            self.entries.setdefault(parent, []).append(info)
+            self.by_fs_id[fs_id] = info
+            # 补齐上级目录
+            while parent != "/" and parent not in dirs:
+                dirs.add(parent)
+                grand, name = parent.rsplit("/", 1)
+                grand = grand or "/"
+                fs_id += 1
+                self.entries.setdefault(grand, []).append(
+                    {"path": parent, "server_filename": name, "isdir": 1, "fs_id": fs_id, "size": 0,
+                     "server_mtime": 1700000000})
+                parent = grand
+        for items in self.entries.values():
+            items.sort(key=lambda item: item["server_filename"])
+        self._last_fs_id = fs_id
+    
+    def add_file(self, path: str, size: int, mtime: int):
+        """
+        新增文件（缺少的上级目录一并创建）
+        与百度网盘一样，只有直接上级目录的修改时间会更新为 mtime
+        """
+        with self._lock:
+            parent, name = path.rsplit("/", 1)
+            self._add_entry(parent or "/", {"path": path, "server_filename": name, "isdir": 0, "size": size},
+                            mtime)
+    
+    def _add_entry(self, parent: str, info: Dict, mtime: int):
+        if parent not in self.entries:
+            grand, name = parent.rsplit("/", 1)
+            self.entries[parent] = []
+            self._add_entry(grand or "/", {"path": parent, "server_filename": name, "isdir": 1, "size": 0}, mtime)
+        self._last_fs_id += 1
+        info.update(fs_id=self._last_fs_id, server_mtime=mtime)
+        if not info["isdir"]:
+            info["md5"] = hashlib.md5(str(info["fs_id"]).encode()).hexdigest()
+            self.by_fs_id[info["fs_id"]] = info
+        self.entries[parent].append(info)
+        self.entries[parent].sort(key=lambda item: item["server_filename"])
+        
+        # 更新上级目录自身（在它的上级目录列表中）的修改时间
+        grand = parent.rsplit("/", 1)[0] or "/"
+        for item in self.entries.get(grand, []) if parent != "/" else []:
+            if item["path"] == parent:
+                item["server_mtime"] = mtime
+    
+    def start(self) -> "MockBaiduServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-baidu", daemon=True)
+        self._thread.start()
+        return self
+    
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def _handler_class(self):
+        mock = self
+        
+        class Handler(_Handler):
+            faults = mock.faults
+            
+            def do_GET(self):
+                with mock._lock:
+                    mock.requests += 1
+                if self._inject():
+                    return
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if url.path == "/api/list":
+                    page, num = int(query.get("page", 1)), int(query.get("num", 1000))
+                    self._list(query.get("dir", "/"), (page - 1) * num, num, "list")
+                elif url.path == "/api/filemetas":
+                    self._filemetas(query, "info")
+                elif url.path.endswith("/file") and query.get("method") == "list":
+                    self._list(query.get("dir", "/"), int(query.get("start", 0)), int(query.get("limit", 1000)),
+                               "list")
+                elif url.path.endswith("/file") and query.get("method") == "filemetas":
+                    self._filemetas(query, "list")
+                elif url.path.startswith("/dl/"):
+                    self._download(int(url.path.rsplit("/", 1)[1]))
+                else:
+                    self._json(404, {"errno": -9, "errmsg": "not found"})
+            
+            def _list(self, dir_path: str, start: int, num: int, key: str):
+                dir_path = dir_path.rstrip("/") or "/"
+                if dir_path not in mock.entries:
+                    self._json(200, {"errno": -9, "errmsg": "目录不存在"})
+                    return
+                self._json(200, {"errno": 0, key: mock.entries[dir_path][start:start + num]})
+            
+            def _filemetas(self, query: Dict, key: str):
+                fs_ids = json.loads(query.get("fsids", "[]"))
+                host = self.headers.get("Host")
+                info = [{"fs_id": fs_id, "dlink": f"http://{host}/dl/{fs_id}"}
+                        for fs_id in fs_ids if fs_id in mock.by_fs_id]
+                self._json(200, {"errno": 0, key: info})
+            
+            def _download(self, fs_id: int):
+                info = mock.by_fs_id.get(fs_id)
+                if info is None:
+                    self._json(404, {"errno": -9})
+                    return
+                size = info["size"]
+                start, end = 0, size - 1
+                status = 200
+                range_header = self.headers.get("Range")
+                if range_header and range_header.startswith("bytes="):
+                    first, _, last = range_header[len("bytes="):].partition("-")
+                    start = int(first or 0)
+                    end = min(int(last), size - 1) if last else size - 1
+                    status = 206
+                length = max(0, end - start + 1)
+                
+                self.send_response(status)
+                self.send_header("Content-Length", str(length))
+                self.send_header("Accept-Ranges", "bytes")
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.end_headers()
+                
+                def chunks() -> Iterator[bytes]:
+                    offset = start
+                    while offset <= end:
+                        n = min(CHUNK_SIZE, end - offset + 1)
+                        yield synthetic_chunk(fs_id, offset, n)
+                        offset += n
+                
+                self._stream(chunks())
+                with mock._lock:
+                    mock.downloaded_bytes += length
+        
+        return Handler
+
+
+class MockAliyunServer:
+    """模拟阿里云盘：文件树与上传状态保存在内存中，分片数据只记录长度（不保存内容）"""
+    
+    def __init__(self, faults: Optional[FaultOptions] = None, host: str = "127.0.0.1", port: int = 0):
+        self.faults = faults or FaultOptions()
+        self.files: Dict[str, Dict] = {"root": {"file_id": "root", "type": "folder", "name": "",
+                                                "parent_file_id": None}}
+        self.parts: Dict[str, Dict[int, int]] = {}  # file_id -> {分片号: 长度}
+        self.requests = 0
+        self.uploaded_bytes = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+        
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> "MockAliyunServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-aliyun", daemon=True)
+        self._thread.start()
+        return self
+    
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def completed_files(self) -> Dict[str, int]:
+        """已完成上传的文件：路径 -> 大小"""
+        with self._lock:
+            return {self._path_of(item): item["size"] for item in self.files.values()
+                    if item["type"] == "file" and item.get("complete")}
+    
+    def _path_of(self, item: Dict) -> str:
+        names = []
+        while item and item["file_id"] != "root":
+            names.append(item["name"])
+            item = self.files.get(item["parent_file_id"])
+        return "/" + "/".join(reversed(names))
+    
+    def _child(self, parent_id: str, name: str) -> Optional[Dict]:
+        for item in self.files.values():
+            if item["parent_file_id"] == parent_id and item["name"] == name:
+                return item
+        return None
+    
+    def _new_id(self) -> str:
+        self._next_id += 1
+        return f"{self._next_id:012d}"
+    
+    def _handler_class(self):
+        mock = self
+        
+        class Handler(_Handler):
+            faults = mock.faults
+            
+            def do_PUT(self):
+                with mock._lock:
+                    mock.requests += 1
+                body = self._read_body()
+                if self._inject():
+                    return
+                parts = urlparse(self.path).path.strip("/").split("/")
+                if len(parts) != 3 or parts[0] != "upload":
+                    self._json(404, {"code": "NotFound"})
+                    return
+                file_id, part_number = parts[1], int(parts[2])
+                with mock._lock:
+                    mock.parts.setdefault(file_id, {})[part_number] = len(body)
+                    mock.uploaded_bytes += len(body)
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            
+            def do_POST(self):
+                with mock._lock:
+                    mock.requests += 1
+                raw = self._read_body()
+                if self._inject():
+                    return
+                body = json.loads(raw or b"{}")
+                handler = {
+                    "/token/refresh": self._token,
+                    "/v2/user/get": self._user,
+                    "/v2/file/get_by_path": self._get_by_path,
+                    "/adrive/v3/file/list": self._list,
+                    "/adrive/v2/file/createWithFolders": self._create,
+                    "/v2/file/get_upload_url": self._upload_urls,
+                    "/v2/file/list_uploaded_parts": self._uploaded_parts,
+                    "/v2/file/complete": self._complete,
+                }.get(urlparse(self.path).path)
+                if handler is None:
+                    self._json(404, {"code": "NotFound"})
+                    return
+                with mock._lock:
+                    status, result = handler(body)
+                self._json(status, result)
+            
+            def _token(self, body: Dict) -> Tuple[int, Dict]:
+                return 200, {"access_token": "mock-access-token", "refresh_token": body.get("refresh_token"),
+                             "default_drive_id": "mock-drive", "expires_in": 7200}
+            
+            def _user(self, body: Dict) -> Tuple[int, Dict]:
+                return 200, {"default_drive_id": "mock-drive", "nick_name": "bench"}
+            
+            def _get_by_path(self, body: Dict) -> Tuple[int, Dict]:
+                item = mock.files["root"]
+                for name in [part for part in body.get("file_path", "").split("/") if part]:
+                    item = mock._child(item["file_id"], name)
+                    if item is None:
+                        return 404, {"code": "NotFound.File"}
+                return 200, self._public(item)
+            
+            def _list(self, body: Dict) -> Tuple[int, Dict]:
+                parent_id = body.get("parent_file_id")
+                if parent_id not in mock.files:
+                    return 404, {"code": "NotFound.File"}
+                items = sorted((item for item in mock.files.values() if item["parent_file_id"] == parent_id),
+                               key=lambda item: item["file_id"])
+                start = int(body.get("marker") or 0)
+                limit = int(body.get("limit", 100))
+                page = items[start:start + limit]
+                marker = str(start + limit) if start + limit < len(items) else ""
+                return 200, {"items": [self._public(item) for item in page], "next_marker": marker}
+            
+            def _create(self, body: Dict) -> Tuple[int, Dict]:
+                parent_id = body.get("parent_file_id")
+                if parent_id not in mock.files:
+                    return 404, {"code": "NotFound.File"}
+                existing = mock._child(parent_id, body["name"])
+                if body.get("type") == "folder":
+                    if existing is not None and body.get("check_name_mode") == "refuse":
+                        return 201, {"file_id": existing["file_id"], "exist": True}
+                    file_id = mock._new_id()
+                    mock.files[file_id] = {"file_id": file_id, "type": "folder", "name": body["name"],
+                                           "parent_file_id": parent_id}
+                    return 201, {"file_id": file_id}
+                
+                if existing is not None and body.get("check_name_mode") == "overwrite":
+                    del mock.files[existing["file_id"]]
+                file_id = mock._new_id()
+                mock.files[file_id] = {"file_id": file_id, "type": "file", "name": body["name"],
+                                       "parent_file_id": parent_id, "size": body.get("size", 0),
+                                       "content_hash": body.get("content_hash")}
+                part_info = [{"part_number": part["part_number"],
+                              "upload_url": self._upload_url(file_id, part["part_number"])}
+                             for part in body.get("part_info_list", [])]
+                return 201, {"file_id": file_id, "upload_id": f"upload-{file_id}", "rapid_upload": False,
+                             "part_info_list": part_info}
+            
+            def _upload_urls(self, body: Dict) -> Tuple[int, Dict]:
+                file_id = body.get("file_id")
+                return 200, {"part_info_list": [{"part_number": part["part_number"],
+                                                 "upload_url": self._upload_url(file_id, part["part_number"])}
+                                                for part in body.get("part_info_list", [])]}
+            
+            def _uploaded_parts(self, body: Dict) -> Tuple[int, Dict]:
+                parts = mock.parts.get(body.get("file_id"), {})
+                return 200, {"uploaded_parts": [{"part_number": n, "part_size": size}
+                                                for n, size in sorted(parts.items())]}
+            
+            def _complete(self, body: Dict) -> Tuple[int, Dict]:
+                item = mock.files.get(body.get("file_id"))
+                if item is None:
+                    return 404, {"code": "NotFound.File"}
+                received = sum(mock.parts.get(item["file_id"], {}).values())
+                if received != item["size"]:
+                    return 400, {"code": "InvalidParameter", "message": f"size mismatch {received}"}
+                item["complete"] = True
+                return 200, self._public(item)
+            
+            def _upload_url(self, file_id: str, part_number: int) -> str:
+                return f"http://{self.headers.get('Host')}/upload/{file_id}/{part_number}"
+            
+            @staticmethod
+            def _public(item: Dict) -> Dict:
+                return {key: value for key, value in item.items() if key != "complete"}
+        
+        return Handler
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线基准测试：在本地模拟的百度网盘/阿里云盘接口上运行完整的同步流程，输出 files/s 与 MB/s
+
+用法：
+    python bench/run_bench.py                          # 运行全部场景
+    python bench/run_bench.py tiny --files 5000 --latency-ms 20
+    python bench/run_bench.py huge --engine asyncio --bandwidth-mbps 50 --rate-429 0.02
+
+场景：
+    tiny  大量小文件（默认 2000 个 4KB 文件，分布在 20 个目录中）
+    huge  少量大文件（默认 4 个 256MB 文件）
+    deep  深层嵌套目录（默认 12 层，每层 2 个子目录，叶子目录各 3 个文件）
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_servers import FaultOptions, MockAliyunServer, MockBaiduServer  # noqa: E402
+from baidu_to_aliyun_sync import BaiduToAliyunSync  # noqa: E402
+from rate_limiter import DEFAULT_RATES  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def tiny_tree(args) -> Dict[str, int]:
+    """大量小文件"""
+    dirs = max(1, args.dirs)
+    return {f"/bench/d{i % dirs:03d}/f{i:06d}.bin": args.file_kb * 1024 for i in range(args.files)}
+
+
+def huge_tree(args) -> Dict[str, int]:
+    """少量大文件"""
+    return {f"/bench/huge{i:02d}.bin": args.huge_mb * MB for i in range(args.huge_files)}
+
+
+def deep_tree(args) -> Dict[str, int]:
+    """深层嵌套：每层 fanout 个子目录，叶子目录放若干文件（fanout ** depth 个叶子目录）"""
+    files = {}
+    
+    def walk(path: str, level: int):
+        if level == args.depth:
+            for i in range(args.leaf_files):
+                files[f"{path}/f{i}.bin"] = args.file_kb * 1024
+            return
+        for i in range(args.fanout):
+            walk(f"{path}/n{level}_{i}", level + 1)
+    
+    walk("/bench", 0)
+    return files
+
+
+SCENARIOS = {"tiny": tiny_tree, "huge": huge_tree, "deep": deep_tree}
+
+
+def run_scenario(name: str, args) -> Dict:
+    """启动一对模拟服务，同步一棵合成目录树，返回耗时与吞吐量"""
+    files = SCENARIOS[name](args)
+    total_bytes = sum(files.values())
+    
+    def faults(seed_offset: int) -> FaultOptions:
+        return FaultOptions(latency_ms=args.latency_ms, bandwidth_mbps=args.bandwidth_mbps,
+                            total_bandwidth_mbps=args.total_bandwidth_mbps, rate_429=args.rate_429,
+                            retry_after=args.retry_after, seed=args.seed + seed_offset)
+    
+    baidu = MockBaiduServer(files, faults(0)).start()
+    aliyun = MockAliyunServer(faults(1)).start()
+    temp_dir = tempfile.mkdtemp(prefix=f"pan_bench_{name}_")
+    try:
+        options = {
+            "baidu_api_url": f"{baidu.url}/rest/2.0/xpan",
+            "baidu_web_url": baidu.url,
+            "aliyun_api_url": aliyun.url,
+            "engine": args.engine,
+            "max_workers": args.workers,
+            "pipe_mode": args.pipe_mode,
+            # 模拟服务不支持秒传，关闭以免多算一次哈希
+            "rapid_upload": False,
+            "stats_report": os.path.join(temp_dir, "sync_stats.json") if args.keep else "",
+        }
+        if args.api_rate:
+            # 默认限速按真实接口设定，基准测试时放开，只由模拟服务注入的 429 触发降速
+            options["rate_limits"] = {category: args.api_rate for category in DEFAULT_RATES}
+        syncer = BaiduToAliyunSync({"access_token": "bench"}, {"refresh_token": "bench"},
+                                   temp_dir=temp_dir, options=options)
+        
+        start = time.monotonic()
+        syncer.sync_folder("/bench", "/bench", max_workers=args.workers)
+        elapsed = time.monotonic() - start
+        
+        # 校验：阿里云盘上的每个文件都已完成上传且大小一致
+        completed = aliyun.completed_files()
+        synced = sum(1 for path, size in files.items() if completed.get(path) == size)
+        return {
+            "scenario": name,
+            "files": len(files),
+            "synced": synced,
+            "mb": total_bytes / MB,
+            "seconds": elapsed,
+            "files_per_s": synced / elapsed if elapsed > 0 else 0,
+            "mb_per_s": sum(files[path] for path in files if completed.get(path) == files[path]) / MB / elapsed
+            if elapsed > 0 else 0,
+            "requests": baidu.requests + aliyun.requests,
+        }
+    finally:
+        baidu.close()
+        aliyun.close()
+        if args.keep:
+            print(f"临时目录已保留: {temp_dir}")
+        else:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="百度网盘 -> 阿里云盘同步的离线基准测试")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario", help="tiny / huge / deep / all（默认 all）")
+    parser.add_argument("--engine", choices=["thread", "asyncio"], default="thread")
+    parser.add_argument("--workers", type=int, default=8, help="并发数（max_workers）")
+    parser.add_argument("--pipe-mode", action="store_true", help="使用管道模式（不写临时文件）")
+    
+    parser.add_argument("--files", type=int, default=2000, help="tiny：文件数")
+    parser.add_argument("--dirs", type=int, default=20, help="tiny：目录数")
+    parser.add_argument("--file-kb", type=int, default=4, help="tiny / deep：单个文件大小（KB）")
+    parser.add_argument("--huge-files", type=int, default=4, help="huge：文件数")
+    parser.add_argument("--huge-mb", type=int, default=256, help="huge：单个文件大小（MB）")
+    parser.add_argument("--depth", type=int, default=12, help="deep：嵌套层数")
+    parser.add_argument("--fanout", type=int, default=2, help="deep：每层子目录数")
+    parser.add_argument("--leaf-files", type=int, default=3, help="deep：叶子目录中的文件数")
+    
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的固定延迟")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0, help="单连接带宽上限（MB/s）")
+    parser.add_argument("--total-bandwidth-mbps", type=float, default=0, help="单个服务的总带宽上限（MB/s）")
+    parser.add_argument("--rate-429", type=float, default=0, help="返回 429 的请求比例")
+    parser.add_argument("--retry-after", type=float, default=None, help="429 响应的 Retry-After 秒数")
+    parser.add_argument("--seed", type=int, default=0, help="429 注入的随机数种子")
+    
+    parser.add_argument("--api-rate", type=float, default=1000,
+                        help="各类接口的初始限速（次/秒），0 表示使用默认限速")
+    
+    parser.add_argument("--keep", action="store_true", help="保留临时目录与统计报告")
+    parser.add_argument("--verbose", action="store_true", help="输出同步日志")
+    args = parser.parse_args()
+    
+    names = list(SCENARIOS) if not args.scenarios or "all" in args.scenarios else args.scenarios
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    
+    # 只输出到控制台，不在工作目录生成 sync.log
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR,
+                        format='%(asctime)s - %(levelname)s - %(message)s',
+                        stream=sys.stdout)
+    
+    results = [run_scenario(name, args) for name in names]
+    
+    print(f"{'scenario':<10}{'files':>8}{'synced':>8}{'MB':>10}{'seconds':>9}{'files/s':>10}{'MB/s':>9}"
+          f"{'requests':>10}")
+    for r in results:
+        print(f"{r['scenario']:<10}{r['files']:>8}{r['synced']:>8}{r['mb']:>10.1f}{r['seconds']:>9.2f}"
+              f"{r['files_per_s']:>10.1f}{r['mb_per_s']:>9.1f}{r['requests']:>10}")
+    
+    if any(r["synced"] != r["files"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,20 +8,30 @@
 import os
 import sys
 
+from sync_progress import PROGRESS_SNAPSHOT, PROGRESS_JOURNAL, ProgressJournal
+
 def clear_progress(temp_dir: str = "/tmp/pan_sync"):
-    """清除进度文件"""
-    progress_file = os.path.join(temp_dir, ".sync_progress.pkl")
+    """清除进度文件（快照 + 追加日志）"""
+    progress_files = [
+        os.path.join(temp_dir, PROGRESS_SNAPSHOT),
+        os.path.join(temp_dir, PROGRESS_JOURNAL),
+    ]
+    existing = [path for path in progress_files if os.path.exists(path)]
     
-    if os.path.exists(progress_file):
+    if existing:
+        # 统计记录数，方便确认清除的是哪份进度
+        record_count = len(ProgressJournal(temp_dir).load())
         try:
-            os.remove(progress_file)
-            print(f"✅ 已清除进度文件: {progress_file}")
+            for path in existing:
+                os.remove(path)
+                print(f"✅ 已清除进度文件: {path}")
+            print(f"共清除 {record_count} 条已完成记录")
             print("下次运行将重新开始完整同步")
         except Exception as e:
             print(f"❌ 清除失败: {str(e)}")
             sys.exit(1)
     else:
-        print(f"ℹ️  进度文件不存在: {progress_file}")
+        print(f"ℹ️  进度文件不存在: {progress_files[0]}")
         print("无需清除")
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发目录扫描
+多个扫描线程并行遍历百度网盘目录树，文件经有界队列交给同步线程池
+"""
+
+import queue
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 扫描结束标记
+_DONE = object()
+
+
+class DirectoryCrawler:
+    """并发目录扫描器：目录待扫描队列 + 有界文件输出队列"""
+    
+    def __init__(self, iter_files: Callable[[str], Iterator[Dict]], workers: int = 4, queue_size: int = 1000,
+                 dir_filter: Optional[Callable[[Dict], Iterable[str]]] = None):
+        """
+        :param iter_files: 分页列出单个目录的函数（如 BaiduPanClient.iter_files）
+        :param workers: 并行扫描的线程数
+        :param queue_size: 文件输出队列长度，队列满时扫描线程阻塞（背压）
+        :param dir_filter: 发现子目录时调用，返回要扫描的目录路径，代替该子目录本身
+            （一般为 [子目录]；增量同步时未变化的目录不再列出，改为扫描其已知的下级目录）
+        """
+        self.iter_files = iter_files
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.dir_filter = dir_filter
+        # 扫描失败的目录（本次结果不完整）
+        self.failed_dirs: List[str] = []
+        self._files: Optional["queue.Queue"] = None
+        self._pending = [0]
+    
+    def queue_depths(self) -> Dict[str, int]:
+        """扫描队列深度：已扫描待提交的文件数、未扫描完的目录数"""
+        return {
+            "scan_queue": self._files.qsize() if self._files is not None else 0,
+            "scan_pending_dirs": self._pending[0],
+        }
+    
+    def crawl(self, root: str) -> Iterator[Dict]:
+        """扫描 root 下的全部文件，边扫描边产出"""
+        files: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        dirs = deque([root])
+        pending = [1]  # 已入队但还没扫描完的目录数
+        cond = threading.Condition()
+        stop = threading.Event()
+        self.failed_dirs = []
+        self._files = files
+        self._pending = pending
+        
+        def put(item) -> bool:
+            # 带超时地放入，消费者提前退出时扫描线程也能结束
+            while not stop.is_set():
+                try:
+                    files.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def worker():
+            while True:
+                with cond:
+                    while not dirs and pending[0] and not stop.is_set():
+                        cond.wait()
+                    if stop.is_set() or not pending[0]:
+                        return
+                    dir_path = dirs.popleft()
+                
+                logger.info(f"📁 扫描目录: {dir_path}")
+                file_count = folder_count = 0
+                try:
+                    for item in self.iter_files(dir_path):
+                        if item.get("isdir") == 1:
+                            folder_count += 1
+                            targets = self.dir_filter(item) if self.dir_filter else [item.get("path")]
+                            with cond:
+                                for path in targets:
+                                    dirs.append(path)
+                                    pending[0] += 1
+                                    cond.notify()
+                        else:
+                            file_count += 1
+                            if not put(item):
+                                return
+                except Exception as e:
+                    logger.error(f"扫描目录失败 {dir_path}: {str(e)}")
+                    with cond:
+                        self.failed_dirs.append(dir_path)
+                
+                if file_count or folder_count:
+                    logger.info(f"  发现: {file_count} 个文件, {folder_count} 个子文件夹 ({dir_path})")
+                else:
+                    logger.debug(f"目录为空: {dir_path}")
+                
+                with cond:
+                    pending[0] -= 1
+                    finished = not pending[0]
+                    if finished:
+                        cond.notify_all()
+                if finished:
+                    # 全部目录扫描完毕
+                    put(_DONE)
+                    return
+        
+        threads = [threading.Thread(target=worker, name=f"crawler-{i}", daemon=True)
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        
+        try:
+            while True:
+                item = files.get()
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            # 消费者结束（含提前退出），通知扫描线程停止
+            stop.set()
+            with cond:
+                cond.notify_all()
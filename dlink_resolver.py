@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+百度网盘下载链接（dlink）批量解析与缓存
+扫描到的文件先登记 fs_id，真正需要下载链接时一次 filemetas 请求解析一批，
+解析结果按有效期缓存，链接过期（403）时单独刷新
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# filemetas 接口单次最多查询的 fs_id 数
+DLINK_BATCH_SIZE = 100
+# dlink 有效期约 8 小时，提前 10 分钟视为过期
+DLINK_TTL = 8 * 3600 - 600
+
+
+class DlinkResolver:
+    """批量解析 dlink，线程安全；同一 fs_id 同时只会被一个请求解析"""
+    
+    def __init__(self, fetch: Callable[[List[int]], Dict[int, str]], batch_size: int = DLINK_BATCH_SIZE,
+                 ttl: float = DLINK_TTL):
+        """
+        :param fetch: 批量获取下载链接的函数，返回 {fs_id: dlink}（如 BaiduPanClient.get_download_links）
+        :param batch_size: 每次请求最多解析的 fs_id 数
+        :param ttl: 下载链接缓存有效期（秒）
+        """
+        self.fetch = fetch
+        self.batch_size = max(1, min(batch_size, DLINK_BATCH_SIZE))
+        self.ttl = ttl
+        
+        self._cache: Dict[int, Tuple[str, float]] = {}  # fs_id -> (dlink, 过期时间)
+        self._pending: "OrderedDict[int, None]" = OrderedDict()  # 即将需要下载链接的 fs_id（按扫描顺序）
+        self._inflight: Dict[int, threading.Event] = {}  # 正在解析的 fs_id
+        self._lock = threading.Lock()
+    
+    def prefetch(self, fs_id: int):
+        """登记即将下载的文件，下次解析时顺带一起解析"""
+        with self._lock:
+            if fs_id not in self._inflight and not self._valid(fs_id):
+                self._pending[fs_id] = None
+    
+    def discard(self, fs_id: int):
+        """文件不再需要下载（已跳过或已完成）"""
+        with self._lock:
+            self._pending.pop(fs_id, None)
+            self._cache.pop(fs_id, None)
+    
+    def invalidate(self, fs_id: int, dlink: Optional[str] = None):
+        """下载链接已失效（403）：移除缓存，下次 get 时重新获取；指定 dlink 时只在缓存仍是该链接时移除"""
+        with self._lock:
+            cached = self._cache.get(fs_id)
+            if cached and (dlink is None or cached[0] == dlink):
+                del self._cache[fs_id]
+    
+    def _valid(self, fs_id: int) -> Optional[str]:
+        cached = self._cache.get(fs_id)
+        if cached and cached[1] > time.time():
+            return cached[0]
+        return None
+    
+    def get(self, fs_id: int) -> Optional[str]:
+        """获取下载链接：命中缓存直接返回，否则连同待解析的 fs_id 一起批量请求"""
+        with self._lock:
+            dlink = self._valid(fs_id)
+            if dlink:
+                return dlink
+            
+            event = self._inflight.get(fs_id)
+            leader = event is None
+            if leader:
+                # 本次请求顺带解析排队中的其他文件
+                self._pending.pop(fs_id, None)
+                batch = [fs_id]
+                while self._pending and len(batch) < self.batch_size:
+                    other, _ = self._pending.popitem(last=False)
+                    if other not in self._inflight and not self._valid(other):
+                        batch.append(other)
+                event = threading.Event()
+                for item in batch:
+                    self._inflight[item] = event
+        
+        if not leader:
+            # 其他线程正在解析该文件，等待其结果
+            event.wait()
+            with self._lock:
+                return self._valid(fs_id)
+        
+        links: Dict[int, str] = {}
+        try:
+            links = self.fetch(batch) or {}
+            logger.debug(f"批量获取下载链接: {len(links)}/{len(batch)}")
+        except Exception as e:
+            logger.error(f"批量获取下载链接失败: {str(e)}")
+        finally:
+            with self._lock:
+                expires = time.time() + self.ttl
+                for item, dlink in links.items():
+                    self._cache[item] = (dlink, expires)
+                for item in batch:
+                    self._inflight.pop(item, None)
+                self._purge_locked()
+            event.set()
+        
+        return links.get(fs_id)
+    
+    def _purge_locked(self):
+        """清理过期的缓存"""
+        now = time.time()
+        expired = [fs_id for fs_id, (_, expires) in self._cache.items() if expires <= now]
+        for fs_id in expired:
+            del self._cache[fs_id]
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prometheus 格式的指标接口（可选）
+在后台线程中启动一个本地 HTTP 服务，GET /metrics 返回同步统计：
+传输字节数、各结果的文件数、在途文件数与各队列深度、接口错误与限流次数、临时空间占用等
+"""
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from sync_stats import SyncStats
+from rate_limiter import RateLimiterRegistry
+
+logger = logging.getLogger(__name__)
+
+# 指标名前缀
+PREFIX = "pan_sync"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class _Writer:
+    """按 Prometheus 文本格式拼接指标，同名指标只输出一次 HELP/TYPE"""
+    
+    def __init__(self):
+        self.lines: List[str] = []
+        self._declared = set()
+    
+    def add(self, name: str, kind: str, help_text: str, value, **labels):
+        name = f"{PREFIX}_{name}"
+        if name not in self._declared:
+            self._declared.add(name)
+            self.lines.append(f"# HELP {name} {help_text}")
+            self.lines.append(f"# TYPE {name} {kind}")
+        self.lines.append(f"{name}{_labels(**labels)} {value}")
+    
+    def histogram(self, name: str, help_text: str, metric: Dict, **labels):
+        """metric 为 SyncStats.snapshot() 中的单项统计（直方图按桶分别计数）"""
+        full_name = f"{PREFIX}_{name}"
+        if full_name not in self._declared:
+            self._declared.add(full_name)
+            self.lines.append(f"# HELP {full_name} {help_text}")
+            self.lines.append(f"# TYPE {full_name} histogram")
+        cumulative = 0
+        for key, count in metric.get("histogram", {}).items():
+            cumulative += count
+            bound = key[len("le_"):]
+            le = "+Inf" if bound == "inf" else bound
+            self.lines.append(f"{full_name}_bucket{_labels(le=le, **labels)} {cumulative}")
+        self.lines.append(f"{full_name}_sum{_labels(**labels)} {metric.get('seconds', 0)}")
+        self.lines.append(f"{full_name}_count{_labels(**labels)} {metric.get('count', 0)}")
+    
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render_metrics(stats: SyncStats, rate_limiters: Optional[RateLimiterRegistry] = None) -> str:
+    """把当前统计渲染为 Prometheus 文本格式"""
+    snapshot = stats.snapshot()
+    out = _Writer()
+    
+    out.add("uptime_seconds", "gauge", "Seconds since the syncer started", snapshot["elapsed_seconds"])
+    files = snapshot["files"]
+    for outcome in ("success", "failed", "skipped"):
+        out.add("files_total", "counter", "Files processed by outcome", files[outcome], outcome=outcome)
+    out.add("synced_bytes_total", "counter", "Bytes of successfully synced files", files["bytes"])
+    
+    for stage, metric in snapshot["stages"].items():
+        out.histogram("stage_duration_seconds", "Duration of sync stages", metric, stage=stage)
+    for stage, metric in snapshot["stages"].items():
+        out.add("stage_errors_total", "counter", "Failed sync stages", metric["errors"], stage=stage)
+    for stage, metric in snapshot["stages"].items():
+        out.add("stage_bytes_total", "counter", "Bytes moved by sync stages", metric.get("bytes", 0), stage=stage)
+    
+    for category, metric in snapshot["apis"].items():
+        out.histogram("api_duration_seconds", "Latency of API calls until response headers", metric,
+                      category=category)
+    for category, metric in snapshot["apis"].items():
+        for status, count in metric.get("status", {}).items():
+            out.add("api_requests_total", "counter", "API calls by category and HTTP status", count,
+                    category=category, status=status)
+    for category, metric in snapshot["apis"].items():
+        out.add("api_errors_total", "counter", "API calls that failed or returned HTTP >= 400",
+                metric["errors"], category=category)
+    for category, metric in snapshot["apis"].items():
+        if metric.get("bytes"):
+            out.add("api_sent_bytes_total", "counter", "Request body bytes sent (part uploads)",
+                    metric["bytes"], category=category)
+    
+    if rate_limiters is not None:
+        for category, limiter in rate_limiters.snapshot().items():
+            out.add("rate_limit_per_second", "gauge", "Current adaptive request rate", limiter["rate"],
+                    category=category)
+        for category, limiter in rate_limiters.snapshot().items():
+            out.add("throttled_total", "counter", "Throttle signals received (HTTP 429 / errno 31034)",
+                    limiter["throttled"], category=category)
+    
+    # 运行中的同步任务登记的实时指标（队列深度、在途文件数、临时空间等）
+    # 同名指标的各条记录必须连续输出
+    gauges = snapshot["gauges"]
+    names = sorted({name for values in gauges.values() for name in values})
+    for name in names:
+        for task, values in gauges.items():
+            if values.get(name) is not None:
+                out.add(name, "gauge", f"Live value of {name}", values[name], task=task)
+    
+    return out.text()
+
+
+class MetricsServer:
+    """在后台线程中提供 /metrics 的本地 HTTP 服务"""
+    
+    def __init__(self, stats: SyncStats, rate_limiters: Optional[RateLimiterRegistry] = None,
+                 host: str = "127.0.0.1", port: int = 9108):
+        """
+        :param stats: 同步统计
+        :param rate_limiters: 限速器（导出当前速率与限流次数）
+        :param host: 监听地址（默认只监听本机）
+        :param port: 监听端口
+        """
+        self.stats = stats
+        self.rate_limiters = rate_limiters
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> "MetricsServer":
+        server_self = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                try:
+                    body = render_metrics(server_self.stats, server_self.rate_limiters).encode("utf-8")
+                except Exception as e:
+                    logger.error(f"生成指标失败: {str(e)}")
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                logger.debug(f"metrics: {format % args}")
+        
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        logger.info(f"指标接口已启动: http://{self.host}:{self.port}/metrics")
+        return self
+    
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段传输流水线
+下载与上传是两个独立的线程池，中间用有界队列交接：
+百度下载线程始终在下载，下载完成的文件交给上传线程并发上传
+"""
+
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 线程退出标记
+_STOP = object()
+
+
+class StagedFile:
+    """已下载到临时目录、等待上传的文件（下载阶段交给上传阶段）"""
+    
+    def __init__(self, file_info: Dict, aliyun_dir: str, temp_file: str, content_hash: Optional[str],
+                 check_name_mode: str):
+        self.file_info = file_info
+        self.aliyun_dir = aliyun_dir
+        self.temp_file = temp_file
+        self.content_hash = content_hash
+        self.check_name_mode = check_name_mode
+
+
+class TransferPipeline:
+    """下载 -> 交接队列 -> 上传 两阶段流水线，submit 返回 concurrent.futures.Future"""
+    
+    def __init__(self, download: Callable[..., Any], upload: Callable[[Any], bool],
+                 download_workers: int = 3, upload_workers: int = 3, handoff_size: int = 6):
+        """
+        :param download: 下载阶段函数；返回 bool 表示该文件已有结论（已存在、失败等），返回其他对象则交给上传阶段
+        :param upload: 上传阶段函数，参数为下载阶段的返回值
+        :param download_workers: 下载线程数
+        :param upload_workers: 上传线程数
+        :param handoff_size: 交接队列长度，队列满时下载线程等待（限制已下载未上传的临时文件数）
+        """
+        self.download = download
+        self.upload = upload
+        self.download_workers = max(1, download_workers)
+        self.upload_workers = max(1, upload_workers)
+        self.handoff_size = max(1, handoff_size)
+        # 同时在途的文件数上限参考值（下载中 + 排队交接 + 上传中）
+        self.capacity = self.download_workers + self.handoff_size + self.upload_workers
+        
+        self._inbox: "queue.Queue" = queue.Queue()
+        self._handoff: "queue.Queue" = queue.Queue(maxsize=self.handoff_size)
+        self._threads: List[threading.Thread] = []
+        self._upload_threads: List[threading.Thread] = []
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def start(self):
+        for i in range(self.download_workers):
+            thread = threading.Thread(target=self._download_loop, name=f"download-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        for i in range(self.upload_workers):
+            thread = threading.Thread(target=self._upload_loop, name=f"upload-{i}", daemon=True)
+            thread.start()
+            self._upload_threads.append(thread)
+    
+    def close(self):
+        """等待已提交的文件全部完成后停止各阶段线程"""
+        for _ in self._threads:
+            self._inbox.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        for _ in self._upload_threads:
+            self._handoff.put(_STOP)
+        for thread in self._upload_threads:
+            thread.join()
+    
+    def queue_depths(self) -> Dict[str, int]:
+        """等待下载的文件数、已下载等待上传的文件数"""
+        return {"download_queue": self._inbox.qsize(), "handoff_queue": self._handoff.qsize()}
+    
+    def submit(self, *args, **kwargs) -> Future:
+        """提交一个文件，参数原样传给下载阶段函数"""
+        future: Future = Future()
+        self._inbox.put((future, args, kwargs))
+        return future
+    
+    def _download_loop(self):
+        while True:
+            item = self._inbox.get()
+            if item is _STOP:
+                return
+            future, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            
+            try:
+                staged = self.download(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+                continue
+            
+            if isinstance(staged, bool):
+                future.set_result(staged)
+            else:
+                # 交接队列满时在此等待，上传跟不上时下载自然放慢
+                self._handoff.put((future, staged))
+    
+    def _upload_loop(self):
+        while True:
+            item = self._handoff.get()
+            if item is _STOP:
+                return
+            future, staged = item
+            try:
+                future.set_result(self.upload(staged))
+            except BaseException as e:
+                future.set_exception(e)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按接口类别的自适应限速（令牌桶 + AIMD）
+每类接口一个令牌桶：请求成功时缓慢提高速率（加性增），
+遇到限流信号（HTTP 429、百度 errno 31034）时速率减半（乘性减），并按 Retry-After 暂停
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 被限流后同一请求最多重试的次数
+MAX_THROTTLE_RETRIES = 5
+
+# 各类接口的初始速率（请求/秒）
+DEFAULT_RATES = {
+    "baidu_list": 8.0,       # 百度列目录
+    "baidu_meta": 5.0,       # 百度 filemetas（获取下载链接）
+    "baidu_download": 10.0,  # 百度下载（每个 Range 连接算一次请求）
+    "aliyun_meta": 10.0,     # 阿里云元数据接口（查询/创建文件夹、创建文件、完成上传等）
+    "aliyun_upload": 20.0,   # 阿里云分片上传
+}
+
+
+class AdaptiveRateLimiter:
+    """自适应令牌桶，线程安全"""
+    
+    def __init__(self, name: str, rate: float, min_rate: float = 0.2, max_rate: Optional[float] = None,
+                 burst: Optional[float] = None, increase: float = 0.05, decrease: float = 0.5):
+        """
+        :param name: 接口类别名（用于日志）
+        :param rate: 初始速率（请求/秒）
+        :param min_rate: 速率下限
+        :param max_rate: 速率上限（默认初始速率的 4 倍）
+        :param burst: 桶容量，空闲后允许的突发请求数（默认与初始速率相同）
+        :param increase: 每次成功后速率增加量（请求/秒）
+        :param decrease: 限流后速率乘以的系数
+        """
+        self.name = name
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or self.rate * 4
+        self.burst = max(1.0, burst or self.rate)
+        self.increase = increase
+        self.decrease = decrease
+        
+        self.throttled = 0  # 累计收到的限流信号次数
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._pause_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+    
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def reserve(self) -> float:
+        """预留一个令牌（可以欠账），返回需要等待的秒数（供 asyncio 等非阻塞调用方使用）"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(self._pause_until - now, 0.0)
+            if self._tokens < 0:
+                wait += -self._tokens / self.rate
+            return wait
+    
+    def acquire(self):
+        """取一个令牌，没有可用令牌时阻塞到轮到自己"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+    
+    def on_success(self):
+        """请求成功：加性增"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+    
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """
+        收到限流信号：乘性减（同一时刻并发返回的多个限流只减一次），并清空令牌
+        :param retry_after: 服务端要求的等待秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if now - self._last_decrease >= 1.0:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+                logger.warning(f"⚠️  {self.name} 触发限流，速率降至 {self.rate:.2f} 次/秒")
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._pause_until = max(self._pause_until, now + retry_after)
+
+
+class RateLimiterRegistry:
+    """按接口类别管理限速器（百度与阿里云客户端可共用一个）"""
+    
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        """
+        :param rates: 各类接口的初始速率，覆盖 DEFAULT_RATES 中的同名项
+        """
+        self.rates = dict(DEFAULT_RATES)
+        self.rates.update(rates or {})
+        self._limiters: Dict[str, AdaptiveRateLimiter] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, category: str) -> AdaptiveRateLimiter:
+        with self._lock:
+            limiter = self._limiters.get(category)
+            if limiter is None:
+                limiter = AdaptiveRateLimiter(category, self.rates.get(category, 10.0))
+                self._limiters[category] = limiter
+            return limiter
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        """当前各类接口的速率与限流次数"""
+        with self._lock:
+            return {name: {"rate": round(limiter.rate, 2), "throttled": limiter.throttled}
+                    for name, limiter in self._limiters.items()}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（只支持秒数形式）"""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+def call_with_limiter(limiter: AdaptiveRateLimiter, send: Callable[[], Any],
+                      is_throttled: Callable[[Any], bool], max_retries: int = MAX_THROTTLE_RETRIES) -> Any:
+    """
+    按限速器的节奏发送请求；被限流时降速并重试，重试用尽后返回最后一次的响应
+    :param send: 发送一次请求，返回 requests.Response
+    :param is_throttled: 判断响应是否为限流
+    """
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        response = send()
+        if not is_throttled(response):
+            limiter.on_success()
+            return response
+        
+        limiter.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+        if attempt < max_retries:
+            logger.debug(f"{limiter.name} 请求被限流，重试 ({attempt + 1}/{max_retries})")
+            response.close()
+    return response
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分段并发下载与断点续传
+把大文件切成若干字节范围，多个连接同时下载，按偏移写入预分配的文件；
+下载中的 .downloading 文件配有 .meta 记录（大小/md5/已完成分段），中断后可续传
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# open_range(start, end) 返回 [start, end] 闭区间内数据的迭代器
+RangeOpener = Callable[[int, int], Iterator[bytes]]
+
+# 百度列表接口对部分文件返回混淆过的 md5（含 g 以后的字母），不是文件内容的 md5
+MD5_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+class DownloadState:
+    """.downloading 文件的续传记录，保存在同名 .meta 文件中"""
+    
+    def __init__(self, temp_path: str, file_size: int, file_md5: Optional[str], segment_size: Optional[int]):
+        self.meta_path = f"{temp_path}.meta"
+        self.file_size = file_size
+        self.file_md5 = (file_md5 or "").lower()
+        self.segment_size = segment_size
+        self.segments_done: Set[int] = set()
+        self._lock = threading.Lock()
+    
+    def load(self) -> bool:
+        """读取上次的记录；与当前文件（大小、md5、分段方式）一致时返回 True"""
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except Exception:
+            return False
+        
+        if (meta.get("size") != self.file_size or meta.get("md5", "") != self.file_md5
+                or meta.get("segment_size") != self.segment_size):
+            return False
+        self.segments_done = set(meta.get("segments_done", []))
+        return True
+    
+    def save(self):
+        with open(self.meta_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "size": self.file_size,
+                "md5": self.file_md5,
+                "segment_size": self.segment_size,
+                "segments_done": sorted(self.segments_done)
+            }, f)
+    
+    def mark_segment_done(self, start: int):
+        with self._lock:
+            self.segments_done.add(start)
+            try:
+                self.save()
+            except Exception as e:
+                logger.debug(f"保存分段进度失败: {str(e)}")
+    
+    def remove(self):
+        try:
+            os.remove(self.meta_path)
+        except OSError:
+            pass
+
+
+def content_md5(value: Optional[str]) -> Optional[str]:
+    """百度返回的 md5 是有效的内容 md5 时返回其小写形式；为空或被混淆时返回 None（只能按大小校验）"""
+    value = (value or "").lower()
+    return value if MD5_PATTERN.fullmatch(value) else None
+
+
+def calc_file_md5(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """流式计算文件 md5（小写）"""
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class DownloadJob:
+    """
+    一次下载的续传准备与收尾：目标文件是否已完整、能否从 .downloading 续传、下载后的大小与 md5 校验
+    线程下载（SegmentedDownloader.download_file）与 asyncio 引擎共用，中间的数据读写由调用方负责
+    """
+    
+    def __init__(self, save_path: str, file_size: Optional[int], file_md5: Optional[str],
+                 segment_size: Optional[int] = None):
+        """
+        :param segment_size: 分段下载时每段的字节数，单连接下载为 None
+        """
+        self.save_path = save_path
+        self.temp_path = f"{save_path}.downloading"  # 下载中的临时文件
+        self.file_size = file_size
+        self.file_md5 = file_md5
+        self.state = DownloadState(self.temp_path, file_size, file_md5, segment_size)
+        self.resumed = False
+        self.resume_size = 0
+    
+    def begin(self, resume: bool = True) -> bool:
+        """
+        准备下载：检查目标文件与可续传的 .downloading 文件
+        :return: 目标文件已经完整、无需下载时返回 False
+        """
+        os.makedirs(os.path.dirname(self.save_path) or ".", exist_ok=True)
+        
+        # 检查是否已经下载完成（大小一致才认为完整）
+        if os.path.exists(self.save_path) and (self.file_size is None
+                                               or os.path.getsize(self.save_path) == self.file_size):
+            logger.info(f"文件已存在，跳过下载: {self.save_path}")
+            return False
+        
+        # 检查是否有可续传的下载
+        self.resumed = False
+        self.resume_size = 0
+        if os.path.exists(self.temp_path):
+            if resume and self.file_size is not None and self.state.load():
+                self.resumed = True
+                self.resume_size = 0 if self.state.segment_size else os.path.getsize(self.temp_path)
+                logger.info(f"发现未完成的下载，继续下载: {self.save_path}")
+            else:
+                os.remove(self.temp_path)
+        
+        if not self.resumed and self.file_size is not None:
+            self.state.save()
+        return True
+    
+    def finish(self, total_size: int) -> Optional[bool]:
+        """
+        校验下载结果，通过后把 .downloading 重命名为正式文件
+        :return: True 成功；False 失败（大小不足时保留 .downloading 供下次续传）；
+                 None 表示续传的文件 md5 校验失败，已丢弃，需要 begin(resume=False) 后重新下载
+        """
+        # 校验大小
+        if self.file_size is not None and total_size != self.file_size:
+            logger.error(f"下载的文件大小不一致: {total_size} != {self.file_size}")
+            if total_size > self.file_size:
+                os.remove(self.temp_path)
+                self.state.remove()
+            return False
+        
+        # 续传得到的文件再校验 md5，不一致则丢弃重新下载（md5 无效或被混淆时只校验大小）
+        expected_md5 = content_md5(self.file_md5)
+        if self.resumed and expected_md5 and calc_file_md5(self.temp_path) != expected_md5:
+            logger.warning(f"续传的文件 md5 校验失败，重新下载: {self.save_path}")
+            os.remove(self.temp_path)
+            self.state.remove()
+            return None
+        
+        # 下载完成，重命名为正式文件
+        os.rename(self.temp_path, self.save_path)
+        self.state.remove()
+        logger.info(f"文件下载完成: {self.save_path} ({total_size / 1024 / 1024:.2f}MB)")
+        return True
+
+
+class SegmentedDownloader:
+    """多连接分段下载器（支持断点续传）"""
+    
+    def __init__(self, segment_count: int = 4, segment_size: int = 32 * 1024 * 1024, max_retries: int = 3):
+        """
+        :param segment_count: 单个文件同时使用的连接数
+        :param segment_size: 每段的字节数（段数可以多于连接数，排队下载）
+        :param max_retries: 单段失败后的重试次数（从断开处继续）
+        """
+        self.segment_count = max(1, segment_count)
+        self.segment_size = max(1024 * 1024, segment_size)
+        self.max_retries = max_retries
+    
+    def should_segment(self, file_size: int) -> bool:
+        """文件大于两段时才值得分段"""
+        return self.segment_count > 1 and file_size > self.segment_size * 2
+    
+    def split(self, file_size: int) -> List[Tuple[int, int]]:
+        """切分字节范围（闭区间）"""
+        return [(start, min(start + self.segment_size, file_size) - 1)
+                for start in range(0, file_size, self.segment_size)]
+    
+    def _download_segment(self, fd: int, open_range: RangeOpener, start: int, end: int):
+        """下载一段并写入对应偏移；失败时从已写入位置继续"""
+        pos = start
+        for attempt in range(self.max_retries + 1):
+            try:
+                for chunk in open_range(pos, end):
+                    if not chunk:
+                        continue
+                    # 防止服务器多返回数据写到下一段
+                    chunk = chunk[:end + 1 - pos]
+                    os.pwrite(fd, chunk, pos)
+                    pos += len(chunk)
+                    if pos > end:
+                        break
+                if pos > end:
+                    return
+                raise IOError(f"分段数据不完整: {pos - start}/{end + 1 - start} 字节")
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"分段 {start}-{end} 下载失败，重试 ({attempt + 1}/{self.max_retries}): {str(e)}")
+                time.sleep(attempt + 1)
+    
+    def download(self, open_range: RangeOpener, file_size: int, save_path: str,
+                 state: Optional[DownloadState] = None) -> bool:
+        """
+        分段下载到 save_path（文件会预分配为 file_size 大小）
+        :param state: 续传记录，已完成的分段会跳过，新完成的分段会记入
+        :return: 全部分段成功返回 True
+        """
+        done = state.segments_done if state else set()
+        segments = [(start, end) for start, end in self.split(file_size) if start not in done]
+        if done:
+            logger.info(f"续传分段下载: 已完成 {len(done)} 段，剩余 {len(segments)} 段")
+        
+        def run_segment(fd: int, start: int, end: int):
+            self._download_segment(fd, open_range, start, end)
+            if state:
+                state.mark_segment_done(start)
+        
+        fd = os.open(save_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, file_size)
+            if not segments:
+                return True
+            
+            workers = min(self.segment_count, len(segments))
+            logger.debug(f"分段下载: {len(segments)} 段, {workers} 个连接")
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(run_segment, fd, start, end) for start, end in segments]
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                except Exception:
+                    # 有分段彻底失败，取消还没开始的分段
+                    for future in futures:
+                        future.cancel()
+                    raise
+            return True
+        except Exception as e:
+            logger.error(f"分段下载失败 {save_path}: {str(e)}")
+            return False
+        finally:
+            os.close(fd)
+    
+    def _download_stream(self, open_range: RangeOpener, temp_path: str, resume_size: int,
+                         on_chunk: Optional[Callable[[bytes], None]]) -> int:
+        """单连接下载（从 resume_size 处追加），返回文件总字节数"""
+        # 续传时先把已下载部分喂给回调，保证边下载边计算的哈希仍然完整
+        if on_chunk and resume_size:
+            with open(temp_path, 'rb') as f:
+                while True:
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    on_chunk(chunk)
+        
+        total_size = resume_size
+        last_log_size = resume_size
+        with open(temp_path, 'ab' if resume_size else 'wb') as f:
+            for chunk in open_range(resume_size, None):
+                if not chunk:
+                    continue
+                f.write(chunk)
+                if on_chunk:
+                    on_chunk(chunk)
+                total_size += len(chunk)
+                
+                # 每 10MB 打印一次进度
+                if total_size - last_log_size >= 10 * 1024 * 1024:
+                    logger.info(f"  📥 下载进度: {total_size / 1024 / 1024:.2f}MB")
+                    last_log_size = total_size
+        return total_size
+    
+    def download_file(self, open_range: RangeOpener, save_path: str, file_size: Optional[int] = None,
+                      file_md5: Optional[str] = None, on_chunk: Optional[Callable[[bytes], None]] = None,
+                      resume: bool = True) -> bool:
+        """
+        下载文件到 save_path：先写入 save_path.downloading，完成后重命名
+        - 大文件按分段多连接下载，否则单连接下载
+        - 存在与当前文件（大小、md5）一致的 .downloading 时从断开处续传，续传的文件会校验大小和 md5
+          （百度返回的 md5 被混淆时只校验大小）
+        :param open_range: open_range(start, end) 返回数据块迭代器，end 为 None 表示读到末尾
+        :param file_size: 百度网盘返回的文件大小（用于分段与校验）
+        :param file_md5: 百度网盘返回的 md5（用于校验续传的文件）
+        :param on_chunk: 单连接下载时每个数据块的回调（分段下载时不调用）
+        """
+        segmented = file_size is not None and self.should_segment(file_size)
+        job = DownloadJob(save_path, file_size, file_md5, self.segment_size if segmented else None)
+        try:
+            if not job.begin(resume):
+                return True
+            if segmented:
+                if not self.download(open_range, file_size, job.temp_path, job.state):
+                    return False
+                total_size = os.path.getsize(job.temp_path)
+            elif file_size is not None and job.resume_size >= file_size:
+                total_size = job.resume_size
+            else:
+                total_size = self._download_stream(open_range, job.temp_path, job.resume_size, on_chunk)
+        except Exception as e:
+            logger.error(f"文件下载失败 {save_path}: {str(e)}")
+            # 保留 .downloading 文件，下次可以续传
+            return False
+        
+        finished = job.finish(total_size)
+        if finished is None:
+            return self.download_file(open_range, save_path, file_size, file_md5, on_chunk, resume=False)
+        return finished
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载流到上传流的管道（不落盘）
+百度下载线程写入环形缓冲区，阿里云上传按分片读取
+"""
+
+import logging
+import threading
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PipeAborted(Exception):
+    """管道被另一端中止"""
+
+
+class RingBuffer:
+    """有界内存环形缓冲区（单生产者、单消费者）"""
+    
+    def __init__(self, capacity: int = 32 * 1024 * 1024):
+        """
+        :param capacity: 缓冲区字节数，写满后生产者阻塞
+        """
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._head = 0  # 下一个读取位置
+        self._size = 0  # 当前已缓冲字节数
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+        self.bytes_written = 0
+        self.bytes_read = 0
+    
+    def write(self, data: bytes):
+        """写入数据，缓冲区满时阻塞"""
+        view = memoryview(data)
+        while view:
+            with self._cond:
+                while self._size == self.capacity and not self._error:
+                    self._cond.wait()
+                if self._error:
+                    raise PipeAborted(str(self._error))
+                if self._closed:
+                    raise PipeAborted("管道已关闭")
+                
+                tail = (self._head + self._size) % self.capacity
+                n = min(len(view), self.capacity - self._size, self.capacity - tail)
+                self._buf[tail:tail + n] = view[:n]
+                self._size += n
+                self.bytes_written += n
+                view = view[n:]
+                self._cond.notify_all()
+    
+    def read(self, size: int) -> bytes:
+        """读取 size 字节，数据不足时阻塞；遇到 EOF 返回剩余数据"""
+        out = bytearray()
+        while len(out) < size:
+            with self._cond:
+                while self._size == 0 and not self._closed and not self._error:
+                    self._cond.wait()
+                if self._error:
+                    raise PipeAborted(str(self._error))
+                if self._size == 0:  # 已关闭且读完
+                    break
+                
+                n = min(size - len(out), self._size, self.capacity - self._head)
+                out += self._buf[self._head:self._head + n]
+                self._head = (self._head + n) % self.capacity
+                self._size -= n
+                self.bytes_read += n
+                self._cond.notify_all()
+        return bytes(out)
+    
+    def close(self):
+        """生产者写完，标记 EOF"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+    
+    def abort(self, error: BaseException):
+        """中止管道，两端的阻塞调用都会抛出 PipeAborted"""
+        with self._cond:
+            if self._error is None:
+                self._error = error
+            self._cond.notify_all()
+
+
+def start_producer(chunks: Iterable[bytes], ring: RingBuffer, name: str = "pipe-producer") -> threading.Thread:
+    """启动后台线程，把下载流写入缓冲区"""
+    def run():
+        try:
+            for chunk in chunks:
+                if chunk:
+                    ring.write(chunk)
+            ring.close()
+        except PipeAborted:
+            # 上传端已放弃，停止下载即可
+            pass
+        except Exception as e:
+            logger.error(f"管道下载失败: {str(e)}")
+            ring.abort(e)
+    
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量同步清单
+记录上次同步时百度网盘的目录与文件元数据（path, fs_id, size, md5, server_mtime），
+增量模式下不再列出修改时间未变化的目录（其直接子文件沿用清单记录，子目录仍逐个检查），
+只同步新增或修改过的文件，并报告已删除的文件
+"""
+
+import os
+import pickle
+import hashlib
+import logging
+import posixpath
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 每个文件记录的字段
+MANIFEST_FIELDS = ("fs_id", "size", "md5", "server_mtime")
+
+
+def _parent(path: str) -> str:
+    return posixpath.dirname(path.rstrip("/")) or "/"
+
+
+def _under(path: str, root: str) -> bool:
+    """path 是否为 root 本身或其子路径"""
+    root = root.rstrip("/")
+    return path == root or path.startswith(root + "/") or not root
+
+
+class SyncManifest:
+    """单个同步任务的元数据清单（pickle 快照，保存在临时目录），线程安全"""
+    
+    def __init__(self, temp_dir: str, task_key: str):
+        """
+        :param temp_dir: 清单文件所在目录
+        :param task_key: 任务标识（如 "百度目录->阿里云目录"），不同任务使用不同清单
+        """
+        digest = hashlib.md5(task_key.encode("utf-8")).hexdigest()[:12]
+        self.manifest_file = os.path.join(temp_dir, f".sync_manifest_{digest}.pkl")
+        self.task_key = task_key
+        
+        # 上次同步的清单（只读）
+        self.old_files: Dict[str, Dict] = {}
+        self.old_dirs: Dict[str, int] = {}
+        self._old_children: Dict[str, List[str]] = {}  # 目录 -> 直接子目录
+        self._old_dir_files: Dict[str, List[str]] = {}  # 目录 -> 直接子文件
+        
+        # 本次同步的清单
+        self.files: Dict[str, Dict] = {}
+        self.dirs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def load(self) -> bool:
+        """加载上次的清单，不存在或损坏时返回 False"""
+        if not os.path.exists(self.manifest_file):
+            return False
+        try:
+            with open(self.manifest_file, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"加载同步清单失败: {str(e)}")
+            return False
+        if data.get("task") != self.task_key:
+            return False
+        
+        self.old_files = data.get("files", {})
+        self.old_dirs = data.get("dirs", {})
+        for dir_path in self.old_dirs:
+            self._old_children.setdefault(_parent(dir_path), []).append(dir_path)
+        for file_path in self.old_files:
+            self._old_dir_files.setdefault(_parent(file_path), []).append(file_path)
+        logger.info(f"已加载同步清单: {len(self.old_files)} 个文件, {len(self.old_dirs)} 个目录")
+        return True
+    
+    def dir_unchanged(self, dir_info: Dict) -> bool:
+        """目录修改时间与上次一致"""
+        mtime = dir_info.get("server_mtime")
+        return mtime is not None and self.old_dirs.get(dir_info.get("path")) == mtime
+    
+    def file_changed(self, file_info: Dict) -> Optional[bool]:
+        """
+        与上次清单比较
+        :return: None 表示新文件，False 表示未变化，True 表示已修改
+        """
+        old = self.old_files.get(file_info.get("path"))
+        if old is None:
+            return None
+        return any(old.get(field) != file_info.get(field) for field in MANIFEST_FIELDS)
+    
+    def record_dir(self, dir_info: Dict):
+        if dir_info.get("server_mtime") is None:
+            return
+        with self._lock:
+            self.dirs[dir_info.get("path")] = dir_info.get("server_mtime")
+    
+    def record_file(self, file_info: Dict):
+        """文件同步成功（或确认无需同步）后记入本次清单"""
+        entry = {field: file_info.get(field) for field in MANIFEST_FIELDS}
+        with self._lock:
+            self.files[file_info.get("path")] = entry
+    
+    def carry_dir(self, dir_path: str) -> Tuple[int, List[str]]:
+        """
+        未变化的目录：沿用上次清单中该目录的修改时间与直接子文件
+        目录的修改时间只反映直接子项的增删，下级目录中的变化不会体现出来，
+        所以只沿用这一层，已知的子目录仍需扫描
+        :return: (沿用的文件数, 上次清单中的直接子目录)
+        """
+        with self._lock:
+            self.dirs[dir_path] = self.old_dirs[dir_path]
+            files = self._old_dir_files.get(dir_path, [])
+            for file_path in files:
+                self.files[file_path] = self.old_files[file_path]
+            return len(files), list(self._old_children.get(dir_path, []))
+    
+    def record_failure(self, file_info: Dict, root: str):
+        """
+        文件同步失败：保留上次的记录（已修改的文件下次仍会被识别为已修改），
+        并清除其上级目录的修改时间，下次增量同步会重新扫描这些目录
+        """
+        file_path = file_info.get("path")
+        with self._lock:
+            if file_path in self.old_files:
+                self.files[file_path] = self.old_files[file_path]
+        self.forget_dir_chain(file_path, root)
+    
+    def forget_dir_chain(self, file_path: str, root: str):
+        """清除 file_path 上级目录的修改时间（直到 root）"""
+        with self._lock:
+            path = _parent(file_path)
+            while _under(path, root):
+                self.dirs.pop(path, None)
+                if path in ("/", root.rstrip("/")):
+                    break
+                path = _parent(path)
+    
+    def deleted_files(self, root: str, incomplete_dirs: Iterable[str] = ()) -> List[str]:
+        """上次存在、本次扫描未出现的文件（扫描失败的目录不计入）"""
+        incomplete = list(incomplete_dirs)
+        with self._lock:
+            return sorted(path for path in self.old_files
+                          if path not in self.files and _under(path, root)
+                          and not any(_under(path, d) for d in incomplete))
+    
+    def keep_incomplete(self, incomplete_dirs: Iterable[str], root: str):
+        """扫描失败的目录沿用上次的文件记录（但不记录目录及其上级的修改时间，下次重新扫描）"""
+        for dir_path in incomplete_dirs:
+            with self._lock:
+                for file_path, entry in self.old_files.items():
+                    if _under(file_path, dir_path):
+                        self.files.setdefault(file_path, entry)
+                for path in [p for p in self.dirs if _under(p, dir_path)]:
+                    del self.dirs[path]
+            self.forget_dir_chain(f"{dir_path.rstrip('/')}/", root)
+    
+    def save(self):
+        """原子写入本次清单"""
+        tmp_file = f"{self.manifest_file}.tmp"
+        with self._lock:
+            data = {"task": self.task_key, "files": self.files, "dirs": self.dirs}
+            try:
+                with open(tmp_file, 'wb') as f:
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_file, self.manifest_file)
+                logger.info(f"同步清单已保存: {len(self.files)} 个文件, {len(self.dirs)} 个目录")
+            except Exception as e:
+                logger.error(f"保存同步清单失败: {str(e)}")
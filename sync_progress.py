@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同步进度记录（断点续传）
+快照文件 + 追加日志：标记完成只追加一行，定期压缩为快照
+"""
+
+import os
+import json
+import pickle
+import logging
+import threading
+from typing import Set
+
+logger = logging.getLogger(__name__)
+
+# 快照文件：pickle 序列化的已完成路径集合（与旧版 .sync_progress.pkl 格式兼容）
+PROGRESS_SNAPSHOT = ".sync_progress.pkl"
+# 追加日志：每行一个 JSON 字符串（已完成文件路径）
+PROGRESS_JOURNAL = ".sync_progress.journal"
+
+
+class ProgressJournal:
+    """已完成文件记录，线程安全"""
+    
+    def __init__(self, temp_dir: str, compact_every: int = 10000):
+        """
+        :param temp_dir: 进度文件所在目录
+        :param compact_every: 日志追加多少条后压缩为快照
+        """
+        self.snapshot_file = os.path.join(temp_dir, PROGRESS_SNAPSHOT)
+        self.journal_file = os.path.join(temp_dir, PROGRESS_JOURNAL)
+        self.compact_every = compact_every
+        
+        self.completed: Set[str] = set()
+        self._lock = threading.Lock()
+        self._journal = None
+        self._pending = 0  # 自上次压缩以来追加的条数
+    
+    def load(self) -> Set[str]:
+        """加载快照并重放追加日志"""
+        with self._lock:
+            completed = set()
+            
+            if os.path.exists(self.snapshot_file):
+                try:
+                    with open(self.snapshot_file, 'rb') as f:
+                        completed = pickle.load(f)
+                except Exception as e:
+                    logger.warning(f"加载进度快照失败: {str(e)}")
+            
+            replayed = 0
+            if os.path.exists(self.journal_file):
+                try:
+                    with open(self.journal_file, 'rb') as f:
+                        data = f.read()
+                    
+                    # 崩溃时最后一行可能只写了一半：截断到最后一个换行符，
+                    # 否则之后追加的第一条记录会接在残行后面，下次重放时一起丢失
+                    end = data.rfind(b"\n") + 1
+                    if end < len(data):
+                        logger.debug(f"截断未写完的进度记录: {data[end:end + 100]!r}")
+                        with open(self.journal_file, 'r+b') as f:
+                            f.truncate(end)
+                    
+                    for line in data[:end].decode('utf-8', errors='replace').splitlines():
+                        try:
+                            completed.add(json.loads(line))
+                            replayed += 1
+                        except ValueError:
+                            logger.debug(f"忽略损坏的进度记录: {line[:100]!r}")
+                except Exception as e:
+                    logger.warning(f"重放进度日志失败: {str(e)}")
+            
+            self.completed = completed
+            self._pending = replayed
+        
+        # 启动时把日志合并进快照，避免日志无限增长
+        if replayed >= self.compact_every:
+            self.compact()
+        
+        return self.completed
+    
+    def add(self, file_path: str):
+        """标记文件为已完成（O(1)：追加一行）"""
+        with self._lock:
+            if file_path in self.completed:
+                return
+            self.completed.add(file_path)
+            
+            try:
+                if self._journal is None:
+                    self._journal = open(self.journal_file, 'a', encoding='utf-8')
+                self._journal.write(json.dumps(file_path, ensure_ascii=False) + "\n")
+                self._journal.flush()
+                self._pending += 1
+            except Exception as e:
+                logger.error(f"写入进度日志失败: {str(e)}")
+                return
+            
+            if self._pending >= self.compact_every:
+                self._compact_locked()
+    
+    def __contains__(self, file_path: str) -> bool:
+        return file_path in self.completed
+    
+    def __len__(self) -> int:
+        return len(self.completed)
+    
+    def compact(self):
+        """把当前记录写成快照并清空追加日志"""
+        with self._lock:
+            self._compact_locked()
+    
+    def _compact_locked(self):
+        tmp_file = f"{self.snapshot_file}.tmp"
+        try:
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(self.completed, f)
+                f.flush()
+                os.fsync(f.fileno())
+            # 原子替换，避免写一半的快照
+            os.replace(tmp_file, self.snapshot_file)
+            
+            # 快照已包含全部记录，可以截断日志
+            if self._journal is not None:
+                self._journal.close()
+            self._journal = open(self.journal_file, 'w', encoding='utf-8')
+            self._pending = 0
+            logger.debug(f"进度记录已压缩: {len(self.completed)} 条")
+        except Exception as e:
+            logger.error(f"保存进度快照失败: {str(e)}")
+    
+    def close(self):
+        """压缩并关闭日志文件"""
+        with self._lock:
+            if self._pending:
+                self._compact_locked()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
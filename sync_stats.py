@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同步耗时与流量统计
+按阶段（检查、获取下载链接、下载、哈希、创建文件夹、上传等）和按接口类别记录
+次数、失败数、耗时直方图、字节数与吞吐量；同步结束时输出 JSON 报告，
+运行中可定期写出实时快照文件
+"""
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 耗时直方图的桶上界（秒），最后一个桶为 +Inf
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class Metric:
+    """一类操作的统计：次数、失败数、耗时直方图、字节数（不加锁，由 SyncStats 在锁内更新）"""
+    
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes = 0
+        self.buckets: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+    
+    def observe(self, seconds: float, nbytes: int = 0, ok: bool = True):
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.bytes += nbytes
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """按直方图估算分位数（取所在桶的上界）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max_seconds
+    
+    def to_dict(self, elapsed: float) -> Dict:
+        result = {
+            "count": self.count,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 3),
+            "avg_seconds": round(self.seconds / self.count, 4) if self.count else None,
+            "p50_seconds": self.quantile(0.5),
+            "p90_seconds": self.quantile(0.9),
+            "p99_seconds": self.quantile(0.99),
+            "max_seconds": round(self.max_seconds, 3),
+            "histogram": {f"le_{bound}": n for bound, n in zip(LATENCY_BUCKETS + ("inf",), self.buckets)},
+        }
+        if self.bytes:
+            mb = self.bytes / (1024 * 1024)
+            result["bytes"] = self.bytes
+            # 整体吞吐量（按运行时长）与单个操作的平均速度（按操作耗时之和）
+            result["mb_per_s"] = round(mb / elapsed, 3) if elapsed > 0 else None
+            result["mb_per_s_per_op"] = round(mb / self.seconds, 3) if self.seconds > 0 else None
+        return result
+
+
+class _StageTimer:
+    """stats.timer() 返回的计时器，可在 with 块内设置 bytes / ok"""
+    
+    def __init__(self, stats: "SyncStats", name: str):
+        self.stats = stats
+        self.name = name
+        self.bytes = 0
+        self.ok = True
+    
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.stats.stage(self.name, time.monotonic() - self.start, self.bytes, self.ok and exc_type is None)
+
+
+class SyncStats:
+    """同步统计（线程安全），百度与阿里云客户端、同步器共用一个实例"""
+    
+    def __init__(self):
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self.stages: Dict[str, Metric] = {}
+        self.apis: Dict[str, Metric] = {}
+        self.status_codes: Dict[str, Dict[str, int]] = {}  # 接口类别 -> {状态码: 次数}
+        self.files = {"success": 0, "failed": 0, "skipped": 0, "bytes": 0}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # 并行的同步任务可能同时写同一份报告
+        
+        # 运行中的实时指标（队列深度、临时空间等）：名称 -> 返回 {指标名: 数值} 的函数
+        self._gauges: Dict[str, Callable[[], Dict[str, float]]] = {}
+        
+        self._live_thread: Optional[threading.Thread] = None
+        self._live_stop = threading.Event()
+        self._live_users = 0
+    
+    def stage(self, name: str, seconds: float, nbytes: int = 0, ok: bool = True):
+        """记录一次同步阶段的耗时"""
+        with self._lock:
+            self.stages.setdefault(name, Metric()).observe(seconds, nbytes, ok)
+    
+    def timer(self, name: str) -> _StageTimer:
+        """with stats.timer("download") as t: ...; t.bytes = n"""
+        return _StageTimer(self, name)
+    
+    def api(self, category: str, seconds: float, status: Optional[int] = None, nbytes: int = 0):
+        """
+        记录一次接口调用
+        :param status: HTTP 状态码，None 表示网络异常
+        """
+        ok = status is not None and status < 400
+        with self._lock:
+            self.apis.setdefault(category, Metric()).observe(seconds, nbytes, ok)
+            codes = self.status_codes.setdefault(category, {})
+            key = str(status) if status is not None else "error"
+            codes[key] = codes.get(key, 0) + 1
+    
+    def call(self, category: str, send: Callable[[], Any], nbytes: int = 0) -> Any:
+        """发送一次请求并记录耗时（到收到响应头为止）与状态码；send 返回 requests.Response"""
+        start = time.monotonic()
+        try:
+            response = send()
+        except Exception:
+            self.api(category, time.monotonic() - start)
+            raise
+        self.api(category, time.monotonic() - start, response.status_code, nbytes)
+        return response
+    
+    def file_done(self, outcome: str, nbytes: int = 0, count: int = 1):
+        """
+        记录文件的同步结果
+        :param outcome: success / failed / skipped
+        :param count: 文件数（跳过整个目录时一次记录多个）
+        """
+        with self._lock:
+            self.files[outcome] += count
+            if outcome == "success":
+                self.files["bytes"] += nbytes
+    
+    def set_gauges(self, key: str, collect: Callable[[], Dict[str, float]]):
+        """登记一组实时指标（如某个同步任务的队列深度），key 相同时覆盖"""
+        with self._lock:
+            self._gauges[key] = collect
+    
+    def remove_gauges(self, key: str):
+        with self._lock:
+            self._gauges.pop(key, None)
+    
+    def gauges(self) -> Dict[str, Dict[str, float]]:
+        """读取当前的实时指标"""
+        with self._lock:
+            collectors = dict(self._gauges)
+        result = {}
+        for key, collect in collectors.items():
+            try:
+                result[key] = collect()
+            except Exception as e:
+                logger.debug(f"读取实时指标失败 {key}: {str(e)}")
+        return result
+    
+    def snapshot(self) -> Dict:
+        """当前统计（可直接序列化为 JSON）"""
+        gauges = self.gauges()
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            files = dict(self.files)
+            done = files["success"] + files["failed"]
+            files["files_per_s"] = round(done / elapsed, 3) if elapsed > 0 else None
+            files["mb_per_s"] = round(files["bytes"] / (1024 * 1024) / elapsed, 3) if elapsed > 0 else None
+            return {
+                "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+                "elapsed_seconds": round(elapsed, 3),
+                "files": files,
+                "stages": {name: metric.to_dict(elapsed) for name, metric in self.stages.items()},
+                "apis": {name: dict(metric.to_dict(elapsed), status=dict(self.status_codes.get(name, {})))
+                         for name, metric in self.apis.items()},
+                "gauges": gauges,
+            }
+    
+    def write(self, path: str, extra: Optional[Dict] = None):
+        """原子写入 JSON 报告"""
+        data = self.snapshot()
+        data.update(extra or {})
+        tmp_file = f"{path}.tmp"
+        try:
+            with self._write_lock:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_file, path)
+        except Exception as e:
+            logger.error(f"写入统计报告失败: {str(e)}")
+    
+    def start_live(self, path: str, interval: float = 10):
+        """在后台线程中定期写出实时快照（多次调用只启动一个线程）"""
+        with self._lock:
+            self._live_users += 1
+            if self._live_thread is not None:
+                return
+            self._live_stop.clear()
+            self._live_thread = threading.Thread(target=self._live_loop, args=(path, interval),
+                                                 name="stats-live", daemon=True)
+            self._live_thread.start()
+    
+    def stop_live(self):
+        """停止实时快照（最后一个使用者停止时才真正停止）"""
+        with self._lock:
+            self._live_users -= 1
+            thread = self._live_thread if self._live_users <= 0 else None
+            if thread is not None:
+                self._live_thread = None
+                self._live_stop.set()
+        if thread is not None:
+            thread.join()
+    
+    def _live_loop(self, path: str, interval: float):
+        while not self._live_stop.wait(interval):
+            self.write(path)
+        self.write(path)
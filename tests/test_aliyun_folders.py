@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件夹创建单飞测试：多个线程同时需要同一路径时，每层文件夹只查询/创建一次
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from mock_servers import FaultOptions, MockAliyunServer  # noqa: E402
+from baidu_to_aliyun_sync import AliyunPanClient  # noqa: E402
+from rate_limiter import DEFAULT_RATES, RateLimiterRegistry  # noqa: E402
+
+THREADS = 16
+
+
+@pytest.fixture
+def aliyun():
+    # 每个请求都有延迟，让并发的线程确实同时等在同一层文件夹上
+    server = MockAliyunServer(FaultOptions(latency_ms=20)).start()
+    yield server
+    server.close()
+
+
+def folders(server):
+    """模拟服务上创建的文件夹（不含根目录）"""
+    with server._lock:
+        return [item for item in server.files.values() if item["type"] == "folder" and item["file_id"] != "root"]
+
+
+def resolve_concurrently(client, paths):
+    """所有线程同时开始解析，返回 路径 -> 各线程得到的文件夹ID"""
+    barrier = threading.Barrier(len(paths))
+    results = {path: [] for path in paths}
+    
+    def worker(path):
+        barrier.wait()
+        results[path].append(client.get_or_create_folder_by_path(path))
+    
+    threads = [threading.Thread(target=worker, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def make_client(server):
+    return AliyunPanClient(refresh_token="test", base_url=server.url, pool_size=THREADS,
+                           rate_limiters=RateLimiterRegistry({category: 1000 for category in DEFAULT_RATES}))
+
+
+def test_same_path_created_once(aliyun, monkeypatch):
+    client = make_client(aliyun)
+    created = []
+    create_folder = client.create_folder
+    
+    def spy_create_folder(parent_file_id, folder_name, *args, **kwargs):
+        created.append(folder_name)
+        return create_folder(parent_file_id, folder_name, *args, **kwargs)
+    
+    monkeypatch.setattr(client, "create_folder", spy_create_folder)
+    results = resolve_concurrently(client, ["/a/b/c"] * THREADS)
+    
+    assert len(set(results["/a/b/c"])) == 1 and None not in results["/a/b/c"]
+    assert sorted(created) == ["a", "b", "c"]
+    assert len(folders(aliyun)) == 3
+
+
+def test_shared_prefix_created_once(aliyun):
+    """不同的子目录共用的上层文件夹也只创建一次"""
+    client = make_client(aliyun)
+    paths = [f"/backup/photos/{i}" for i in range(THREADS)]
+    results = resolve_concurrently(client, paths)
+    
+    assert all(len(ids) == 1 and ids[0] for ids in results.values())
+    names = sorted(item["name"] for item in folders(aliyun))
+    assert names == sorted(["backup", "photos"] + [str(i) for i in range(THREADS)])
+    
+    # 之后的调用直接命中缓存
+    requests = aliyun.requests
+    assert client.get_or_create_folder_by_path("/backup/photos/0") == results["/backup/photos/0"][0]
+    assert aliyun.requests == requests
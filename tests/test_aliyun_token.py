@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+阿里云盘令牌刷新测试：多个线程同时发现令牌失效或即将过期时只刷新一次
+"""
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from mock_servers import MockAliyunServer  # noqa: E402
+from baidu_to_aliyun_sync import AliyunPanClient  # noqa: E402
+from rate_limiter import DEFAULT_RATES, RateLimiterRegistry  # noqa: E402
+
+THREADS = 16
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.headers = {}
+        self._body = body or {}
+    
+    def json(self):
+        return self._body
+    
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(f"HTTP {self.status_code}")
+    
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """只接受当前令牌的会话；刷新接口较慢，并发的刷新请求会互相重叠"""
+    
+    def __init__(self, token):
+        self.token = token
+        self.refreshes = 0
+        self._lock = threading.Lock()
+    
+    def rotate(self):
+        """服务端令牌失效（如在其他设备上登录）"""
+        with self._lock:
+            self.token = f"{self.token}-revoked"
+    
+    def request(self, method, url, **kwargs):
+        if url.endswith("/token/refresh"):
+            time.sleep(0.05)
+            with self._lock:
+                self.refreshes += 1
+                self.token = f"token-{self.refreshes}"
+                return FakeResponse(200, {"access_token": self.token, "refresh_token": "refresh",
+                                          "expires_in": 7200})
+        with self._lock:
+            valid = (kwargs.get("headers") or {}).get("Authorization") == f"Bearer {self.token}"
+        return FakeResponse(200 if valid else 401)
+
+
+@pytest.fixture
+def client():
+    server = MockAliyunServer().start()
+    client = AliyunPanClient(refresh_token="refresh", base_url=server.url,
+                             rate_limiters=RateLimiterRegistry({category: 1000 for category in DEFAULT_RATES}))
+    client.session = FakeSession(client.access_token)
+    yield client
+    server.close()
+
+
+def concurrent_requests(client):
+    """所有线程同时发出带令牌的请求，返回各自的状态码"""
+    barrier = threading.Barrier(THREADS)
+    codes = []
+    
+    def worker():
+        barrier.wait()
+        response = client._request("aliyun_meta", "POST", f"{client.base_url}/v2/user/get",
+                                   headers=client._get_headers(), json={})
+        codes.append(response.status_code)
+    
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return codes
+
+
+def test_concurrent_401_refreshes_once(client):
+    generation = client._token_generation
+    client.session.rotate()
+    
+    assert concurrent_requests(client) == [200] * THREADS
+    assert client.session.refreshes == 1
+    assert client._token_generation == generation + 1
+    assert client.access_token == "token-1"
+
+
+def test_expiring_token_refreshed_once_in_advance(client):
+    client.token_expires_at = time.time() + 1
+    
+    assert concurrent_requests(client) == [200] * THREADS
+    assert client.session.refreshes == 1
+    assert client.token_expires_at > time.time() + 3600
+
+
+def test_stale_generation_does_not_refresh_again(client):
+    """拿着旧代数的线程收到 401 时，令牌已被其他线程刷新，直接用新令牌重试"""
+    stale = client._token_generation
+    assert client._refresh_token_once(stale)
+    assert client.session.refreshes == 1
+    
+    assert client._refresh_token_once(stale)
+    assert client.session.refreshes == 1
+    assert client._refresh_token_once(client._token_generation)
+    assert client.session.refreshes == 2
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+阿里云盘分片上传续传测试：在 bench/mock_servers.py 的模拟接口上中断后续传
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from mock_servers import MockAliyunServer  # noqa: E402
+from baidu_to_aliyun_sync import AliyunPanClient  # noqa: E402
+
+PART_SIZE = 1000
+PART_COUNT = 8
+
+
+@pytest.fixture
+def aliyun():
+    server = MockAliyunServer().start()
+    yield server
+    server.close()
+
+
+def test_resume_fetches_upload_urls_in_one_batch(aliyun, tmp_path, monkeypatch):
+    """续传时一次请求获取所有待传分片的上传URL，而不是每个分片单独请求"""
+    local_path = str(tmp_path / "file.bin")
+    with open(local_path, "wb") as f:
+        f.write(os.urandom(PART_SIZE * PART_COUNT - 10))
+    
+    client = AliyunPanClient(refresh_token="test", part_size=PART_SIZE, upload_concurrency=1, rapid_upload=False,
+                             base_url=aliyun.url)
+    
+    # 第一次上传只传成功前 3 个分片
+    put_part = client._put_part
+    
+    def flaky_put_part(file_id, upload_id, part_number, *args, **kwargs):
+        if part_number > 3:
+            raise IOError("连接中断")
+        return put_part(file_id, upload_id, part_number, *args, **kwargs)
+    
+    monkeypatch.setattr(client, "_put_part", flaky_put_part)
+    assert not client.upload_file(local_path, "root", "file.bin")
+    assert os.path.exists(local_path + ".upload")
+    monkeypatch.setattr(client, "_put_part", put_part)
+    
+    requested = []
+    get_upload_url = client.get_upload_url
+    
+    def spy_get_upload_url(file_id, upload_id, part_numbers):
+        requested.append(list(part_numbers))
+        return get_upload_url(file_id, upload_id, part_numbers)
+    
+    monkeypatch.setattr(client, "get_upload_url", spy_get_upload_url)
+    assert client.upload_file(local_path, "root", "file.bin")
+    assert requested == [list(range(4, PART_COUNT + 1))]
+    assert aliyun.completed_files() == {"/file.bin": PART_SIZE * PART_COUNT - 10}
+    assert not os.path.exists(local_path + ".upload")
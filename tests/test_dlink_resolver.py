@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DlinkResolver 单元测试：用假的 fetch 代替 filemetas 接口，检查批量解析、缓存有效期与并发去重
+"""
+
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dlink_resolver  # noqa: E402
+from dlink_resolver import DLINK_BATCH_SIZE, DlinkResolver  # noqa: E402
+
+
+class FakeFetch:
+    """记录每次请求的 fs_id 列表，返回 fs_id -> 带请求序号的链接"""
+    
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+        self.gate = threading.Event()
+        self.gate.set()
+    
+    def __call__(self, fs_ids):
+        self.gate.wait()
+        self.calls.append(list(fs_ids))
+        if self.fail:
+            raise IOError("filemetas 请求失败")
+        return {fs_id: f"https://d.pcs/{fs_id}?v={len(self.calls)}" for fs_id in fs_ids}
+
+
+class FakeClock:
+    """代替 dlink_resolver 模块中的 time，只提供 time()"""
+    
+    def __init__(self):
+        self.now = 1000000.0
+    
+    def time(self):
+        return self.now
+
+
+def test_prefetched_ids_resolved_in_batches():
+    fetch = FakeFetch()
+    resolver = DlinkResolver(fetch)
+    for fs_id in range(1, 251):
+        resolver.prefetch(fs_id)
+    
+    assert resolver.get(1) == "https://d.pcs/1?v=1"
+    assert fetch.calls == [list(range(1, DLINK_BATCH_SIZE + 1))]
+    
+    # 同一批中的其他文件直接命中缓存
+    for fs_id in range(2, DLINK_BATCH_SIZE + 1):
+        assert resolver.get(fs_id) == f"https://d.pcs/{fs_id}?v=1"
+    assert len(fetch.calls) == 1
+    
+    # 请求的文件排在最前，其余按登记顺序补满一批
+    resolver.get(250)
+    assert fetch.calls[1] == [250] + list(range(DLINK_BATCH_SIZE + 1, 2 * DLINK_BATCH_SIZE))
+
+
+def test_batch_size_capped_by_api_limit():
+    fetch = FakeFetch()
+    resolver = DlinkResolver(fetch, batch_size=1000)
+    for fs_id in range(500):
+        resolver.prefetch(fs_id)
+    resolver.get(0)
+    assert len(fetch.calls[0]) == DLINK_BATCH_SIZE
+
+
+def test_discarded_ids_not_fetched():
+    fetch = FakeFetch()
+    resolver = DlinkResolver(fetch, batch_size=10)
+    for fs_id in range(1, 6):
+        resolver.prefetch(fs_id)
+    resolver.discard(3)
+    resolver.get(1)
+    assert fetch.calls == [[1, 2, 4, 5]]
+
+
+def test_cached_link_expires(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(dlink_resolver, "time", clock)
+    fetch = FakeFetch()
+    resolver = DlinkResolver(fetch, ttl=60)
+    
+    assert resolver.get(7) == "https://d.pcs/7?v=1"
+    clock.now += 59
+    assert resolver.get(7) == "https://d.pcs/7?v=1"
+    clock.now += 2
+    assert resolver.get(7) == "https://d.pcs/7?v=2"
+    assert len(fetch.calls) == 2
+    
+    # 已缓存且未过期的文件不会再登记到下一批
+    resolver.prefetch(7)
+    resolver.get(8)
+    assert fetch.calls[-1] == [8]
+
+
+def test_invalidate_only_matching_link():
+    fetch = FakeFetch()
+    resolver = DlinkResolver(fetch)
+    first = resolver.get(1)
+    
+    # 其他线程已经换过的链接不会被旧链接的 403 清掉
+    resolver.invalidate(1, "https://d.pcs/1?v=0")
+    assert resolver.get(1) == first
+    
+    resolver.invalidate(1, first)
+    assert resolver.get(1) == "https://d.pcs/1?v=2"
+
+
+def test_concurrent_get_fetches_once():
+    fetch = FakeFetch()
+    fetch.gate.clear()
+    resolver = DlinkResolver(fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(resolver.get(42))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    fetch.gate.set()
+    for thread in threads:
+        thread.join()
+    
+    assert fetch.calls == [[42]]
+    assert results == ["https://d.pcs/42?v=1"] * 8
+
+
+def test_failed_fetch_retried_on_next_get():
+    fetch = FakeFetch(fail=True)
+    resolver = DlinkResolver(fetch)
+    assert resolver.get(5) is None
+    fetch.fail = False
+    assert resolver.get(5) == "https://d.pcs/5?v=2"
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量同步回归测试：在 bench/mock_servers.py 的模拟接口上运行完整的同步流程
+"""
+
+import os
+import sys
+import glob
+import time
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from mock_servers import MockAliyunServer, MockBaiduServer  # noqa: E402
+from baidu_to_aliyun_sync import BaiduToAliyunSync  # noqa: E402
+from rate_limiter import DEFAULT_RATES  # noqa: E402
+
+FILES = {
+    "/bench/top.bin": 100,
+    "/bench/a/a1.bin": 200,
+    "/bench/a/b/b1.bin": 300,
+    "/bench/a/b/c/c1.bin": 400,
+}
+
+
+@pytest.fixture
+def servers():
+    baidu = MockBaiduServer(FILES).start()
+    aliyun = MockAliyunServer().start()
+    yield baidu, aliyun
+    baidu.close()
+    aliyun.close()
+
+
+def make_syncer(baidu, aliyun, temp_dir, **options):
+    options = dict({
+        "baidu_api_url": f"{baidu.url}/rest/2.0/xpan",
+        "aliyun_api_url": aliyun.url,
+        "rapid_upload": False,
+        "incremental": True,
+        "stats_report": "",
+        "rate_limits": {category: 1000 for category in DEFAULT_RATES},
+    }, **options)
+    return BaiduToAliyunSync({"access_token": "test"}, {"refresh_token": "test"}, str(temp_dir), options)
+
+
+def run_sync(baidu, aliyun, temp_dir, incremental=True):
+    """每次新建同步器，相当于重新运行一次脚本"""
+    make_syncer(baidu, aliyun, temp_dir, incremental=incremental).sync_folder("/bench", "/bench", max_workers=2)
+
+
+@pytest.mark.parametrize("new_file", ["/bench/a/b/new.bin", "/bench/a/b/c/new.bin", "/bench/a/b/d/e/new.bin"])
+def test_nested_change_below_unchanged_directories(servers, tmp_path, new_file):
+    """上级目录的修改时间未变时，更深层目录中新增的文件也要同步"""
+    baidu, aliyun = servers
+    run_sync(baidu, aliyun, tmp_path)
+    assert aliyun.completed_files() == FILES
+    
+    # 只有新文件的直接上级目录（及新建目录的上级）修改时间变化
+    baidu.add_file(new_file, 555, mtime=1800000000)
+    run_sync(baidu, aliyun, tmp_path)
+    assert aliyun.completed_files() == dict(FILES, **{new_file: 555})
+    
+    # 第三次同步：没有变化，不应重复上传
+    uploaded = aliyun.uploaded_bytes
+    run_sync(baidu, aliyun, tmp_path)
+    assert aliyun.uploaded_bytes == uploaded
+
+
+def test_manifest_only_in_incremental_mode(servers, tmp_path):
+    baidu, aliyun = servers
+    run_sync(baidu, aliyun, tmp_path, incremental=False)
+    assert aliyun.completed_files() == FILES
+    assert not glob.glob(os.path.join(str(tmp_path), ".sync_manifest_*"))
+
+
+def test_watch_full_scan_finds_changes_missed_by_mtime(servers, tmp_path):
+    """目录修改时间没有更新时增量扫描发现不了新文件，守护模式定期的完整扫描仍能发现"""
+    baidu, aliyun = servers
+    run_sync(baidu, aliyun, tmp_path)
+    
+    new_file = "/bench/a/new.bin"
+    parent = next(item for item in baidu.entries["/bench"] if item["path"] == "/bench/a")
+    mtime = parent["server_mtime"]
+    baidu.add_file(new_file, 555, mtime=1800000000)
+    parent["server_mtime"] = mtime
+    run_sync(baidu, aliyun, tmp_path)
+    assert new_file not in aliyun.completed_files()
+    
+    syncer = make_syncer(baidu, aliyun, tmp_path, watch_interval=3600, watch_full_scan_every=1)
+    thread = threading.Thread(target=syncer.watch, args=([{"baidu_folder": "/bench", "aliyun_folder": "/bench"}], 2))
+    thread.start()
+    try:
+        deadline = time.monotonic() + 30
+        while new_file not in aliyun.completed_files() and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        syncer.request_stop()
+        thread.join()
+    assert aliyun.completed_files() == dict(FILES, **{new_file: 555})
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+续传校验单元测试：从 .downloading 续传后的大小与 md5 校验
+"""
+
+import os
+import sys
+import hashlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from segmented_download import SegmentedDownloader, content_md5  # noqa: E402
+
+DATA = bytes(range(256)) * 64
+REAL_MD5 = hashlib.md5(DATA).hexdigest()
+# 百度列表接口返回的混淆 md5 形如此（第 10 位为非十六进制字母）
+OBFUSCATED_MD5 = "4b4d5ebe3l1c71b5d7f4a6c39bb20c2c"
+
+
+def resume_download(tmp_path, file_md5):
+    """先下载一半后中断，再续传完整个文件，返回续传时实际请求的起始偏移"""
+    save_path = str(tmp_path / "file.bin")
+    downloader = SegmentedDownloader(segment_count=1)
+    half = len(DATA) // 2
+    
+    def broken(start, end):
+        yield DATA[start:half]
+        raise IOError("连接中断")
+    
+    assert not downloader.download_file(broken, save_path, len(DATA), file_md5)
+    assert os.path.getsize(save_path + ".downloading") == half
+    
+    starts = []
+    
+    def complete(start, end):
+        starts.append(start)
+        yield DATA[start:]
+    
+    assert downloader.download_file(complete, save_path, len(DATA), file_md5)
+    with open(save_path, "rb") as f:
+        assert f.read() == DATA
+    return starts
+
+
+def test_content_md5():
+    assert content_md5(REAL_MD5.upper()) == REAL_MD5
+    assert content_md5(OBFUSCATED_MD5) is None
+    assert content_md5("") is None and content_md5(None) is None
+
+
+def test_resume_with_obfuscated_md5_keeps_partial_file(tmp_path):
+    """md5 被混淆时只按大小校验，续传的数据不会被当作损坏而丢弃"""
+    assert resume_download(tmp_path, OBFUSCATED_MD5) == [len(DATA) // 2]
+
+
+def test_resume_with_real_md5(tmp_path):
+    assert resume_download(tmp_path, REAL_MD5) == [len(DATA) // 2]
+
+
+def test_resume_with_mismatched_md5_restarts(tmp_path):
+    """md5 有效但与续传结果不一致时丢弃后从头下载"""
+    assert resume_download(tmp_path, hashlib.md5(b"other").hexdigest()) == [len(DATA) // 2, 0]
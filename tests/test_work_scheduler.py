@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+调度器单元测试：用假的 submit 代替传输引擎，由测试控制每个文件何时完成
+"""
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import Future
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from work_scheduler import TempSpaceBudget, WorkScheduler  # noqa: E402
+
+
+class FakeEngine:
+    """记录提交顺序，finish 时才完成对应的 Future"""
+    
+    def __init__(self):
+        self.started = []
+        self.futures = {}
+    
+    def submit(self, file_info, *args, **kwargs):
+        future = Future()
+        self.started.append(file_info["path"])
+        self.futures[file_info["path"]] = future
+        return future
+    
+    def finish(self, path, result=True):
+        self.futures.pop(path).set_result(result)
+
+
+def submit_files(scheduler, sizes):
+    """按顺序提交文件，文件名即其序号"""
+    return [scheduler.submit({"path": str(i), "size": size}) for i, size in enumerate(sizes)]
+
+
+def budget_scheduler(tmp_path, budget_bytes, **kwargs):
+    """只受临时空间预算限制的调度器（fifo，不限并发数）"""
+    engine = FakeEngine()
+    budget = TempSpaceBudget(str(tmp_path), budget_bytes, min_free_bytes=0)
+    return engine, WorkScheduler(engine.submit, budget, policy="fifo", **kwargs)
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.01)
+
+
+def start_waiters(scheduler, group, count, granted):
+    """count 个线程各自为 group 等待一个在途名额，拿到后记录组名"""
+    def worker():
+        scheduler.acquire_slot(group)
+        granted.append(group)
+    
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: scheduler._groups[group].waiting + granted.count(group) == count)
+    return threads
+
+
+def test_window_slots_follow_priority():
+    """名额用完后，归还的名额先发给优先级高的组，不按等待的先后"""
+    scheduler = WorkScheduler(FakeEngine().submit, window=2)
+    scheduler.add_group("low", priority=0)
+    scheduler.add_group("high", priority=10)
+    scheduler.acquire_slot("low")
+    scheduler.acquire_slot("low")
+    
+    granted = []
+    start_waiters(scheduler, "low", 3, granted)
+    start_waiters(scheduler, "high", 3, granted)
+    assert granted == []
+    
+    for expected in range(1, 4):
+        scheduler.release_slot("low")
+        wait_until(lambda: len(granted) == expected)
+    assert granted == ["high"] * 3
+    
+    scheduler.release_slot("high")
+    wait_until(lambda: len(granted) == 4)
+    assert granted[-1] == "low"
+
+
+def test_window_slots_follow_weight():
+    """同优先级的组按权重分得名额"""
+    scheduler = WorkScheduler(FakeEngine().submit, window=4)
+    scheduler.add_group("a", weight=3)
+    scheduler.add_group("b", weight=1)
+    scheduler.add_group("filler")
+    for _ in range(4):
+        scheduler.acquire_slot("filler")
+    
+    granted = []
+    start_waiters(scheduler, "a", 6, granted)
+    start_waiters(scheduler, "b", 6, granted)
+    for expected in range(1, 5):
+        scheduler.release_slot("filler")
+        wait_until(lambda: len(granted) == expected)
+    assert granted.count("a") == 3 and granted.count("b") == 1
+
+
+def test_budget_first_fit(tmp_path):
+    """放不下的文件排队，其后能放下的较小文件先行"""
+    engine, scheduler = budget_scheduler(tmp_path, 100)
+    submit_files(scheduler, [60, 60, 30, 20])
+    assert engine.started == ["0", "2"]
+    assert scheduler.budget.reserved == 90
+    
+    engine.finish("0")
+    assert engine.started == ["0", "2", "1"]
+    engine.finish("2")
+    assert engine.started == ["0", "2", "1", "3"]
+
+
+def test_budget_bypass_limit(tmp_path):
+    """最前面的等待文件被插队 max_bypass 次后，后面的文件不再插队"""
+    engine, scheduler = budget_scheduler(tmp_path, 100, max_bypass=2)
+    submit_files(scheduler, [60, 60, 10, 10, 10])
+    assert engine.started == ["0", "2", "3"]
+    
+    # 空间释放后先满足被插队的文件
+    engine.finish("2")
+    engine.finish("3")
+    assert engine.started == ["0", "2", "3"]
+    engine.finish("0")
+    assert engine.started[3] == "1"
+    assert sorted(engine.started) == ["0", "1", "2", "3", "4"]
+
+
+def test_oversized_file_runs_alone(tmp_path):
+    """超过整个预算的文件在没有其他预留时放行，期间不再放入其他文件"""
+    engine, scheduler = budget_scheduler(tmp_path, 100)
+    submit_files(scheduler, [150, 10])
+    assert engine.started == ["0"]
+    engine.finish("0")
+    assert engine.started == ["0", "1"]
+    assert scheduler.budget.reserved == 10
+
+
+def lane_scheduler(policy="lanes", max_running=3):
+    engine = FakeEngine()
+    scheduler = WorkScheduler(engine.submit, max_running=max_running, policy=policy, large_threshold=1000,
+                              large_slots=1, small_threshold=100)
+    # 先占满名额，之后提交的文件都在等待队列中，按调度策略依次放行
+    for i in range(max_running):
+        scheduler.submit({"path": f"busy{i}", "size": 500})
+    return engine, scheduler
+
+
+def test_lanes_limit_large_files_and_prefer_small():
+    engine, scheduler = lane_scheduler()
+    for path, size in [("normal", 500), ("large1", 2000), ("large2", 3000), ("small1", 10), ("small2", 20)]:
+        scheduler.submit({"path": path, "size": size})
+    
+    # 大文件排在最前以免专属名额空闲，但同时只能进行 large_slots 个；其余名额小文件优先
+    for busy, expected in [("busy0", "large1"), ("busy1", "small1"), ("busy2", "small2"), ("small1", "normal")]:
+        engine.finish(busy)
+        assert engine.started[-1] == expected
+    assert scheduler.queue_depths() == {"scheduler_pending": 1, "in_flight": 3, "in_flight_large": 1}
+    
+    engine.finish("large1")
+    assert engine.started[-1] == "large2"
+
+
+def test_small_first_and_fifo_policies():
+    sizes = [("a", 500), ("b", 2000), ("c", 10), ("d", 300)]
+    for policy, expected in [("small_first", ["c", "d", "a", "b"]), ("fifo", ["a", "b", "c", "d"])]:
+        engine, scheduler = lane_scheduler(policy, max_running=1)
+        for path, size in sizes:
+            scheduler.submit({"path": path, "size": size})
+        for done in ["busy0"] + expected[:-1]:
+            engine.finish(done)
+        assert engine.started[1:] == expected
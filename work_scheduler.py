@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同步任务调度
+文件先进入调度器的等待队列，按调度策略与临时目录空间预算决定何时交给传输引擎：
+- 按大小分道：大文件只占用固定数量的名额，其余名额小文件优先，少数大文件不会占满所有线程
+- 开始下载前按文件大小预留临时空间，放不下的文件排队等待，
+  其后能放下的较小文件先行（first-fit），尽量让预算保持占满
+- 多个同步任务共用一个调度器时按任务分组：优先级高的任务先占名额，同优先级的任务按权重分配名额；
+  在途名额（等待 + 传输中的文件数）同样按组的优先级与权重发放
+"""
+
+import os
+import logging
+import threading
+import functools
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, Hashable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 等待队列最前面的文件被后面的文件插队超过此次数后，不再允许插队（避免大文件一直等不到空间）
+MAX_BYPASS = 32
+
+# 调度策略：lanes（大文件限定名额 + 小文件优先）、small_first（按大小从小到大）、fifo（按扫描顺序）
+SCHEDULE_POLICIES = ("lanes", "small_first", "fifo")
+
+
+class TempSpaceBudget:
+    """临时目录空间预算（不加锁，由调度器在锁内调用）"""
+    
+    def __init__(self, temp_dir: str, budget_bytes: int = 0, min_free_bytes: int = 1024 * 1024 * 1024):
+        """
+        :param temp_dir: 临时目录
+        :param budget_bytes: 临时文件总大小上限，0 表示只受磁盘剩余空间限制
+        :param min_free_bytes: 磁盘上至少保留的剩余空间
+        """
+        self.temp_dir = temp_dir
+        self.budget_bytes = budget_bytes
+        self.min_free_bytes = min_free_bytes
+        self.reserved = 0  # 已预留的字节数
+        self.limit = self._measure()
+    
+    def free_bytes(self) -> Optional[int]:
+        """临时目录所在磁盘的可用空间，不支持 statvfs 时返回 None"""
+        try:
+            stat = os.statvfs(self.temp_dir)
+        except (AttributeError, OSError):
+            return None
+        return stat.f_bavail * stat.f_frsize
+    
+    def _measure(self) -> Optional[int]:
+        """当前可用的预算：配置的上限与（剩余空间 - 保留空间）中较小者，None 表示不限"""
+        limits = []
+        if self.budget_bytes:
+            limits.append(self.budget_bytes)
+        free = self.free_bytes()
+        if free is not None:
+            limits.append(max(0, free - self.min_free_bytes))
+        return min(limits) if limits else None
+    
+    def fits(self, size: int) -> bool:
+        """
+        是否可以为该文件预留空间
+        没有任何预留时重新测量剩余空间；超过整个预算的文件只在没有其他预留时放行
+        """
+        if self.reserved == 0:
+            self.limit = self._measure()
+            return True
+        return self.limit is None or self.reserved + size <= self.limit
+    
+    def reserve(self, size: int):
+        self.reserved += size
+    
+    def release(self, size: int):
+        self.reserved = max(0, self.reserved - size)
+
+
+class _Group:
+    """一组文件（一个同步任务）的调度参数与计数"""
+    
+    def __init__(self, priority: int = 0, weight: float = 1.0):
+        self.priority = priority
+        self.weight = max(0.01, float(weight))
+        self.pending = 0
+        self.running = 0
+        self.unfinished = 0
+        self.held = 0  # 占用的在途名额
+        self.waiting = 0  # 等待在途名额的线程数
+
+
+class _Pending:
+    """等待调度的文件"""
+    
+    def __init__(self, future: Future, size: int, cost: int, lane: str, group: _Group, args: tuple, kwargs: Dict):
+        self.future = future
+        self.size = size  # 文件大小（决定所在的道）
+        self.cost = cost  # 需要预留的临时空间
+        self.lane = lane  # small / normal / large
+        self.group = group
+        self.args = args
+        self.kwargs = kwargs
+        self.bypassed = 0  # 被后面的文件插队的次数
+
+
+class WorkScheduler:
+    """按调度策略与临时空间预算把文件交给传输引擎，submit 返回 concurrent.futures.Future"""
+    
+    def __init__(self, submit: Callable[..., Future], budget: Optional[TempSpaceBudget] = None,
+                 cost: Callable[[Dict], int] = lambda file_info: file_info.get("size", 0),
+                 max_running: int = 0, policy: str = "lanes", large_threshold: int = 512 * 1024 * 1024,
+                 large_slots: int = 1, small_threshold: int = 4 * 1024 * 1024, max_bypass: int = MAX_BYPASS,
+                 window: int = 0):
+        """
+        :param submit: 传输引擎的 submit（TransferPipeline / AsyncTransferEngine）
+        :param budget: 临时空间预算，None 表示不限制
+        :param cost: 文件需要预留的临时空间（字节），参数为 file_info
+        :param max_running: 同时交给传输引擎的文件数上限（一般为引擎的 capacity），0 表示不限
+        :param policy: 调度策略，见 SCHEDULE_POLICIES
+        :param large_threshold: 不小于此大小的文件为大文件
+        :param large_slots: lanes 策略下同时进行的大文件数上限
+        :param small_threshold: 小于此大小的文件为小文件，lanes 策略下优先调度
+        :param max_bypass: 最前面的等待文件最多被插队的次数
+        :param window: 在途名额（调度器中等待 + 传输中的文件数）上限，所有组共用，0 表示不限（见 acquire_slot）
+        """
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"未知的调度策略: {policy}（可选: {', '.join(SCHEDULE_POLICIES)}）")
+        
+        self._submit = submit
+        self.budget = budget
+        self.cost = cost
+        self.max_running = max_running
+        self.policy = policy
+        self.large_threshold = large_threshold
+        self.large_slots = max(1, large_slots)
+        self.small_threshold = small_threshold
+        self.max_bypass = max_bypass
+        self.window = window
+        
+        self._pending: Deque[_Pending] = deque()
+        self._running = 0  # 已交给传输引擎、尚未结束的文件数
+        self._running_large = 0
+        self._unfinished = 0  # 已提交、尚未通知调用方结果的文件数
+        self._held = 0  # 已发放的在途名额
+        self._groups: Dict[Hashable, _Group] = {None: _Group()}
+        self._cond = threading.Condition()
+    
+    def _lane(self, size: int) -> str:
+        if size >= self.large_threshold:
+            return "large"
+        if size < self.small_threshold:
+            return "small"
+        return "normal"
+    
+    def add_group(self, key: Hashable, priority: int = 0, weight: float = 1.0):
+        """
+        登记一组文件（如一个同步任务）
+        :param priority: 优先级，等待中的文件总是先从优先级最高的组中选取
+        :param weight: 权重，同优先级的组按 进行中的文件数 / 权重 从小到大轮流选取
+        """
+        with self._cond:
+            group = self._groups.setdefault(key, _Group())
+            group.priority = priority
+            group.weight = max(0.01, float(weight))
+    
+    def remove_group(self, key: Hashable):
+        """移除已经完成的组（默认组不会移除）"""
+        with self._cond:
+            group = self._groups.get(key)
+            if key is not None and group is not None and not (group.unfinished or group.held or group.waiting):
+                del self._groups[key]
+    
+    def acquire_slot(self, group: Hashable = None):
+        """
+        提交文件前占用一个在途名额，名额用完时阻塞，文件完成后由 release_slot 归还
+        多个组同时等待时，名额先发给优先级最高的组，同优先级的组按 已占名额数 / 权重 从小到大轮流发放，
+        并行任务的扫描线程再多，也不会按先到先得把名额平分
+        """
+        if not self.window:
+            return
+        with self._cond:
+            owner = self._groups.setdefault(group, _Group())
+            owner.waiting += 1
+            try:
+                while self._held >= self.window or self._next_waiting_locked() is not owner:
+                    self._cond.wait()
+            finally:
+                owner.waiting -= 1
+            self._held += 1
+            owner.held += 1
+            # 还有空闲名额时让下一个组的等待线程继续
+            self._cond.notify_all()
+    
+    def release_slot(self, group: Hashable = None):
+        """归还 acquire_slot 占用的在途名额"""
+        if not self.window:
+            return
+        with self._cond:
+            owner = self._groups.setdefault(group, _Group())
+            self._held = max(0, self._held - 1)
+            owner.held = max(0, owner.held - 1)
+            self._cond.notify_all()
+    
+    def _next_waiting_locked(self) -> Optional[_Group]:
+        """下一个在途名额应发给的组：有线程在等待的组中 优先级最高、已占名额数 / 权重 最小 者"""
+        waiting = [group for group in self._groups.values() if group.waiting]
+        if not waiting:
+            return None
+        return min(waiting, key=lambda g: (-g.priority, g.held / g.weight))
+    
+    def submit(self, file_info: Dict, *args, group: Hashable = None, **kwargs) -> Future:
+        """
+        提交一个文件，其余参数原样传给传输引擎的 submit
+        :param group: 所属的组（见 add_group），未登记的组按默认优先级与权重调度
+        """
+        size = file_info.get("size", 0)
+        with self._cond:
+            owner = self._groups.setdefault(group, _Group())
+            item = _Pending(Future(), size, self.cost(file_info), self._lane(size), owner, (file_info,) + args,
+                            kwargs)
+            self._pending.append(item)
+            self._unfinished += 1
+            owner.pending += 1
+            owner.unfinished += 1
+            ready = self._pick_locked()
+        self._start(ready)
+        return item.future
+    
+    def queue_depths(self) -> Dict[str, int]:
+        """调度器中等待的文件数、已交给传输引擎的文件数（其中大文件数）"""
+        with self._cond:
+            return {"scheduler_pending": len(self._pending), "in_flight": self._running,
+                    "in_flight_large": self._running_large}
+    
+    def group_depths(self, key: Hashable) -> Dict[str, int]:
+        """某一组在调度器中等待的文件数与已交给传输引擎的文件数"""
+        with self._cond:
+            group = self._groups.get(key) or _Group()
+            return {"task_pending": group.pending, "task_in_flight": group.running}
+    
+    def join(self):
+        """等待所有文件（包括仍在排队的）完成"""
+        with self._cond:
+            while self._unfinished:
+                self._cond.wait()
+    
+    def join_group(self, key: Hashable):
+        """等待某一组的文件全部完成（其他组的文件不影响）"""
+        with self._cond:
+            group = self._groups.get(key)
+            while group is not None and group.unfinished:
+                self._cond.wait()
+    
+    def _order_locked(self) -> List[_Pending]:
+        """按调度策略排列等待中的文件"""
+        if self.policy == "small_first":
+            return sorted(self._pending, key=lambda item: item.size)
+        if self.policy == "lanes":
+            # 大文件有专属名额（受 large_slots 限制），排在最前以免名额空闲；其余名额小文件优先
+            lanes = {"large": [], "small": [], "normal": []}
+            for item in self._pending:
+                lanes[item.lane].append(item)
+            return lanes["large"] + lanes["small"] + lanes["normal"]
+        return list(self._pending)
+    
+    def _candidates_locked(self) -> Iterator[_Pending]:
+        """
+        按组依次给出候选文件：每次从 优先级最高、进行中文件数 / 权重 最小 的组中取下一个
+        （组内按调度策略排列）；只有一个组时即为调度策略给出的顺序
+        """
+        queues: Dict[_Group, Deque[_Pending]] = {}
+        for item in self._order_locked():
+            queues.setdefault(item.group, deque()).append(item)
+        while queues:
+            group = min(queues, key=lambda g: (-g.priority, g.running / g.weight))
+            items = queues[group]
+            item = items.popleft()
+            if not items:
+                del queues[group]
+            yield item
+    
+    def _pick_locked(self) -> List[_Pending]:
+        """取出可以开始的文件：受并发上限、大文件名额限制，并按 first-fit 预留临时空间"""
+        ready: List[_Pending] = []
+        blocked: Optional[_Pending] = None
+        for item in self._candidates_locked():
+            if self.max_running and self._running + len(ready) >= self.max_running:
+                break
+            if self.policy == "lanes" and item.lane == "large" and self._running_large >= self.large_slots:
+                continue
+            
+            if self.budget is not None:
+                if blocked is not None and blocked.bypassed >= self.max_bypass:
+                    break
+                if not self.budget.fits(item.cost):
+                    if blocked is None:
+                        blocked = item
+                    continue
+                self.budget.reserve(item.cost)
+                if blocked is not None:
+                    blocked.bypassed += 1
+            
+            ready.append(item)
+            item.group.pending -= 1
+            item.group.running += 1
+            if item.lane == "large":
+                self._running_large += 1
+        
+        if ready:
+            started = set(map(id, ready))
+            self._pending = deque(item for item in self._pending if id(item) not in started)
+            self._running += len(ready)
+        return ready
+    
+    def _start(self, ready: List[_Pending]):
+        for item in ready:
+            try:
+                inner = self._submit(*item.args, **item.kwargs)
+            except Exception as e:
+                self._finish(item, None, e)
+                continue
+            inner.add_done_callback(functools.partial(self._on_done, item))
+    
+    def _on_done(self, item: _Pending, inner: Future):
+        try:
+            result, error = inner.result(), None
+        except BaseException as e:
+            result, error = None, e
+        self._finish(item, result, error)
+    
+    def _finish(self, item: _Pending, result, error: Optional[BaseException]):
+        # 先释放名额与空间并启动后续文件，再通知调用方，最后才计为完成（join 返回时回调均已执行）
+        with self._cond:
+            if self.budget is not None:
+                self.budget.release(item.cost)
+            if item.lane == "large":
+                self._running_large -= 1
+            self._running -= 1
+            item.group.running -= 1
+            ready = self._pick_locked()
+        self._start(ready)
+        
+        if error is None:
+            item.future.set_result(result)
+        else:
+            item.future.set_exception(error)
+        
+        with self._cond:
+            self._unfinished -= 1
+            item.group.unfinished -= 1
+            self._cond.notify_all()